@@ -0,0 +1,127 @@
+import logging
+import math
+import threading
+import time
+from typing import *
+
+from models import Balance
+
+logger = logging.getLogger()
+
+# Seconds after which the balances are requested again in the background, even if nothing invalidated them
+BALANCE_REFRESH_INTERVAL = 60
+
+
+# Balances (and positions) of one client kept in memory, so that sizing an order is a local lookup instead of a signed
+# request on the order path:
+#   - pushed by the private websocket streams of the client when they are connected (see update())
+#   - invalidated when one of our orders is placed or filled, the next get() then requests them unless the stream has
+#     pushed the new balances in the meantime
+#   - requested again by a background thread when they haven't been confirmed for refresh_interval seconds
+# The dictionaries are replaced rather than modified, so they can be read from any thread.
+class BalanceCache:
+    def __init__(self, exchange: str, fetch: Callable[[], Dict[str, Balance]],
+                 refresh_interval: float = BALANCE_REFRESH_INTERVAL):
+
+        self.exchange = exchange
+        self.refresh_interval = refresh_interval
+
+        self._fetch = fetch
+
+        self.balances: Dict[str, Balance] = dict()
+        # Open positions by symbol, as pushed by the exchange (the columns differ between the exchanges)
+        self.positions: Dict[str, Dict] = dict()
+
+        # time.monotonic() of the last request or push of the balances
+        self.updated_at: Optional[float] = None
+        self.requests_count = 0
+
+        self._invalid = True
+        # Incremented by every invalidation and every push, to know if they happened during a request
+        self._invalidations = 0
+        self._pushes = 0
+        # Only one request at a time, the other threads wait for its result
+        self._refresh_lock = threading.Lock()
+        self._condition = threading.Condition()
+
+        t = threading.Thread(target=self._run, daemon=True)
+        t.start()
+
+    # Staleness metric: seconds since the balances were last known to be right, infinite if they never were
+    def staleness(self) -> float:
+
+        if self.updated_at is None:
+            return math.inf
+
+        return time.monotonic() - self.updated_at
+
+    def get(self) -> Dict[str, Balance]:
+
+        if self._invalid:
+            with self._refresh_lock:
+                if self._invalid:
+                    self._refresh()
+
+        return self.balances
+
+    # Called when one of our orders is placed or filled
+    def invalidate(self):
+
+        self._invalidations += 1
+        self._invalid = True
+
+        with self._condition:
+            self._condition.notify()
+
+    # Balances pushed by a websocket stream
+    def update(self, balances: Dict[str, Balance]):
+
+        self._pushes += 1
+        self.balances = balances
+        self.updated_at = time.monotonic()
+        self._invalid = False
+
+    def update_positions(self, positions: Dict[str, Dict]):
+        self.positions = positions
+
+    # Must be called with the refresh lock acquired
+    def _refresh(self):
+
+        invalidations, pushes = self._invalidations, self._pushes
+        self.requests_count += 1
+
+        balances = self._fetch()
+
+        # The request failed, the balances are kept and requested again next time
+        if balances is None or len(balances) == 0:
+            return
+
+        # Balances pushed during the request are more recent than its result
+        if self._pushes != pushes:
+            return
+
+        self.balances = balances
+        self.updated_at = time.monotonic()
+
+        # An invalidation during the request applies to its result
+        if self._invalidations == invalidations:
+            self._invalid = False
+
+    def _run(self):
+
+        while True:
+            with self._condition:
+                self._condition.wait(self.refresh_interval)
+
+            if not self._invalid and self.staleness() < self.refresh_interval:
+                continue
+
+            try:
+                with self._refresh_lock:
+                    if self._invalid or self.staleness() >= self.refresh_interval:
+                        self._refresh()
+            except Exception as e:
+                logger.error("%s error while refreshing the balances: %s", self.exchange, e)
+
+            if self.staleness() > 3 * self.refresh_interval:
+                logger.warning("%s balances not updated for %.0f seconds", self.exchange, self.staleness())
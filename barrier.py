@@ -0,0 +1,300 @@
+import logging
+import math
+import threading
+import time
+from typing import *
+
+import numpy as np
+
+from models import Candle
+from candles import CandleBuffer, CandleAggregator, CANDLE_BUFFER_SIZE
+
+logger = logging.getLogger()
+
+
+# Closed candles of several legs (contracts of the same timeframe, possibly on different exchanges) aligned on the same
+# timestamps: one row per bar, one column per leg, e.g. bars.close[-20:] is the (20, legs) array of the last 20 closes.
+# Same memory layout as CandleBuffer, the rows are views on preallocated arrays of twice the capacity.
+class AlignedBars:
+    def __init__(self, legs: int, capacity: int = CANDLE_BUFFER_SIZE):
+
+        self.legs = legs
+        self.capacity = capacity
+
+        self._timestamp = np.zeros(2 * capacity, dtype=np.int64)
+        self._high = np.zeros((2 * capacity, legs), dtype=np.float64)
+        self._low = np.zeros((2 * capacity, legs), dtype=np.float64)
+        self._close = np.zeros((2 * capacity, legs), dtype=np.float64)
+        self._volume = np.zeros((2 * capacity, legs), dtype=np.float64)
+        # False when the leg had no closed candle for the bar (barrier timeout), its close is then the previous one
+        self._fresh = np.zeros((2 * capacity, legs), dtype=bool)
+
+        self._start = 0
+        self._end = 0
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def append(self, timestamp: int, high: np.ndarray, low: np.ndarray, close: np.ndarray, volume: np.ndarray,
+               fresh: np.ndarray):
+
+        if self._end == 2 * self.capacity:
+            self._compact()
+
+        i = self._end
+
+        self._timestamp[i] = timestamp
+        self._high[i] = high
+        self._low[i] = low
+        self._close[i] = close
+        self._volume[i] = volume
+        self._fresh[i] = fresh
+
+        self._end += 1
+
+        if self._end - self._start > self.capacity:
+            self._start += 1
+
+    # Align the closed candles (all but the last one) of the buffers of the legs: one bar for every timestamp of any
+    # leg after all the legs have started, the legs without a candle at that timestamp keep their previous close.
+    def load(self, buffers: List[CandleBuffer]):
+
+        timestamps = [buffer.timestamp[:-1] for buffer in buffers]
+
+        if len(timestamps) == 0 or any(len(ts) == 0 for ts in timestamps):
+            return
+
+        start = max(int(ts[0]) for ts in timestamps)
+        bar_ts = np.unique(np.concatenate(timestamps))
+        bar_ts = bar_ts[bar_ts >= start][-self.capacity:]
+
+        size = len(bar_ts)
+        high = np.empty((size, self.legs))
+        low = np.empty((size, self.legs))
+        close = np.empty((size, self.legs))
+        volume = np.empty((size, self.legs))
+        fresh = np.empty((size, self.legs), dtype=bool)
+
+        for leg, (buffer, ts) in enumerate(zip(buffers, timestamps)):
+            # Last candle of the leg at or before each bar
+            index = np.searchsorted(ts, bar_ts, side="right") - 1
+            fresh[:, leg] = ts[index] == bar_ts
+
+            close[:, leg] = buffer.close[index]
+            high[:, leg] = np.where(fresh[:, leg], buffer.high[index], close[:, leg])
+            low[:, leg] = np.where(fresh[:, leg], buffer.low[index], close[:, leg])
+            volume[:, leg] = np.where(fresh[:, leg], buffer.volume[index], 0.0)
+
+        for i in range(size):
+            self.append(int(bar_ts[i]), high[i], low[i], close[i], volume[i], fresh[i])
+
+    def _compact(self):
+
+        keep = min(self._end - self._start, self.capacity - 1)
+        src = self._end - keep
+
+        for arr in (self._timestamp, self._high, self._low, self._close, self._volume, self._fresh):
+            arr[:keep] = arr[src:self._end]
+
+        self._start = 0
+        self._end = keep
+
+    @property
+    def last_timestamp(self) -> int:
+        return int(self._timestamp[self._end - 1])
+
+    @property
+    def timestamp(self) -> np.ndarray:
+        return self._timestamp[self._start:self._end]
+
+    @property
+    def high(self) -> np.ndarray:
+        return self._high[self._start:self._end]
+
+    @property
+    def low(self) -> np.ndarray:
+        return self._low[self._start:self._end]
+
+    @property
+    def close(self) -> np.ndarray:
+        return self._close[self._start:self._end]
+
+    @property
+    def volume(self) -> np.ndarray:
+        return self._volume[self._start:self._end]
+
+    @property
+    def fresh(self) -> np.ndarray:
+        return self._fresh[self._start:self._end]
+
+
+# Receives the closed candles of one leg from its aggregator, like a Strategy does
+class _LegListener:
+    def __init__(self, barrier: "BarBarrier", leg: int):
+        self.barrier = barrier
+        self.leg = leg
+
+    def on_candle_close(self, candle: Candle):
+        self.barrier.on_leg_close(self.leg, candle)
+
+    def on_trade(self, tick_type: str, price: float):
+        return
+
+    def signal_task(self):
+        return None
+
+
+# Synchronizes the candles of several legs, which close independently on their own BarBuilder (and websocket or
+# CandleScheduler thread): the values of each leg are written to its column of the pending bar, and the bar is released
+# to the callback once every leg has closed its candle, or `timeout` seconds after the first one closed. A leg that
+# closes the next candle before the others also releases the pending bar. The pending bar is made of arrays, so
+# releasing it costs about the same whatever the number of legs. The timeout is a deadline watched by one thread for the
+# lifetime of the barrier, armed and cancelled with each bar instead of starting a timer thread per bar.
+class BarBarrier:
+    def __init__(self, aggregators: List[CandleAggregator], timeout: float, callback: Callable[[int], None]):
+
+        self.aggregators = aggregators
+        self.timeout = timeout
+
+        legs = len(aggregators)
+
+        self.bars = AlignedBars(legs)
+        self.bars.load([aggregator.candles for aggregator in aggregators])
+
+        # Number of bars released by the timeout, with at least one leg missing
+        self.timeouts_count = 0
+
+        self._callback = callback
+        self._listeners = [_LegListener(self, leg) for leg in range(legs)]
+
+        # Pending bar
+        self._pending_ts: Optional[int] = None
+        self._high = np.zeros(legs)
+        self._low = np.zeros(legs)
+        self._close = np.zeros(legs)
+        self._volume = np.zeros(legs)
+        self._closed = np.zeros(legs, dtype=bool)
+        # time.monotonic() at which the pending bar is released by the timeout
+        self._deadline: Optional[float] = None
+
+        self._last_close = self.bars.close[-1].copy() if len(self.bars) > 0 else np.full(legs, math.nan)
+        self._released_ts = self.bars.last_timestamp if len(self.bars) > 0 else -1
+
+        self._lock = threading.Lock()
+        # Wakes up the timeout thread when a deadline is armed or the barrier is stopped
+        self._condition = threading.Condition(self._lock)
+        self._stopped = False
+        # The bars are given to the callback one at a time
+        self._callback_lock = threading.Lock()
+
+    def start(self):
+
+        t = threading.Thread(target=self._run_timeout, daemon=True)
+        t.start()
+
+        for aggregator, listener in zip(self.aggregators, self._listeners):
+            aggregator.subscribe(listener)
+
+    def stop(self):
+
+        for aggregator, listener in zip(self.aggregators, self._listeners):
+            aggregator.unsubscribe(listener)
+
+        with self._condition:
+            self._deadline = None
+            self._stopped = True
+            self._condition.notify()
+
+    def on_leg_close(self, leg: int, candle: Candle):
+
+        released = []
+
+        with self._lock:
+            # Candle of a bar already released by the timeout, only its close is kept for the next bars
+            if candle.timestamp <= self._released_ts:
+                if candle.timestamp == self._released_ts:
+                    self._last_close[leg] = candle.close
+                return
+
+            if self._pending_ts is not None and candle.timestamp > self._pending_ts:
+                released.append(self._release())
+
+            if self._pending_ts is None:
+                self._pending_ts = candle.timestamp
+                self._deadline = time.monotonic() + self.timeout
+                self._condition.notify()
+
+            elif candle.timestamp < self._pending_ts:
+                return
+
+            self._high[leg] = candle.high
+            self._low[leg] = candle.low
+            self._close[leg] = candle.close
+            self._volume[leg] = candle.volume
+            self._closed[leg] = True
+
+            if self._closed.all():
+                released.append(self._release())
+
+        self._notify(released)
+
+    def _run_timeout(self):
+
+        while True:
+            with self._condition:
+                if self._stopped:
+                    return
+
+                if self._deadline is None:
+                    self._condition.wait()
+                    continue
+
+                # Woken up before the deadline, by a new bar or by stop()
+                delay = self._deadline - time.monotonic()
+
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+
+                self.timeouts_count += 1
+
+                logger.warning("Bar %s released after %s seconds without legs %s", self._pending_ts, self.timeout,
+                               [self.aggregators[leg].contract.symbol for leg in np.flatnonzero(~self._closed)])
+
+                released = [self._release()]
+
+            self._notify(released)
+
+    # Append the pending bar to the aligned bars, the missing legs keep their previous close.
+    # Must be called with the lock acquired.
+    # :return: The timestamp of the bar
+    def _release(self) -> int:
+
+        self._deadline = None
+
+        closed = self._closed
+
+        close = np.where(closed, self._close, self._last_close)
+        high = np.where(closed, self._high, close)
+        low = np.where(closed, self._low, close)
+        volume = np.where(closed, self._volume, 0.0)
+
+        timestamp = self._pending_ts
+
+        self.bars.append(timestamp, high, low, close, volume, closed)
+
+        self._last_close = close
+        self._released_ts = timestamp
+        self._pending_ts = None
+        self._closed = np.zeros(len(closed), dtype=bool)
+
+        return timestamp
+
+    def _notify(self, released: List[int]):
+
+        with self._callback_lock:
+            for timestamp in released:
+                try:
+                    self._callback(timestamp)
+                except Exception as e:
+                    logger.error("Error while processing the bar %s: %s", timestamp, e)
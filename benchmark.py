@@ -0,0 +1,341 @@
+import sys
+import time
+import timeit
+from typing import *
+
+import numpy as np
+import pandas as pd
+
+import indicators
+from barrier import BarBarrier
+from candles import CandleAggregator, BarBuilder
+from indicator_registry import IndicatorRegistry
+from models import Candle, Contract
+from rules import Rule, rule_signal, rule_signals
+from strategies import BreakoutStrategy, BollingerStrategy
+
+# Run with: python benchmark.py [benchmark names...]  (all the benchmarks are run if no name is given)
+
+BENCHMARK_SIZES = [1000, 10000, 100000]
+
+
+def _random_candles(size: int, seed: int = 0) -> Dict[str, np.ndarray]:
+
+    rng = np.random.default_rng(seed)
+
+    close = 100 + np.cumsum(rng.normal(0, 1, size))
+    high = close + rng.random(size)
+    low = close - rng.random(size)
+    volume = rng.random(size) * 10
+
+    return {"high": high, "low": low, "close": close, "volume": volume}
+
+
+def _best_time(func: Callable, repeat: int = 5) -> float:
+
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+# How TechnicalStrategy computed its indicators before the indicators module: list of closes -> Series -> ewm()
+def _pandas_rsi(close_list: List[float], rsi_length: int) -> float:
+
+    closes = pd.Series(close_list)
+    delta = closes.diff().dropna()
+
+    up, down = delta.copy(), delta.copy()
+    up[up < 0] = 0
+    down[down > 0] = 0
+
+    avg_gain = up.ewm(com=(rsi_length - 1), min_periods=rsi_length).mean()
+    avg_loss = down.abs().ewm(com=(rsi_length - 1), min_periods=rsi_length).mean()
+
+    rs = avg_gain / avg_loss
+    rsi = 100 - 100 / (1 + rs)
+
+    return rsi.round(2).iloc[-2]
+
+
+def _pandas_macd(close_list: List[float], ema_fast: int, ema_slow: int, ema_signal: int) -> Tuple[float, float]:
+
+    closes = pd.Series(close_list)
+
+    macd_line = closes.ewm(span=ema_fast).mean() - closes.ewm(span=ema_slow).mean()
+    macd_signal = macd_line.ewm(span=ema_signal).mean()
+
+    return macd_line.iloc[-2], macd_signal.iloc[-2]
+
+
+# Compare, for the Technical strategy indicators (RSI 14, MACD 12/26/9):
+#   - the pandas path that recomputes everything from the close prices at every new candle
+#   - the NumPy batch kernels over the whole history (backfill)
+#   - the streaming states, which only process the candle that just closed
+# and time the other batch kernels of the indicators module.
+def benchmark_indicators(sizes: List[int] = BENCHMARK_SIZES):
+
+    print("Indicators (time per call)")
+
+    for size in sizes:
+        candles = _random_candles(size)
+        close, high, low, volume = candles["close"], candles["high"], candles["low"], candles["volume"]
+        close_list = close.tolist()
+
+        scratch = [np.empty(size) for _ in range(3)]
+
+        rsi_state = indicators.RsiState(14)
+        macd_state = indicators.MacdState(12, 26, 9)
+
+        for c in close_list:
+            rsi_state.update(c)
+            macd_state.update(c)
+
+        results = {
+            "pandas RSI + MACD (per new candle)":
+                _best_time(lambda: (_pandas_rsi(close_list, 14), _pandas_macd(close_list, 12, 26, 9))),
+            "streaming RSI + MACD (per new candle)":
+                _best_time(lambda: (rsi_state.update(close_list[-1]), macd_state.update(close_list[-1]))),
+            "batch RSI + MACD":
+                _best_time(lambda: (indicators.rsi(close, 14, out=scratch[0]),
+                                    indicators.macd(close, 12, 26, 9, out=(scratch[1], scratch[2])))),
+            "batch EMA 20": _best_time(lambda: indicators.ema(close, 20, out=scratch[0])),
+            "batch SMA 20": _best_time(lambda: indicators.sma(close, 20, out=scratch[0])),
+            "batch ATR 14": _best_time(lambda: indicators.atr(high, low, close, 14, out=scratch[0])),
+            "batch Bollinger 20": _best_time(lambda: indicators.bollinger(close, 20, out=tuple(scratch))),
+            "batch Stochastic 14/3":
+                _best_time(lambda: indicators.stochastic(high, low, close, 14, 3, out=(scratch[0], scratch[1]))),
+            "batch VWAP": _best_time(lambda: indicators.vwap(high, low, close, volume, out=scratch[0])),
+            "batch ADX 14": _best_time(lambda: indicators.adx(high, low, close, 14, out=tuple(scratch))),
+        }
+
+        print(f"  {size} bars")
+
+        for name, duration in results.items():
+            print(f"    {name:<40} {duration * 1e6:>12.1f} us")
+
+
+# Stand-in for the connectors, the benchmarks never reach the order placement
+class _BenchmarkClient:
+    platform = "binance_futures"
+    futures = True
+
+    def get_trade_size(self, contract: Contract, price: float, balance_pct: float):
+        return None
+
+
+def _benchmark_contract() -> Contract:
+    return Contract({'symbol': "BTCUSDT", 'baseAsset': "BTC", 'quoteAsset': "USDT", 'pricePrecision': 2,
+                     'quantityPrecision': 3}, "binance_futures")
+
+
+# BreakoutStrategy.check_trade() runs on every trade: compare the number of ticks per second it can process with the
+# previous implementation, which read the last two Candle objects at every tick.
+def benchmark_breakout(ticks: int = 100000):
+
+    rng = np.random.default_rng(0)
+    prices = (100 + rng.normal(0, 0.5, ticks)).tolist()
+    sizes = rng.random(ticks).tolist()
+
+    min_volume = 1e9
+    candle_ts = int(time.time() * 1000) // 60000 * 60000
+
+    prev_candle = Candle({'ts': candle_ts - 60000, 'open': 100, 'high': 101, 'low': 99, 'close': 100, 'volume': 10},
+                         "1m", "parse_trade")
+    last_candle = Candle({'ts': candle_ts, 'open': 100, 'high': 100, 'low': 100, 'close': 100, 'volume': 0}, "1m",
+                         "parse_trade")
+    candles = [prev_candle, last_candle]
+
+    def previous_check_trade(price: float):
+        last_candle.close = price
+
+        if candles[-1].close > candles[-2].high and candles[-1].volume > min_volume:
+            return 1
+
+        elif candles[-1].close < candles[-2].low and candles[-1].volume > min_volume:
+            return -1
+
+        else:
+            return 0
+
+    contract = _benchmark_contract()
+    aggregator = CandleAggregator("Binance", contract, "1m")
+    aggregator.load_candles([prev_candle, last_candle])
+
+    builder = BarBuilder("Binance", contract)
+    builder.add_aggregator(aggregator)
+
+    strategy = BreakoutStrategy(_BenchmarkClient(), contract, "Binance", "1m", 10, None, None,
+                                {'min_volume': min_volume, 'lookback': 1})
+    strategy.subscribe(aggregator)
+
+    def run_previous():
+        for price in prices:
+            previous_check_trade(price)
+
+    def run_current():
+        for price in prices:
+            strategy.check_trade("same_candle", price)
+
+    def run_builder():
+        # The whole path of a trade: base candle update + dispatch to the strategy (no TP/SL as there is no trade)
+        timestamp = int(time.time() * 1000)
+
+        for price, size in zip(prices, sizes):
+            builder.parse_trade(price, size, timestamp)
+
+    print(f"Breakout ({ticks} ticks, ticks/second)")
+
+    for name, func in [("previous check_trade()", run_previous), ("check_trade() with trigger levels", run_current),
+                       ("BarBuilder.parse_trade() + check_trade()", run_builder)]:
+        print(f"    {name:<40} {ticks / _best_time(func, repeat=3):>12,.0f}")
+
+
+# BollingerStrategy.check_trade() runs on every trade: compare it with recomputing the bands with pandas over the
+# candles at every trade, and time the O(1) update of the bands when a candle closes.
+def benchmark_bollinger(ticks: int = 100000, size: int = 1000, bb_length: int = 20, bb_std: float = 2.0):
+
+    rng = np.random.default_rng(0)
+    prices = (100 + rng.normal(0, 0.5, ticks)).tolist()
+
+    closes = _random_candles(size)["close"]
+    close_list = closes.tolist()
+
+    candle_ts = int(time.time() * 1000) // 60000 * 60000 - (size - 1) * 60000
+    candles = [Candle({'ts': candle_ts + i * 60000, 'open': c, 'high': c, 'low': c, 'close': c, 'volume': 1}, "1m",
+                      "parse_trade") for i, c in enumerate(close_list)]
+
+    def pandas_check(price: float):
+        series = pd.Series(close_list)
+        middle = series.rolling(bb_length).mean().iloc[-2]
+        std = series.rolling(bb_length).std(ddof=0).iloc[-2]
+
+        if price < middle - bb_std * std:
+            return 1
+        elif price > middle + bb_std * std:
+            return -1
+        return 0
+
+    contract = _benchmark_contract()
+    aggregator = CandleAggregator("Binance", contract, "1m")
+    aggregator.load_candles(candles)
+
+    strategy = BollingerStrategy(_BenchmarkClient(), contract, "Binance", "1m", 10, None, None,
+                                 {'bb_length': bb_length, 'bb_std': bb_std})
+    strategy.subscribe(aggregator)
+
+    bands = indicators.BollingerState(bb_length, bb_std)
+
+    print(f"Bollinger ({size} candles, ticks/second)")
+
+    pandas_ticks = prices[:1000]
+    duration = _best_time(lambda: [pandas_check(p) for p in pandas_ticks], repeat=3)
+    print(f"    {'pandas rolling() per trade':<40} {len(pandas_ticks) / duration:>12,.0f}")
+
+    duration = _best_time(lambda: [strategy.check_trade("same_candle", p) for p in prices], repeat=3)
+    print(f"    {'check_trade() with O(1) bands':<40} {ticks / duration:>12,.0f}")
+
+    duration = _best_time(lambda: bands.update(close_list[-1]))
+    print(f"    {'BollingerState.update() per candle':<40} {duration * 1e6:>12.2f} us")
+
+
+def benchmark_rules(sizes: List[int] = BENCHMARK_SIZES,
+                    long_rule: str = "rsi(14) < 30 and macd_line > macd_signal",
+                    short_rule: str = "rsi(14) > 70 and close < bb_lower(20, 2)"):
+
+    long_rule = Rule(long_rule)
+    short_rule = Rule(short_rule)
+
+    print("Rules (seconds for the whole history)")
+
+    for size in sizes:
+        candles = _random_candles(size)
+        high_list, low_list, close_list = candles["high"].tolist(), candles["low"].tolist(), candles["close"].tolist()
+
+        # Live: the indicator nodes are updated and the rules evaluated after each candle
+        def live():
+            registry = IndicatorRegistry()
+            nodes = {key: registry.acquire(key, {'high': [], 'low': [], 'close': []})
+                     for key in long_rule.keys + short_rule.keys}
+
+            for high, low, close in zip(high_list, low_list, close_list):
+                registry.on_candle_close(high, low, close)
+                rule_signal(long_rule, short_rule, {key: node.value for key, node in nodes.items()})
+
+        print(f"  {size} candles")
+        print(f"    {'live, one candle at a time':<40} {_best_time(live, repeat=3):>12.6f}")
+        duration = _best_time(lambda: rule_signals(long_rule, short_rule, candles))
+        print(f"    {'vectorized rule_signals()':<40} {duration:>12.6f}")
+
+
+# Recursive indicators over 1M bars: pandas ewm() against the kernels, compiled by Numba when it is installed
+def benchmark_kernels(size: int = 1000000, length: int = 14):
+
+    candles = _random_candles(size)
+    high, low, close = candles["high"], candles["low"], candles["close"]
+    out = np.empty(size)
+
+    print(f"Recursive kernels ({size} bars, seconds, Numba {'installed' if indicators.numba else 'not installed'})")
+
+    implementations = [("pandas", False)]
+
+    if indicators.numba is not None:
+        # First call compiles the kernels (or loads them from the cache)
+        indicators.use_numba = True
+        indicators.ema(close, length, out=out)
+        indicators.atr(high, low, close, length, out=out)
+        implementations.append(("numba", True))
+
+    use_numba = indicators.use_numba
+
+    for name, numba_enabled in implementations:
+        indicators.use_numba = numba_enabled
+        print(f"    {'ema() ' + name:<40} {_best_time(lambda: indicators.ema(close, length, out=out)):>12.6f}")
+        print(f"    {'rsi() ' + name:<40} {_best_time(lambda: indicators.rsi(close, length, out=out)):>12.6f}")
+        duration = _best_time(lambda: indicators.atr(high, low, close, length, out=out))
+        print(f"    {'atr() ' + name:<40} {duration:>12.6f}")
+
+    indicators.use_numba = use_numba
+
+    if indicators.numba is None:
+        duration = _best_time(lambda: indicators._ewm_mean_kernel(close, 2 / (length + 1), 0, out), repeat=1)
+        print(f"    {'ema() kernel without Numba':<40} {duration:>12.6f}")
+
+
+# Cost of synchronizing one bar of all the legs with a BarBarrier, as a function of the number of legs
+def benchmark_barrier(legs_counts: List[int] = [1, 2, 20], bars: int = 2000):
+
+    print("Bar barrier (microseconds per bar)")
+
+    for legs in legs_counts:
+        aggregators = [CandleAggregator("Binance", _benchmark_contract(), "1m") for _ in range(legs)]
+        barrier = BarBarrier(aggregators, 60, lambda timestamp: None)
+
+        candles = [Candle({'ts': i * 60000, 'open': 100, 'high': 101, 'low': 99, 'close': 100, 'volume': 1}, "1m",
+                          "parse_trade") for i in range(bars)]
+
+        start = time.perf_counter()
+
+        for candle in candles:
+            for leg in range(legs):
+                barrier.on_leg_close(leg, candle)
+
+        duration = time.perf_counter() - start
+
+        print(f"    {str(legs) + ' legs':<40} {duration / bars * 1e6:>12.2f}")
+
+
+BENCHMARKS = {
+    "indicators": benchmark_indicators,
+    "breakout": benchmark_breakout,
+    "bollinger": benchmark_bollinger,
+    "rules": benchmark_rules,
+    "kernels": benchmark_kernels,
+    "barrier": benchmark_barrier,
+}
+
+
+if __name__ == "__main__":
+
+    for benchmark_name in sys.argv[1:] or list(BENCHMARKS):
+        BENCHMARKS[benchmark_name]()
@@ -0,0 +1,784 @@
+import contextlib
+import logging
+import math
+import pickle
+import threading
+import time
+from typing import *
+
+import numpy as np
+import pandas as pd
+
+from models import Candle, Contract
+from triggers import TriggerIndex
+from indicator_registry import IndicatorRegistry, IndicatorNode
+from executor import CandleCloseExecutor
+
+# Import the Strategy class name only for typing purpose
+if TYPE_CHECKING:
+    from strategies import Strategy
+
+logger = logging.getLogger()
+
+TF_UNITS = {"s": 1000, "m": 60 * 1000, "h": 60 * 60 * 1000, "d": 24 * 60 * 60 * 1000}
+
+
+# Convert a timeframe to its duration in milliseconds, e.g. "15s", "3m", "2h" or "1d"
+def timeframe_to_ms(timeframe: str) -> int:
+
+    try:
+        duration = int(timeframe[:-1]) * TF_UNITS[timeframe[-1]]
+    except (ValueError, KeyError):
+        raise ValueError(f"Invalid timeframe: {timeframe}")
+
+    if duration <= 0:
+        raise ValueError(f"Invalid timeframe: {timeframe}")
+
+    return duration
+
+
+# Number of candles kept in memory for each strategy (the most recent ones). Binance returns 1000 historical candles
+# and Bitmex 500, so the whole history fits in the buffer when a strategy starts.
+CANDLE_BUFFER_SIZE = 1000
+
+CANDLE_FIELDS = ["timestamp", "open", "high", "low", "close", "volume"]
+
+
+# Fixed capacity columnar storage of the most recent candles.
+# Each field is stored in its own NumPy array, twice as long as the capacity: new candles are written one after the
+# other and when the end of the arrays is reached, the last candles are moved back to the start (which happens only
+# once every `capacity` candles, so appending is O(1) amortized). The candles are therefore always contiguous and
+# the views returned by the properties below don't copy any data.
+# The views are only valid until the next append() call.
+class CandleBuffer:
+    def __init__(self, capacity: int = CANDLE_BUFFER_SIZE):
+
+        self.capacity = capacity
+
+        self._timestamp = np.zeros(2 * capacity, dtype=np.int64)
+        self._open = np.zeros(2 * capacity, dtype=np.float64)
+        self._high = np.zeros(2 * capacity, dtype=np.float64)
+        self._low = np.zeros(2 * capacity, dtype=np.float64)
+        self._close = np.zeros(2 * capacity, dtype=np.float64)
+        self._volume = np.zeros(2 * capacity, dtype=np.float64)
+
+        self._start = 0
+        self._end = 0
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    # Build a Candle object from the stored data, e.g. self.candles[-1]
+    def __getitem__(self, index: int) -> Candle:
+
+        length = self._end - self._start
+
+        if index < 0:
+            index += length
+
+        if not 0 <= index < length:
+            raise IndexError("CandleBuffer index out of range")
+
+        i = self._start + index
+
+        candle_info = {'ts': int(self._timestamp[i]), 'open': float(self._open[i]), 'high': float(self._high[i]),
+                       'low': float(self._low[i]), 'close': float(self._close[i]), 'volume': float(self._volume[i])}
+
+        return Candle(candle_info, None, "parse_trade")
+
+    # Add a new candle after the last one, the oldest candle is dropped if the buffer is full
+    def append(self, timestamp: int, open_price: float, high: float, low: float, close: float, volume: float):
+
+        if self._end == 2 * self.capacity:
+            self._compact()
+
+        i = self._end
+
+        self._timestamp[i] = timestamp
+        self._open[i] = open_price
+        self._high[i] = high
+        self._low[i] = low
+        self._close[i] = close
+        self._volume[i] = volume
+
+        self._end += 1
+
+        if self._end - self._start > self.capacity:
+            self._start += 1
+
+    def append_candle(self, candle: Candle):
+        self.append(candle.timestamp, candle.open, candle.high, candle.low, candle.close, candle.volume)
+
+    def extend(self, candles: List[Candle]):
+        for candle in candles[-self.capacity:]:
+            self.append_candle(candle)
+
+    # Replace the content of the buffer with an array of each field (see last()), e.g. from a checkpoint
+    def load_arrays(self, fields: Dict[str, np.ndarray]):
+
+        size = min(len(fields['timestamp']), self.capacity)
+
+        for arr, field in zip((self._timestamp, self._open, self._high, self._low, self._close, self._volume),
+                              CANDLE_FIELDS):
+            arr[:size] = fields[field][len(fields[field]) - size:]
+
+        self._start = 0
+        self._end = size
+
+    # Update the last candle in place with a new trade
+    def update_last(self, price: float, size: float):
+
+        i = self._end - 1
+
+        self._close[i] = price
+        self._volume[i] += size
+
+        if price > self._high[i]:
+            self._high[i] = price
+
+        elif price < self._low[i]:
+            self._low[i] = price
+
+    # Merge a shorter candle into the last candle
+    def merge_last(self, high: float, low: float, close: float, volume: float):
+
+        i = self._end - 1
+
+        self._close[i] = close
+        self._volume[i] += volume
+
+        if high > self._high[i]:
+            self._high[i] = high
+
+        if low < self._low[i]:
+            self._low[i] = low
+
+    # Replace the prices of the last candle, e.g. a candle opened without any trade that receives its first trade
+    def reset_last(self, price: float):
+        self.reset(-1, price)
+
+    # Replace the prices of a candle that may not be the last one
+    def reset(self, index: int, price: float):
+
+        i = self._end + index if index < 0 else self._start + index
+
+        self._open[i] = self._high[i] = self._low[i] = self._close[i] = price
+
+    # Add trades that arrived late to a candle that may not be the last one. The close price is only given if the trades
+    # are more recent than the ones the candle already received.
+    def amend(self, index: int, high: float, low: float, volume: float, close: Optional[float] = None):
+
+        i = self._end + index if index < 0 else self._start + index
+
+        self._volume[i] += volume
+
+        if close is not None:
+            self._close[i] = close
+
+        if high > self._high[i]:
+            self._high[i] = high
+
+        if low < self._low[i]:
+            self._low[i] = low
+
+    # Move the last capacity - 1 candles to the start of the arrays to make room for the next ones
+    def _compact(self):
+
+        keep = min(self._end - self._start, self.capacity - 1)
+        src = self._end - keep
+
+        for arr in (self._timestamp, self._open, self._high, self._low, self._close, self._volume):
+            arr[:keep] = arr[src:self._end]
+
+        self._start = 0
+        self._end = keep
+
+    @property
+    def last_timestamp(self) -> int:
+        return int(self._timestamp[self._end - 1])
+
+    @property
+    def last_close(self) -> float:
+        return float(self._close[self._end - 1])
+
+    @property
+    def timestamp(self) -> np.ndarray:
+        return self._timestamp[self._start:self._end]
+
+    @property
+    def open(self) -> np.ndarray:
+        return self._open[self._start:self._end]
+
+    @property
+    def high(self) -> np.ndarray:
+        return self._high[self._start:self._end]
+
+    @property
+    def low(self) -> np.ndarray:
+        return self._low[self._start:self._end]
+
+    @property
+    def close(self) -> np.ndarray:
+        return self._close[self._start:self._end]
+
+    @property
+    def volume(self) -> np.ndarray:
+        return self._volume[self._start:self._end]
+
+    # Views of the last n candles (all of them if n is None), for each field
+    def last(self, n: Optional[int] = None) -> Dict[str, np.ndarray]:
+
+        start = self._start if n is None else max(self._start, self._end - n)
+
+        return {"timestamp": self._timestamp[start:self._end], "open": self._open[start:self._end],
+                "high": self._high[start:self._end], "low": self._low[start:self._end],
+                "close": self._close[start:self._end], "volume": self._volume[start:self._end]}
+
+    # pandas Series backed by the buffer memory (no copy), e.g. self.candles.series("close", 200)
+    def series(self, field: str, n: Optional[int] = None) -> pd.Series:
+        return pd.Series(self.last(n)[field], copy=False)
+
+    # DataFrame of the last n candles. Unlike series(), building a DataFrame copies the data.
+    def to_dataframe(self, n: Optional[int] = None) -> pd.DataFrame:
+        return pd.DataFrame(self.last(n), columns=CANDLE_FIELDS)
+
+
+# Candles of one (exchange, symbol, timeframe), shared by all the strategies running on it.
+# The aggregator doesn't parse the trades itself: the BarBuilder of the symbol aggregates them into base candles and
+# rolls each base candle up into the aggregators when it closes. The last candle of the buffer therefore contains
+# the closed base candles of the current period only, the live values (including the base candle in progress) are
+# available with the last_price/live_*() methods.
+class CandleAggregator:
+    def __init__(self, exchange: str, contract: Contract, timeframe: str):
+
+        self.exchange = exchange
+        self.contract = contract
+        self.tf = timeframe
+        self.tf_equiv = timeframe_to_ms(timeframe)
+
+        self.candles = CandleBuffer()
+
+        self.builder: Optional["BarBuilder"] = None
+
+        # Indicators shared by the strategies, updated when a candle closes
+        self.indicators = IndicatorRegistry()
+
+        # The last candle has been opened by the CandleScheduler and hasn't received any trade yet
+        self._opened_on_time = False
+
+        # Timestamp of the newest trade of the last candle and of the previous one, None if the candle hasn't received
+        # any trade. A late trade more recent than it also updates the close of the candle (see add_late_trade()).
+        self._last_trade_ts: Optional[int] = None
+        self._prev_trade_ts: Optional[int] = None
+
+        # Replaced by a new list (never modified in place) so that the websocket thread can loop through it while
+        # a strategy is added or removed from the interface.
+        self.strategies: List["Strategy"] = []
+
+    def load_candles(self, candles: List[Candle]):
+        self.candles.extend(candles)
+        self._reset_trade_ts()
+
+    # The trades of the candles loaded from the history or a checkpoint are unknown, any trade of their period is
+    # considered more recent
+    def _reset_trade_ts(self):
+
+        self._last_trade_ts = int(self.candles.timestamp[-1]) if len(self.candles) > 0 else None
+        self._prev_trade_ts = int(self.candles.timestamp[-2]) if len(self.candles) > 1 else None
+
+    # :param trade_ts: Timestamp of the first trade of the candle, None if it is opened without any trade
+    def _append_candle(self, period_ts: int, price: float, trade_ts: Optional[int]):
+
+        self.candles.append(period_ts, price, price, price, price, 0)
+
+        self._prev_trade_ts = self._last_trade_ts
+        self._last_trade_ts = trade_ts
+
+    def subscribe(self, strategy: "Strategy"):
+        self.strategies = self.strategies + [strategy]
+
+    def unsubscribe(self, strategy: "Strategy"):
+        self.strategies = [s for s in self.strategies if s is not strategy]
+
+    # Lock of the BarBuilder updating the candles (websocket and CandleScheduler threads), to read them from another
+    # thread
+    def _builder_lock(self) -> ContextManager:
+        return self.builder.lock if self.builder is not None else contextlib.nullcontext()
+
+    # Get a shared indicator (see indicator_registry.py), computed on the closed candles. The lock is held until the
+    # node is registered, so that no candle closes between the copy of the candles and the first update of the node.
+    def acquire_indicator(self, key: Tuple) -> IndicatorNode:
+
+        with self._builder_lock():
+            # The last candle is still in progress
+            candles = {'timestamp': self.candles.timestamp[:-1].tolist(), 'high': self.candles.high[:-1].tolist(),
+                       'low': self.candles.low[:-1].tolist(), 'close': self.candles.close[:-1].tolist()}
+
+            return self.indicators.acquire(key, candles)
+
+    # Copy of the closed candles
+    def closed_candles(self) -> List[Candle]:
+
+        with self._builder_lock():
+            return [self.candles[i] for i in range(len(self.candles) - 1)]
+
+    def release_indicator(self, key: Tuple):
+        self.indicators.release(key)
+
+    # Candles and indicator states to be saved in a checkpoint (see checkpoint.py). The indicators are the ones of the
+    # last closed candle.
+    def snapshot(self) -> Dict[str, Any]:
+
+        closed_ts = int(self.candles.timestamp[-2]) if len(self.candles) > 1 else None
+
+        return {'candles': {field: values.copy() for field, values in self.candles.last().items()},
+                'indicators': self.indicators.snapshot(), 'closed_ts': closed_ts}
+
+    # Start from a snapshot instead of the whole history. The missed candles are the ones that started since the last
+    # candle of the snapshot (included, with its final values), the last one being in progress. The indicators of the
+    # snapshot are brought up to date with the missed candles when the strategies acquire them.
+    def restore(self, snapshot: Dict[str, Any], missed_candles: List[Candle]):
+
+        fields = snapshot['candles']
+
+        if len(missed_candles) > 0:
+            fields = {field: values[:-1] for field, values in fields.items()}
+
+        self.candles.load_arrays(fields)
+        self.candles.extend(missed_candles)
+        self._reset_trade_ts()
+
+        if snapshot['closed_ts'] is not None:
+            self.indicators.restore(snapshot['indicators'], snapshot['closed_ts'])
+
+    # The candle that just closed updates the shared indicators, then is sent to every strategy
+    def _close_last_candle(self):
+
+        candle = self.candles[-1]
+
+        self.indicators.on_candle_close(candle.high, candle.low, candle.close)
+
+        for strategy in self.strategies:
+            strategy.on_candle_close(candle)
+
+    # Called when a new base candle starts, with the price of its first trade.
+    # Closes the current candle (and creates the missing ones) if the base candle belongs to a later period.
+    def start_base_candle(self, base_ts: int, price: float) -> str:
+
+        period_ts = base_ts - base_ts % self.tf_equiv
+
+        if len(self.candles) == 0:
+            self._append_candle(period_ts, price, base_ts)
+            return "same_candle"
+
+        last_ts = self.candles.last_timestamp
+
+        # Same Candle
+        if period_ts <= last_ts:
+            # First trade of a candle opened on time, which only has the close price of the previous candle
+            if self._opened_on_time and period_ts == last_ts:
+                self.candles.reset_last(price)
+                self._opened_on_time = False
+                self._last_trade_ts = base_ts
+
+            return "same_candle"
+
+        missing_candles = (period_ts - last_ts) // self.tf_equiv - 1
+
+        # Missing Candle(s)
+        if missing_candles > 0:
+            logger.info("%s missing %s candles for %s %s (%s %s)", self.exchange, missing_candles,
+                        self.contract.symbol, self.tf, base_ts, last_ts)
+
+            last_close = self.candles.last_close
+
+            for missing in range(missing_candles):
+                self._close_last_candle()
+
+                last_ts += self.tf_equiv
+                self._append_candle(last_ts, last_close, None)
+
+        # New Candle
+        else:
+            logger.info("%s New candle for %s %s", self.exchange, self.contract.symbol, self.tf)
+
+        self._close_last_candle()
+
+        # The volume and the other prices will come with the base candle when it closes
+        self._append_candle(period_ts, price, base_ts)
+        self._opened_on_time = False
+
+        return "new_candle"
+
+    # Called by the BarBuilder when the CandleScheduler reaches the end of the current candle: the new candle starts
+    # with the close price of the previous one, until its first trade arrives.
+    # :return: "new_candle" if a new candle has been opened
+    def start_candle_on_time(self, period_ts: int) -> str:
+
+        if len(self.candles) == 0 or period_ts % self.tf_equiv != 0:
+            return "same_candle"
+
+        tick_type = self.start_base_candle(period_ts, self.candles.last_close)
+
+        if tick_type == "new_candle":
+            self._opened_on_time = True
+            self._last_trade_ts = None
+
+        return tick_type
+
+    # Reconcile trades (from first_ts to last_ts) that arrived after their base candle was closed by the
+    # CandleScheduler, with the current or the previous candle. The close is updated if they are the most recent trades
+    # of the candle. When the previous candle is amended, the shared indicators are computed again with its new values,
+    # but the strategies are not notified again.
+    def add_late_trade(self, first_ts: int, last_ts: int, open_price: float, high: float, low: float, close: float,
+                       volume: float):
+
+        for index in (-1, -2):
+            if len(self.candles) >= -index and 0 <= first_ts - self.candles.timestamp[index] < self.tf_equiv:
+                break
+        else:
+            logger.warning("%s %s %s: trade of %s too late to be added to the candles", self.exchange,
+                           self.contract.symbol, self.tf, first_ts)
+            return
+
+        trade_ts = self._last_trade_ts if index == -1 else self._prev_trade_ts
+
+        # First trade of a candle opened without any trade, which only has the close price of the previous candle
+        if trade_ts is None:
+            self.candles.reset(index, open_price)
+
+            if index == -1:
+                self._opened_on_time = False
+
+        if trade_ts is None or last_ts >= trade_ts:
+            self.candles.amend(index, high, low, volume, close)
+
+            if index == -1:
+                self._last_trade_ts = last_ts
+            else:
+                self._prev_trade_ts = last_ts
+        else:
+            self.candles.amend(index, high, low, volume)
+
+        if index == -2:
+            candle = self.candles[-2]
+            self.indicators.amend_last_close(candle.high, candle.low, candle.close)
+
+            # The candle in progress still has no trade, it opens at the new close
+            if self._last_trade_ts is None:
+                self.candles.reset_last(candle.close)
+
+    # Roll up a closed base candle into the current candle. Base candles that started before the current candle are
+    # ignored, their trades are already included in the historical candles.
+    def add_base_candle(self, base_ts: int, high: float, low: float, close: float, volume: float, last_trade_ts: int):
+
+        if len(self.candles) == 0 or base_ts < self.candles.last_timestamp:
+            return
+
+        self.candles.merge_last(high, low, close, volume)
+
+        if self._last_trade_ts is None or last_trade_ts > self._last_trade_ts:
+            self._last_trade_ts = last_trade_ts
+
+    def _includes_base_candle(self) -> bool:
+        return self.builder is not None and self.builder.base_ts is not None and len(self.candles) > 0 \
+            and self.builder.base_ts >= self.candles.last_timestamp
+
+    # Price of the last trade
+    @property
+    def last_price(self) -> float:
+
+        if self._includes_base_candle():
+            return self.builder.close
+
+        return self.candles.last_close
+
+    # Values of the candle in progress, including the base candle that hasn't closed yet
+    def live_high(self) -> float:
+
+        if self._includes_base_candle():
+            return max(self.candles.high[-1], self.builder.high)
+
+        return float(self.candles.high[-1])
+
+    def live_low(self) -> float:
+
+        if self._includes_base_candle():
+            return min(self.candles.low[-1], self.builder.low)
+
+        return float(self.candles.low[-1])
+
+    def live_volume(self) -> float:
+
+        if self._includes_base_candle():
+            return self.candles.volume[-1] + self.builder.volume
+
+        return float(self.candles.volume[-1])
+
+
+# Aggregates the trades of one (exchange, symbol) into base candles, and rolls them up into the aggregators of every
+# timeframe used by the strategies. The base timeframe is the greatest common divisor of these timeframes (e.g. 1m for
+# 3m and 2h), so each trade only updates a few floats whatever the number of timeframes, and the aggregators are only
+# updated when a base candle closes.
+class BarBuilder:
+    def __init__(self, exchange: str, contract: Contract):
+
+        self.exchange = exchange
+        self.contract = contract
+
+        # Replaced by a new dictionary (never modified in place), see CandleAggregator.strategies
+        self.aggregators: Dict[str, CandleAggregator] = dict()
+        self.base_equiv: Optional[int] = None
+
+        # Base candle in progress
+        self.base_ts: Optional[int] = None
+        self._base_end = 0
+        self.open = 0.0
+        self.high = 0.0
+        self.low = 0.0
+        self.close = 0.0
+        self.volume = 0.0
+        # Timestamp of the newest trade of the base candle
+        self.last_trade_ts = 0
+
+        # Take profit / Stop loss levels of the open trades of the symbol
+        self.triggers = TriggerIndex()
+
+        # Evaluates the signals of the strategies in parallel when candles close, set by the client
+        self.executor: Optional[CandleCloseExecutor] = None
+
+        # End of the last base candle closed by the CandleScheduler, the trades before it are late
+        self.closed_until = 0
+
+        # The trades (websocket thread) and the CandleScheduler thread both update the candles, the interface thread
+        # adds the timeframes and reads the candles of the new strategies
+        self.lock = threading.Lock()
+
+    # Called from the interface thread, the lock is held as the base candle in progress may be closed
+    def add_aggregator(self, aggregator: CandleAggregator):
+
+        with self.lock:
+            aggregator.builder = self
+
+            self.aggregators = {**self.aggregators, aggregator.tf: aggregator}
+            self._update_base_timeframe()
+
+    def remove_aggregator(self, aggregator: CandleAggregator):
+
+        with self.lock:
+            self.aggregators = {tf: a for tf, a in self.aggregators.items() if a is not aggregator}
+            self._update_base_timeframe()
+
+    def _update_base_timeframe(self):
+
+        base_equiv = None
+
+        for aggregator in self.aggregators.values():
+            base_equiv = aggregator.tf_equiv if base_equiv is None else math.gcd(base_equiv, aggregator.tf_equiv)
+
+        if base_equiv is not None and self.base_equiv is not None and base_equiv < self.base_equiv:
+            # The base candle in progress is too long for the new timeframe, close it now so that the next trades
+            # start a shorter one
+            self._close_base_candle()
+
+        self.base_equiv = base_equiv
+
+    def _close_base_candle(self):
+
+        if self.base_ts is None:
+            return
+
+        for aggregator in self.aggregators.values():
+            aggregator.add_base_candle(self.base_ts, self.high, self.low, self.close, self.volume, self.last_trade_ts)
+
+        self.base_ts = None
+
+    # First base timeframe boundary after a timestamp
+    def next_boundary(self, timestamp: int) -> Optional[int]:
+
+        if self.base_equiv is None:
+            return None
+
+        return timestamp - timestamp % self.base_equiv + self.base_equiv
+
+    # Called by the CandleScheduler at the end of every base candle (in exchange time), even if there was no trade:
+    # close the base candle and start the candles whose period begins at the boundary.
+    # :return: The next boundary
+    def close_on_time(self, boundary: int) -> Optional[int]:
+
+        with self.lock:
+            if self.base_equiv is None:
+                return None
+
+            if boundary > self.closed_until and boundary % self.base_equiv == 0:
+                self.closed_until = boundary
+
+                if self.base_ts is not None and self._base_end <= boundary:
+                    self._close_base_candle()
+
+                for aggregator in self.aggregators.values():
+                    tick_type = aggregator.start_candle_on_time(boundary)
+
+                    if tick_type == "new_candle":
+                        self._dispatch(aggregator, tick_type, aggregator.candles.last_close)
+
+            return self.next_boundary(boundary)
+
+    # Notify the strategies of an aggregator. The new candles go through the executor if there is one, which must then
+    # be flushed once the lock is released.
+    def _dispatch(self, aggregator: CandleAggregator, tick_type: str, price: float):
+
+        if tick_type == "new_candle" and self.executor is not None:
+            for strategy in aggregator.strategies:
+                self.executor.submit(strategy, price)
+        else:
+            for strategy in aggregator.strategies:
+                strategy.on_trade(tick_type, price)
+
+    # Serialized snapshots of the aggregators by timeframe, taken with the lock so that the candles and the indicators
+    # match
+    def checkpoint(self) -> Dict[str, bytes]:
+
+        with self.lock:
+            return {tf: pickle.dumps(aggregator.snapshot(), protocol=pickle.HIGHEST_PROTOCOL)
+                    for tf, aggregator in self.aggregators.items() if len(aggregator.candles) > 0}
+
+    def _flush_executor(self):
+
+        if self.executor is not None:
+            self.executor.flush()
+
+    # Parse new trades coming in from the websocket, update the candles and notify the strategies
+    def parse_trade(self, price: float, size: float, timestamp: int):
+
+        with self.lock:
+            self._parse_delta(price, price, price, price, size, timestamp, timestamp)
+
+        self._flush_executor()
+
+    # Parse a burst of trades (price, size, timestamp) as a few OHLCV deltas (see TradeConflator): the trades are merged
+    # as long as they belong to the same base candle and are less than max_window_ms apart from the first one, so the
+    # strategies and the Take profit / Stop loss are checked once per delta instead of once per trade.
+    # :return: The number of deltas
+    def parse_trades(self, trades: List[Tuple[float, float, int]], max_window_ms: int) -> int:
+
+        deltas = 0
+
+        with self.lock:
+            if self.base_equiv is None:
+                return 0
+
+            i = 0
+
+            while i < len(trades):
+                open_price, volume, first_ts = trades[i]
+                high = low = close = open_price
+                last_ts = first_ts
+
+                period_end = first_ts - first_ts % self.base_equiv + self.base_equiv
+                window_end = min(period_end, first_ts + max_window_ms)
+
+                i += 1
+
+                while i < len(trades) and first_ts <= trades[i][2] < window_end:
+                    close, size, last_ts = trades[i]
+                    volume += size
+
+                    if close > high:
+                        high = close
+
+                    elif close < low:
+                        low = close
+
+                    i += 1
+
+                self._parse_delta(open_price, high, low, close, volume, first_ts, last_ts)
+                deltas += 1
+
+        self._flush_executor()
+
+        return deltas
+
+    # Update the candles with one or more trades of the same base candle, from first_ts to last_ts, and notify the
+    # strategies
+    def _parse_delta(self, open_price: float, high: float, low: float, close: float, volume: float, first_ts: int,
+                     last_ts: int):
+
+        timestamp_diff = int(time.time() * 1000) - last_ts
+
+        if timestamp_diff >= 2000:
+            logger.warning("%s %s: %s milliseconds of difference between the current time and the trade time",
+                           self.exchange, self.contract.symbol, timestamp_diff)
+
+        aggregators = self.aggregators
+
+        if self.base_equiv is None:
+            return
+
+        self.triggers.check(close, high, low)
+
+        # Late trade, its base candle has already been closed
+        if first_ts < self.closed_until or (self.base_ts is not None and first_ts < self.base_ts):
+            for aggregator in aggregators.values():
+                aggregator.add_late_trade(first_ts, last_ts, open_price, high, low, close, volume)
+
+            return
+
+        # Same base candle
+        if self.base_ts is not None and first_ts < self._base_end:
+            self.close = close
+            self.volume += volume
+            self.last_trade_ts = max(self.last_trade_ts, last_ts)
+
+            if high > self.high:
+                self.high = high
+
+            if low < self.low:
+                self.low = low
+
+            for aggregator in aggregators.values():
+                for strategy in aggregator.strategies:
+                    strategy.on_trade("same_candle", close)
+
+            return
+
+        # New base candle
+        self._close_base_candle()
+
+        self.base_ts = first_ts - first_ts % self.base_equiv
+        self._base_end = self.base_ts + self.base_equiv
+        self.open = open_price
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self.last_trade_ts = last_ts
+
+        for aggregator in aggregators.values():
+            tick_type = aggregator.start_base_candle(self.base_ts, open_price)
+
+            self._dispatch(aggregator, tick_type, close)
+
+
+# Group candles into longer candles, e.g. to build the 3m candles history from the 1m candles.
+# The duration of the candles must be a divisor of tf_equiv.
+def resample_candles(candles: List[Candle], tf_equiv: int) -> List[Candle]:
+
+    resampled = []
+
+    for candle in candles:
+        period_ts = candle.timestamp - candle.timestamp % tf_equiv
+
+        if len(resampled) > 0 and resampled[-1].timestamp == period_ts:
+            last = resampled[-1]
+            last.high = max(last.high, candle.high)
+            last.low = min(last.low, candle.low)
+            last.close = candle.close
+            last.volume += candle.volume
+
+        else:
+            candle_info = {'ts': period_ts, 'open': candle.open, 'high': candle.high, 'low': candle.low,
+                           'close': candle.close, 'volume': candle.volume}
+            resampled.append(Candle(candle_info, None, "parse_trade"))
+
+    return resampled
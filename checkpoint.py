@@ -0,0 +1,166 @@
+import logging
+import os
+import pickle
+import threading
+import time
+from typing import *
+
+from models import Contract
+from candles import CandleAggregator, timeframe_to_ms
+
+# Import the connector class names only for typing purpose
+if TYPE_CHECKING:
+    from connectors.binance import BinanceClient
+    from connectors.bitmex import BitmexClient
+
+logger = logging.getLogger()
+
+CHECKPOINT_INTERVAL = 30
+
+
+# Saves regularly the runtime state of the clients to disk, so that after a restart the strategies start from it instead
+# of the whole history:
+#   - one file per (exchange, symbol, timeframe) with the candles and the indicator states of the aggregator, restored
+#     with only the candles missed since the checkpoint (see restore_aggregator())
+#   - one file per exchange with the state of the strategies (open trades and pending orders) by checkpoint id: the
+#     running ones are updated, the others are kept until they are switched on again, and removed when switched off
+# The files are pickled NumPy arrays and indicator states, and are replaced atomically.
+class Checkpoints:
+    def __init__(self, directory: str = "checkpoints", interval: float = CHECKPOINT_INTERVAL):
+
+        self.directory = directory
+        self.interval = interval
+
+        os.makedirs(directory, exist_ok=True)
+
+        self._clients: List[Tuple[str, Union["BinanceClient", "BitmexClient"]]] = []
+        self._lock = threading.Lock()
+
+        # Content of the strategies file of each exchange, read once
+        self._strategy_states: Dict[str, Dict[str, Any]] = dict()
+
+        t = threading.Thread(target=self._run, daemon=True)
+        t.start()
+
+    def add_client(self, exchange: str, client: Union["BinanceClient", "BitmexClient"]):
+
+        self._clients = self._clients + [(exchange, client)]
+        client.checkpoints = self
+
+    def _path(self, *parts: str) -> str:
+        return os.path.join(self.directory, "_".join(parts) + ".pkl")
+
+    def _write(self, path: str, data: bytes):
+
+        tmp_path = path + ".tmp"
+
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+
+        os.replace(tmp_path, path)
+
+    def _read(self, path: str) -> Optional[Any]:
+
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except Exception as e:
+            logger.error("Error while reading the checkpoint %s: %s", path, e)
+            return None
+
+    def _run(self):
+
+        while True:
+            time.sleep(self.interval)
+
+            try:
+                self.save()
+            except Exception as e:
+                logger.error("Error while saving the checkpoints: %s", e)
+
+    # Also called when the application is closed
+    def save(self):
+
+        with self._lock:
+            for exchange, client in self._clients:
+                # The dictionaries are modified by the other threads (new symbols, strategies switched on or off)
+                for symbol, builder in list(client.bar_builders.items()):
+                    for timeframe, data in builder.checkpoint().items():
+                        self._write(self._path(exchange, symbol, timeframe), data)
+
+                self._write_strategies(exchange, client)
+
+    # Called right away when a trade is opened or closed and when a strategy is switched off, so that the state on disk
+    # never has a trade that is not open anymore (it would be managed again after a restart)
+    # :param removed: checkpoint id of a strategy switched off, whose state is deleted
+    def save_strategies(self, client: Union["BinanceClient", "BitmexClient"], removed: Optional[str] = None):
+
+        with self._lock:
+            for exchange, c in self._clients:
+                if c is client:
+                    self._write_strategies(exchange, client, removed)
+
+    # Must be called with the lock acquired
+    def _write_strategies(self, exchange: str, client: Union["BinanceClient", "BitmexClient"],
+                          removed: Optional[str] = None):
+
+        states = dict(self._load_strategies(exchange))
+
+        if removed is not None:
+            states.pop(removed, None)
+
+        for strategy in list(client.strategies.values()):
+            if strategy.checkpoint_id is not None:
+                states[strategy.checkpoint_id] = strategy.get_state()
+
+        self._write(self._path(exchange, "strategies"), pickle.dumps(states, protocol=pickle.HIGHEST_PROTOCOL))
+        self._strategy_states[exchange] = states
+
+    def _load_strategies(self, exchange: str) -> Dict[str, Any]:
+
+        if exchange not in self._strategy_states:
+            self._strategy_states[exchange] = self._read(self._path(exchange, "strategies")) or dict()
+
+        return self._strategy_states[exchange]
+
+    # Create an aggregator from the last checkpoint and the candles missed since.
+    # :return: None if there is no checkpoint, or if it is too old for the missed candles to be fetched in one request
+    def restore_aggregator(self, exchange: str, client: Union["BinanceClient", "BitmexClient"], contract: Contract,
+                           timeframe: str) -> Optional[CandleAggregator]:
+
+        snapshot = self._read(self._path(exchange, contract.symbol, timeframe))
+
+        if snapshot is None or len(snapshot['candles']['timestamp']) == 0:
+            return None
+
+        tf_equiv = timeframe_to_ms(timeframe)
+        last_ts = int(snapshot['candles']['timestamp'][-1])
+        now = client.candle_scheduler.exchange_time()
+
+        missed_candles = []
+
+        # The candle in progress at the checkpoint has closed since then
+        if now >= last_ts + tf_equiv:
+            missed_candles = client.get_historical_candles(contract, timeframe, start_time=last_ts)
+
+            if len(missed_candles) == 0 or missed_candles[0].timestamp != last_ts or \
+                    missed_candles[-1].timestamp < now - now % tf_equiv - tf_equiv:
+                logger.info("%s %s %s: checkpoint too old, loading the whole history", exchange, contract.symbol,
+                            timeframe)
+                return None
+
+        aggregator = CandleAggregator(exchange, contract, timeframe)
+        aggregator.restore(snapshot, missed_candles)
+
+        logger.info("%s %s %s restored from the checkpoint with %s missed candles", exchange, contract.symbol,
+                    timeframe, max(len(missed_candles) - 1, 0))
+
+        return aggregator
+
+    def load_strategy(self, exchange: str, checkpoint_id: str) -> Optional[Dict[str, Any]]:
+
+        with self._lock:
+            return self._load_strategies(exchange).get(checkpoint_id)
@@ -0,0 +1,110 @@
+import collections
+import logging
+import threading
+import time
+from typing import *
+
+# Import the BarBuilder class name only for typing purpose
+if TYPE_CHECKING:
+    from candles import BarBuilder
+
+logger = logging.getLogger()
+
+# Seconds between two logs of the conflation counters
+STATS_INTERVAL = 60
+
+
+# Optional stage between the websocket and the BarBuilders, for the bursts of trades (e.g. liquidation cascades).
+# The websocket thread only queues the trades, and a separate thread takes all the trades queued while it was busy and
+# gives them to the BarBuilder of their symbol, which merges them into OHLCV deltas (see BarBuilder.parse_trades()): the
+# strategies and the Take profit / Stop loss are then checked once per delta instead of once per trade, and the highs,
+# lows and volumes of all the trades are kept. When the trades come slowly, each trade is still processed on its own.
+class TradeConflator:
+    def __init__(self, exchange: str, get_builder: Callable[[str], Optional["BarBuilder"]], max_window_ms: int):
+
+        self.exchange = exchange
+        self.max_window_ms = max_window_ms
+
+        self._get_builder = get_builder
+
+        # Appending and popping from both ends of a deque is thread-safe
+        self._queue: Deque[Tuple[str, float, float, int]] = collections.deque()
+        self._new_trades = threading.Event()
+
+        # Counters of how much conflation occurred
+        self.trades_count = 0
+        self.deltas_count = 0
+        self.batches_count = 0
+        self.max_batch_size = 0
+
+        self._next_stats = time.monotonic() + STATS_INTERVAL
+        self._logged_trades = 0
+
+        t = threading.Thread(target=self._run, daemon=True)
+        t.start()
+
+    def add_trade(self, symbol: str, price: float, size: float, timestamp: int):
+
+        self._queue.append((symbol, price, size, timestamp))
+        self._new_trades.set()
+
+    # Average number of trades merged in a single delta
+    def conflation_ratio(self) -> float:
+        return self.trades_count / self.deltas_count if self.deltas_count > 0 else 1.0
+
+    # Counters since the start, logged every STATS_INTERVAL seconds if trades were parsed in the meantime
+    def log_stats(self):
+
+        if self.trades_count == self._logged_trades:
+            return
+
+        self._logged_trades = self.trades_count
+
+        logger.info("%s trade conflation: %s trades merged into %s deltas (%.2f trades per delta), %s batches, "
+                    "largest batch %s trades", self.exchange, self.trades_count, self.deltas_count,
+                    self.conflation_ratio(), self.batches_count, self.max_batch_size)
+
+    def _run(self):
+
+        while True:
+            self._new_trades.wait(max(self._next_stats - time.monotonic(), 0))
+            self._new_trades.clear()
+
+            if time.monotonic() >= self._next_stats:
+                self._next_stats = time.monotonic() + STATS_INTERVAL
+                self.log_stats()
+
+            batch_size = len(self._queue)
+
+            if batch_size == 0:
+                continue
+
+            # Trades by symbol, in the order they were received
+            trades: Dict[str, List[Tuple[float, float, int]]] = dict()
+
+            for _ in range(batch_size):
+                symbol, price, size, timestamp = self._queue.popleft()
+
+                if symbol not in trades:
+                    trades[symbol] = []
+
+                trades[symbol].append((price, size, timestamp))
+
+            for symbol, symbol_trades in trades.items():
+                builder = self._get_builder(symbol)
+
+                if builder is None:
+                    continue
+
+                try:
+                    self.deltas_count += builder.parse_trades(symbol_trades, self.max_window_ms)
+                    self.trades_count += len(symbol_trades)
+                except Exception as e:
+                    logger.error("%s error while parsing the %s trades: %s", self.exchange, symbol, e)
+
+            self.batches_count += 1
+
+            if batch_size > self.max_batch_size:
+                self.max_batch_size = batch_size
+                logger.info("%s: %s trades queued during a burst, %.1f trades per delta on average", self.exchange,
+                            batch_size, self.conflation_ratio())
@@ -3,6 +3,7 @@ import requests
 import time
 import typing
 import collections
+import copy
 
 from urllib.parse import urlencode
 
@@ -16,7 +17,15 @@ import threading
 
 from models import *
 
-from strategies import TechnicalStrategy, BreakoutStrategy
+from strategies import TechnicalStrategy, BreakoutStrategy, BollingerStrategy, RuleStrategy
+from candles import CandleAggregator, BarBuilder, timeframe_to_ms, resample_candles
+from scheduler import CandleScheduler
+from conflation import TradeConflator
+from executor import CandleCloseExecutor
+from correlation import WatchlistCorrelations
+from checkpoint import Checkpoints
+from orders import OrderTracker
+from balances import BalanceCache
 
 # binance futures base url: "https://fapi.binance.com"
 # binance futures testnet base url: "https://testnet.binancefuture.com"
@@ -28,10 +37,22 @@ from strategies import TechnicalStrategy, BreakoutStrategy
 
 logger = logging.getLogger()
 
+# Klines intervals available on the REST API (Binance Spot also has 1s klines)
+BINANCE_INTERVALS = ["1m", "3m", "5m", "15m", "30m", "1h", "2h", "4h", "6h", "8h", "12h", "1d"]
+
+# The listenKey of the user data stream expires 60 minutes after its creation or last keepalive
+LISTEN_KEY_KEEPALIVE = 30 * 60
+
 
 class BinanceClient:
     # constructor
-    def __init__(self, public_key: str, secret_key: str, testnet: bool, futures: bool):
+    # trade_conflation_ms: if set, the trades received in bursts are merged over at most this duration before being
+    # parsed (see TradeConflator)
+    # signal_workers: threads placing the orders of the strategies when candles close, signal_processes: evaluate the
+    # signals in as many processes, only for CPU heavy signals (see CandleCloseExecutor)
+    def __init__(self, public_key: str, secret_key: str, testnet: bool, futures: bool,
+                 trade_conflation_ms: typing.Optional[int] = None, signal_workers: typing.Optional[int] = None,
+                 signal_processes: bool = False):
 
         self.futures = futures
 
@@ -61,10 +82,37 @@ class BinanceClient:
         self._headers = {'X-MBX-APIKEY': self._public_key}
 
         self.contracts = self.get_contracts()
-        self.balances = self.get_balances()
+
+        # Balances used to size the orders, requested again only when they may have changed
+        self.balance_cache = BalanceCache("Binance", self.get_balances)
+        self.balance_cache.get()
 
         self.prices = dict()
-        self.strategies: typing.Dict[int, typing.Union[TechnicalStrategy, BreakoutStrategy]] = dict()
+        self.strategies: typing.Dict[int, typing.Union[TechnicalStrategy, BreakoutStrategy,
+                                                                 BollingerStrategy, RuleStrategy]] = dict()
+        # Candles shared by the strategies, by symbol (each BarBuilder has one CandleAggregator per timeframe)
+        self.bar_builders: typing.Dict[str, BarBuilder] = dict()
+
+        # Closes the candles at the timeframe boundaries of the exchange clock
+        self.candle_scheduler = CandleScheduler("Binance")
+        self.candle_scheduler.clock_offset = self.get_clock_offset()
+
+        self.candle_close_executor = CandleCloseExecutor("Binance", signal_workers, signal_processes)
+
+        self.trade_conflator: typing.Optional[TradeConflator] = None
+
+        if trade_conflation_ms is not None:
+            self.trade_conflator = TradeConflator("Binance", lambda symbol: self.bar_builders.get(symbol),
+                                                  trade_conflation_ms)
+
+        # Rolling correlations of the Watchlist symbols, shared by both clients and set by the interface
+        self.correlations: typing.Optional[WatchlistCorrelations] = None
+
+        # Saves the candles and the strategies regularly to restart from them, set by the interface
+        self.checkpoints: typing.Optional[Checkpoints] = None
+
+        # Follows the orders of the strategies until they are filled
+        self.order_tracker = OrderTracker("Binance", self)
 
         self.logs = []
 
@@ -77,6 +125,17 @@ class BinanceClient:
         t = threading.Thread(target=self._start_ws)
         t.start()
 
+        # Private stream of the order and balance updates of the account, started once the attributes used by its
+        # threads exist
+        self._listen_key: typing.Optional[str] = None
+        self.user_ws: typing.Optional[websocket.WebSocketApp] = None
+
+        t = threading.Thread(target=self._start_user_ws, daemon=True)
+        t.start()
+
+        t = threading.Thread(target=self._keepalive_user_ws, daemon=True)
+        t.start()
+
         logger.info("Binance Futures Client successfully initialized")
 
     # Add a log to the list so that it can be picked by the update_ui() method of the root component
@@ -109,6 +168,13 @@ class BinanceClient:
                 logger.error("Connection error while making %s request to %s: %s", method, endpoint, e)
                 return None
 
+        elif method == "PUT":
+            try:
+                response = requests.put(self._base_url + endpoint, params=data, headers=self._headers)
+            except Exception as e:
+                logger.error("Connection error while making %s request to %s: %s", method, endpoint, e)
+                return None
+
         elif method == "DELETE":
             try:
                 response = requests.delete(self._base_url + endpoint, params=data, headers=self._headers)
@@ -143,13 +209,40 @@ class BinanceClient:
         # Sort keys of the dictionary alphabetically
         return collections.OrderedDict(sorted(contracts.items()))
 
+    # Klines interval used to get the history of a timeframe: the timeframe itself if Binance provides it, otherwise
+    # the longest interval it is a multiple of, or None if there isn't any (e.g. 5s candles on Binance Futures).
+    def _history_interval(self, timeframe: str) -> typing.Optional[str]:
+
+        intervals = BINANCE_INTERVALS if self.futures else ["1s"] + BINANCE_INTERVALS
+        tf_equiv = timeframe_to_ms(timeframe)
+
+        history_interval = None
+
+        for interval in intervals:
+            if tf_equiv % timeframe_to_ms(interval) == 0:
+                history_interval = interval
+
+        return history_interval
+
     # Get a list of the most recent candlesticks for a given symbol/contract and intreval.
-    def get_historical_candles(self, contract: Contract, interval: str) -> typing.List[Candle]:
+    # Intervals not available on Binance (e.g. 10m) are built from shorter klines.
+    # Only the candles starting from start_time if it is given (e.g. the ones missed since a checkpoint),
+    # at most `limit` klines
+    def get_historical_candles(self, contract: Contract, interval: str, start_time: typing.Optional[int] = None,
+                               limit: int = 1000) -> typing.List[Candle]:
+
+        history_interval = self._history_interval(interval)
+
+        if history_interval is None:
+            return []
 
         data = dict()
         data['symbol'] = contract.symbol
-        data['interval'] = interval
-        data['limit'] = 1000
+        data['interval'] = history_interval
+        data['limit'] = limit
+
+        if start_time is not None:
+            data['startTime'] = start_time
 
         if self.futures:
             raw_candles = self._make_request("GET", "/fapi/v1/klines", data)
@@ -160,10 +253,65 @@ class BinanceClient:
 
         if raw_candles is not None:
             for c in raw_candles:
-                candles.append(Candle(c, interval, self.platform))
+                candles.append(Candle(c, history_interval, self.platform))
+
+        if history_interval != interval:
+            candles = resample_candles(candles, timeframe_to_ms(interval))
 
         return candles
 
+    # Get the shared candle aggregator of a symbol and timeframe, created from the last checkpoint or the historical
+    # candles if no running strategy uses it yet. Returns None if no historical data could be retrieved.
+    def get_aggregator(self, contract: Contract, timeframe: str) -> typing.Optional[CandleAggregator]:
+
+        builder = self.bar_builders.get(contract.symbol)
+
+        if builder is not None and timeframe in builder.aggregators:
+            return builder.aggregators[timeframe]
+
+        aggregator = None
+
+        if self.checkpoints is not None:
+            aggregator = self.checkpoints.restore_aggregator("Binance", self, contract, timeframe)
+
+        if aggregator is None:
+            candles = self.get_historical_candles(contract, timeframe)
+
+            # Timeframes without any history available (e.g. sub-minute candles) are only built from the live trades
+            if len(candles) == 0 and self._history_interval(timeframe) is not None:
+                return None
+
+            aggregator = CandleAggregator("Binance", contract, timeframe)
+            aggregator.load_candles(candles)
+
+        if builder is None:
+            builder = BarBuilder("Binance", contract)
+            builder.executor = self.candle_close_executor
+            # New dictionary so that the websocket thread never loops through a dictionary being modified
+            self.bar_builders = {**self.bar_builders, contract.symbol: builder}
+
+        builder.add_aggregator(aggregator)
+        self.candle_scheduler.add_builder(builder)
+
+        return aggregator
+
+    # Drop an aggregator once the last strategy using it has been stopped
+    def release_aggregator(self, aggregator: CandleAggregator):
+
+        if len(aggregator.strategies) > 0:
+            return
+
+        builder = self.bar_builders.get(aggregator.contract.symbol)
+
+        if builder is None:
+            return
+
+        builder.remove_aggregator(aggregator)
+
+        if len(builder.aggregators) == 0:
+            self.candle_scheduler.remove_builder(builder)
+            self.bar_builders = {k: v for k, v in self.bar_builders.items() if k != aggregator.contract.symbol}
+
     # Get a snapshot of the current bid and ask price for a symbol/contract,
     # to be sure there is something to display on the Watchlist.
     def get_bid_ask(self, contract: Contract) -> typing.Dict[str, float]:
@@ -186,6 +334,24 @@ class BinanceClient:
 
             return self.prices[contract.symbol]
 
+    # Difference between the Binance server time and the local time in milliseconds, so that the candles are closed on
+    # the exchange timeframe boundaries. The request latency is split evenly between both directions.
+    def get_clock_offset(self) -> int:
+
+        request_start = int(time.time() * 1000)
+
+        if self.futures:
+            server_time = self._make_request("GET", "/fapi/v1/time", dict())
+        else:
+            server_time = self._make_request("GET", "/api/v3/time", dict())
+
+        request_end = int(time.time() * 1000)
+
+        if server_time is None:
+            return 0
+
+        return server_time['serverTime'] - (request_start + request_end) // 2
+
     # Get the current balance of the account, the data is different between Spot and Futures
     def get_balances(self) -> typing.Dict[str, Balance]:
 
@@ -212,6 +378,39 @@ class BinanceClient:
 
         return balances
 
+    # Signed quantity held on a contract: the Futures position, or the base asset balance on Spot. Used to check the
+    # trades restored from a checkpoint. None if it couldn't be requested.
+    def get_position(self, contract: Contract) -> typing.Optional[float]:
+
+        if not self.futures:
+            balances = self.balance_cache.get()
+
+            if len(balances) == 0:
+                return None
+
+            if contract.base_asset not in balances:
+                return 0.0
+
+            return balances[contract.base_asset].free + balances[contract.base_asset].locked
+
+        # Pushed by the user data stream when it has changed since the start
+        position = self.balance_cache.positions.get(contract.symbol)
+
+        if position is not None:
+            return float(position['pa'])
+
+        data = dict()
+        data['symbol'] = contract.symbol
+        data['timestamp'] = int(time.time() * 1000)
+        data['signature'] = self._generate_signature(data)
+
+        positions = self._make_request("GET", "/fapi/v2/positionRisk", data)
+
+        if positions is None:
+            return None
+
+        return sum(float(p['positionAmt']) for p in positions if p['symbol'] == contract.symbol)
+
     # Place an order based on the order_type. the price and tif arguments are not required.
     def place_order(self, contract: Contract, order_type: str, quantity: float, side: str, price=None,
                     tif=None) -> OrderStatus:
@@ -229,6 +428,10 @@ class BinanceClient:
         if tif is not None:
             data['timeInForce'] = tif
 
+        # The fills of the order are included in the Spot response
+        if not self.futures:
+            data['newOrderRespType'] = "FULL"
+
         data['timestamp'] = int(time.time() * 1000)
         data['signature'] = self._generate_signature(data)
 
@@ -239,12 +442,10 @@ class BinanceClient:
 
         if order_status is not None:
 
-            if not self.futures:
-                if order_status['status'] == 'FILLED':
-                    order_status['avgPrice'] = self._get_execution_price(contract, order_status['orderId'])
+            self.balance_cache.invalidate()
 
-                else:
-                    order_status['avgPrice'] = 0
+            if not self.futures:
+                order_status['avgPrice'] = self._spot_avg_price(contract, order_status)
 
             order_status = OrderStatus(order_status, self.platform)
 
@@ -265,39 +466,56 @@ class BinanceClient:
 
         if order_status is not None:
 
+            self.balance_cache.invalidate()
+
             if not self.futures:
-                # Get the average execution price based on the recent trades
-                order_status['avgPrice'] = self._get_execution_price(contract, order_id)
+                order_status['avgPrice'] = self._spot_avg_price(contract, order_status)
 
             order_status = OrderStatus(order_status, self.platform)
 
         return order_status
 
-    # For Binance Spot only, find the equivalent of the 'avgPrice' key on the futures side.
-    # The average price is the weighted sum of each trade price related to the order_id
+    # For Binance Spot only, find the equivalent of the 'avgPrice' key on the futures side from an order response:
+    # the volume weighted price of its fills (returned when placing the order), or else its cumulative quote quantity
+    # divided by its executed quantity. The trades of the order are only requested if neither is available.
+    def _spot_avg_price(self, contract: Contract, order: typing.Dict) -> float:
+
+        executed_qty = float(order['executedQty'])
+
+        if executed_qty == 0:
+            return 0
+
+        fills = order.get('fills')
+
+        if fills is not None and len(fills) > 0:
+            fills_qty = sum(float(f['qty']) for f in fills)
+            avg_price = sum(float(f['price']) * float(f['qty']) for f in fills) / fills_qty
+
+        # Negative for the orders placed before the field was introduced
+        elif float(order.get('cummulativeQuoteQty', -1)) >= 0:
+            avg_price = float(order['cummulativeQuoteQty']) / executed_qty
+
+        else:
+            return self._get_execution_price(contract, order['orderId'])
+
+        return round(round(avg_price / contract.tick_size) * contract.tick_size, 8)
+
+    # For Binance Spot only, the average price is the weighted sum of each trade price related to the order_id
     def _get_execution_price(self, contract: Contract, order_id: int) -> float:
 
         data = dict()
         data['timestamp'] = int(time.time() * 1000)
         data['symbol'] = contract.symbol
+        data['orderId'] = order_id
         data['signature'] = self._generate_signature(data)
 
         trades = self._make_request("GET", "/api/v3/myTrades", data)
 
-        avg_price = 0
-
-        if trades is not None:
-            executed_qty = 0
+        if trades is None or len(trades) == 0:
+            return 0
 
-            for t in trades:
-                if t['orderId'] == order_id:
-                    executed_qty += float(t['qty'])
-
-            for t in trades:
-                if t['orderId'] == order_id:
-                    fill_pct = float(t['qty']) / executed_qty
-                    # Weighted sum
-                    avg_price += (float(t['price']) * fill_pct)
+        executed_qty = sum(float(t['qty']) for t in trades)
+        avg_price = sum(float(t['price']) * float(t['qty']) for t in trades) / executed_qty
 
         return round(round(avg_price / contract.tick_size) * contract.tick_size, 8)
 
@@ -317,17 +535,66 @@ class BinanceClient:
         if order_status is not None:
 
             if not self.futures:
-                if order_status['status'] == 'FILLED':
-                    # Get the average execution price based on the recent trades
-                    order_status['avgPrice'] = self._get_execution_price(contract, order_id)
-
-                else:
-                    order_status['avgPrice'] = 0
+                order_status['avgPrice'] = self._spot_avg_price(contract, order_status)
 
             order_status = OrderStatus(order_status, self.platform)
 
         return order_status
 
+    # Status of several orders with as few requests as possible (see OrderTracker): the open orders of their symbols are
+    # requested at once, only the orders that are not open anymore are then requested one by one for their final status.
+    # :return: order_id -> OrderStatus, None if the open orders couldn't be requested
+    def get_orders_status(self, orders: typing.List[typing.Tuple[Contract, int]]) \
+            -> typing.Optional[typing.Dict[int, OrderStatus]]:
+
+        symbols = {contract.symbol for contract, _ in orders}
+
+        # Request weight of the open orders of one symbol and of all the symbols
+        if self.futures:
+            symbol_weight, all_weight = 1, 40
+            endpoint = "/fapi/v1/openOrders"
+        else:
+            symbol_weight, all_weight = 6, 80
+            endpoint = "/api/v3/openOrders"
+
+        if len(symbols) * symbol_weight < all_weight:
+            requests_data = [{'symbol': symbol} for symbol in symbols]
+        else:
+            requests_data = [dict()]
+
+        open_orders = dict()
+
+        for data in requests_data:
+            data['timestamp'] = int(time.time() * 1000)
+            data['signature'] = self._generate_signature(data)
+
+            response = self._make_request("GET", endpoint, data)
+
+            if response is None:
+                return None
+
+            for order in response:
+                open_orders[order['orderId']] = order
+
+        statuses = dict()
+
+        for contract, order_id in orders:
+            if order_id in open_orders:
+                order = open_orders[order_id]
+
+                if not self.futures:
+                    order['avgPrice'] = self._spot_avg_price(contract, order)
+
+                statuses[order_id] = OrderStatus(order, self.platform)
+
+            else:
+                order_status = self.get_order_status(contract, order_id)
+
+                if order_status is not None:
+                    statuses[order_id] = order_status
+
+        return statuses
+
     # Infinite loop (thus has to run in a Thread) that reopens the websocket connection in case it drops
     def _start_ws(self):
 
@@ -352,6 +619,9 @@ class BinanceClient:
 
         self.ws_connected = True
 
+        # The local clock may have drifted while the connection was down
+        self.candle_scheduler.clock_offset = self.get_clock_offset()
+
         # The aggTrade channel is subscribed to in the _switch_strategy() method of strategy_component.py
 
         for channel in ["bookTicker", "aggTrade"]:
@@ -417,13 +687,148 @@ class BinanceClient:
             if data['e'] == "aggTrade":
                 symbol = data['s']
 
-                for key, strat in self.strategies.items():
+                if self.trade_conflator is not None:
+                    self.trade_conflator.add_trade(symbol, float(data['p']), float(data['q']), data['T'])
+
+                else:
+                    builder = self.bar_builders.get(symbol)
+
+                    # Each trade is parsed once, whatever the number of strategies and timeframes using it
+                    if builder is not None:
+                        builder.parse_trade(float(data['p']), float(data['q']), data['T'])
+
+    # The listenKey requests only need the API key, not a signature
+    def _listen_key_endpoint(self) -> str:
+        return "/fapi/v1/listenKey" if self.futures else "/api/v3/userDataStream"
+
+    def _create_listen_key(self) -> typing.Optional[str]:
+
+        response = self._make_request("POST", self._listen_key_endpoint(), dict())
+
+        if response is None:
+            return None
+
+        return response['listenKey']
+
+    # Infinite loop (thus has to run in a Thread) connecting to the user data stream with a valid listenKey, the
+    # OrderTracker polls the orders while the stream is down
+    def _start_user_ws(self):
+
+        while self.reconnect:
+            # Returns the current listenKey if it is still valid
+            self._listen_key = self._create_listen_key()
+
+            if self._listen_key is not None:
+                self.user_ws = websocket.WebSocketApp(self._wss_url + "/" + self._listen_key,
+                                                      on_open=self._on_user_open, on_close=self._on_user_close,
+                                                      on_error=self._on_user_error, on_message=self._on_user_message)
+
+                try:
+                    # Blocking method that ends only if the websocket connection drops
+                    self.user_ws.run_forever()
+                except Exception as e:
+                    logger.error("Binance error in the user data stream run_forever() method: %s", e)
+
+                self.order_tracker.set_streaming(False)
+
+            time.sleep(2)
+
+    # Infinite loop (thus has to run in a Thread) extending the validity of the listenKey, the stream is reconnected
+    # with a new one if it has expired
+    def _keepalive_user_ws(self):
+
+        while True:
+            time.sleep(LISTEN_KEY_KEEPALIVE)
+
+            if self._listen_key is None or self.user_ws is None:
+                continue
+
+            data = dict()
+
+            if not self.futures:
+                data['listenKey'] = self._listen_key
+
+            if self._make_request("PUT", self._listen_key_endpoint(), data) is None:
+                logger.warning("Binance listenKey keepalive failed, reconnecting the user data stream")
+                self.user_ws.close()
+
+    def _on_user_open(self, ws):
+
+        logger.info("Binance user data stream opened")
+
+        self.order_tracker.set_streaming(True)
+
+    def _on_user_close(self, ws):
+        logger.warning("Binance user data stream closed")
+
+    def _on_user_error(self, ws, msg: str):
+        logger.error("Binance user data stream error: %s", msg)
+
+    # Order and balance updates of the account, received as soon as they happen
+    def _on_user_message(self, ws, msg: str):
+
+        data = json.loads(msg)
+
+        if "e" not in data:
+            return
+
+        if data['e'] == "ORDER_TRADE_UPDATE":
+            order = data['o']
+
+            order_status = OrderStatus({'orderId': order['i'], 'status': order['X'], 'avgPrice': order['ap'],
+                                        'executedQty': order['z']}, self.platform)
+
+            self.order_tracker.on_order_update(order_status)
+
+        elif data['e'] == "executionReport":
+            contract = self.contracts.get(data['s'])
+            executed_qty = float(data['z'])
+
+            # Cumulative quote quantity / cumulative quantity
+            avg_price = 0
+
+            if executed_qty > 0 and contract is not None:
+                avg_price = float(data['Z']) / executed_qty
+                avg_price = round(round(avg_price / contract.tick_size) * contract.tick_size, 8)
+
+            order_status = OrderStatus({'orderId': data['i'], 'status': data['X'], 'avgPrice': avg_price,
+                                        'executedQty': executed_qty}, self.platform)
+
+            self.order_tracker.on_order_update(order_status)
+
+        elif data['e'] == "ACCOUNT_UPDATE":
+            balances = dict(self.balance_cache.balances)
+
+            for b in data['a']['B']:
+                if b['a'] in balances:
+                    balance = copy.copy(balances[b['a']])
+                    balance.wallet_balance = float(b['wb'])
+                    balances[b['a']] = balance
+
+            # Replaced rather than modified, the dictionary may be read by other threads
+            self.balance_cache.update(balances)
+
+            positions = dict(self.balance_cache.positions)
+
+            for position in data['a']['P']:
+                if float(position['pa']) != 0:
+                    positions[position['s']] = position
+                else:
+                    positions.pop(position['s'], None)
+
+            self.balance_cache.update_positions(positions)
+
+        elif data['e'] == "outboundAccountPosition":
+            balances = dict(self.balance_cache.balances)
+
+            for b in data['B']:
+                balances[b['a']] = Balance({'free': b['f'], 'locked': b['l']}, self.platform)
 
-                    if strat.contract.symbol == symbol:
-                        # Updated candlesticks
-                        res = strat.parse_trades(float(data['p']), float(data['q']), data['T'])
+            self.balance_cache.update(balances)
 
-                        strat.check_trade(res)
+        elif data['e'] == "listenKeyExpired":
+            logger.warning("Binance listenKey expired, reconnecting the user data stream")
+            ws.close()
 
     # Subscribe to updates on a specific topic for all the symbols.
     # If your list is bigger than 300 symbols, the subscription will fail.
@@ -473,7 +878,7 @@ class BinanceClient:
 
         logger.info("Getting Binance trade size...")
 
-        balance = self.get_balances()
+        balance = self.balance_cache.get()
 
         if balance is not None:
             if contract.quote_asset in balance:
@@ -491,6 +896,7 @@ class BinanceClient:
         # Remove extra decimals
         trade_size = round(round(trade_size / contract.lot_size) * contract.lot_size, 8)
 
-        logger.info("Binance current %s balance = %s, trade size = %s", contract.quote_asset, balance, trade_size)
+        logger.info("Binance current %s balance = %s (%.1f seconds old), trade size = %s", contract.quote_asset,
+                    balance, self.balance_cache.staleness(), trade_size)
 
         return trade_size
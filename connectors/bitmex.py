@@ -12,9 +12,18 @@ import hashlib
 import websocket
 import json
 
-from strategies import TechnicalStrategy, BreakoutStrategy
+from strategies import TechnicalStrategy, BreakoutStrategy, BollingerStrategy, RuleStrategy
+from candles import CandleAggregator, BarBuilder, timeframe_to_ms, resample_candles
+from scheduler import CandleScheduler
+from conflation import TradeConflator
+from executor import CandleCloseExecutor
+from correlation import WatchlistCorrelations
+from checkpoint import Checkpoints
+from orders import OrderTracker
+from balances import BalanceCache
 
 import dateutil.parser
+import datetime
 
 import threading
 
@@ -29,10 +38,88 @@ from models import *
 
 logger = logging.getLogger()
 
+# Authenticated websocket topics, maintained as local tables
+PRIVATE_TOPICS = ["order", "execution", "position", "margin"]
+
+# Rows kept in the tables that only grow (the oldest are dropped first)
+MAX_TABLE_ROWS = 1000
+
+# Columns of the margin rows used by the balances, which can be null (e.g. a currency that has never been used)
+MARGIN_COLUMNS = ["initMargin", "maintMargin", "marginBalance", "walletBalance", "unrealisedPnl"]
+
+
+# Local copy of a table of the Bitmex websocket: the first message of a subscription ('partial') contains the whole
+# table and its key columns, the next ones insert, update (only the changed columns) or delete rows.
+# The rows dictionary is replaced rather than modified, so it can be read from any thread.
+class BitmexTable:
+    def __init__(self, name: str, max_rows: typing.Optional[int] = None):
+
+        self.name = name
+        self.max_rows = max_rows
+
+        self.keys: typing.List[str] = []
+        self.rows: typing.Dict[tuple, typing.Dict] = dict()
+
+        # The messages received before the partial one are ignored
+        self.ready = False
+
+    def _key(self, row: typing.Dict) -> tuple:
+        return tuple(row.get(k) for k in self.keys)
+
+    def reset(self):
+        self.rows = dict()
+        self.ready = False
+
+    # :return: The inserted or updated rows, with all their columns
+    def apply(self, action: str, data: typing.List[typing.Dict],
+              keys: typing.Optional[typing.List[str]] = None) -> typing.List[typing.Dict]:
+
+        if action == "partial":
+            self.keys = keys
+            self.rows = {self._key(row): row for row in data}
+            self.ready = True
+
+            return data
+
+        if not self.ready:
+            return []
+
+        rows = dict(self.rows)
+        changed = []
+
+        for row in data:
+            key = self._key(row)
+
+            if action == "insert":
+                rows[key] = row
+                changed.append(row)
+
+            elif action == "update":
+                if key in rows:
+                    rows[key] = {**rows[key], **row}
+                    changed.append(rows[key])
+
+            elif action == "delete":
+                rows.pop(key, None)
+
+        if self.max_rows is not None:
+            for key in list(rows)[:max(len(rows) - self.max_rows, 0)]:
+                del rows[key]
+
+        self.rows = rows
+
+        return changed
+
 
 class BitmexClient:
     # constructor
-    def __init__(self, public_key: str, secret_key: str, testnet: bool):
+    # trade_conflation_ms: if set, the trades received in bursts are merged over at most this duration before being
+    # parsed (see TradeConflator)
+    # signal_workers: threads placing the orders of the strategies when candles close, signal_processes: evaluate the
+    # signals in as many processes, only for CPU heavy signals (see CandleCloseExecutor)
+    def __init__(self, public_key: str, secret_key: str, testnet: bool,
+                 trade_conflation_ms: typing.Optional[int] = None, signal_workers: typing.Optional[int] = None,
+                 signal_processes: bool = False):
 
         if testnet:
             self._base_url = "https://testnet.bitmex.com"
@@ -48,10 +135,45 @@ class BitmexClient:
         self.reconnect = True
 
         self.contracts = self.get_contracts()
-        self.balances = self.get_balances()
+
+        # Balances used to size the orders, requested again only when they may have changed
+        self.balance_cache = BalanceCache("Bitmex", self.get_balances)
+        self.balance_cache.get()
 
         self.prices = dict()
-        self.strategies: typing.Dict[int, typing.Union[TechnicalStrategy, BreakoutStrategy]] = dict()
+        self.strategies: typing.Dict[int, typing.Union[TechnicalStrategy, BreakoutStrategy,
+                                                                 BollingerStrategy, RuleStrategy]] = dict()
+        # Candles shared by the strategies, by symbol (each BarBuilder has one CandleAggregator per timeframe)
+        self.bar_builders: typing.Dict[str, BarBuilder] = dict()
+
+        # Closes the candles at the timeframe boundaries of the exchange clock
+        self.candle_scheduler = CandleScheduler("Bitmex")
+        self.candle_scheduler.clock_offset = self.get_clock_offset()
+
+        self.candle_close_executor = CandleCloseExecutor("Bitmex", signal_workers, signal_processes)
+
+        self.trade_conflator: typing.Optional[TradeConflator] = None
+
+        if trade_conflation_ms is not None:
+            self.trade_conflator = TradeConflator("Bitmex", lambda symbol: self.bar_builders.get(symbol),
+                                                  trade_conflation_ms)
+
+        # Rolling correlations of the Watchlist symbols, shared by both clients and set by the interface
+        self.correlations: typing.Optional[WatchlistCorrelations] = None
+
+        # Saves the candles and the strategies regularly to restart from them, set by the interface
+        self.checkpoints: typing.Optional[Checkpoints] = None
+
+        # Follows the orders of the strategies until they are filled
+        self.order_tracker = OrderTracker("Bitmex", self)
+
+        # Orders, executions, positions and margins of the account, pushed by the websocket
+        self.ws_tables: typing.Dict[str, BitmexTable] = {
+            "order": BitmexTable("order", MAX_TABLE_ROWS),
+            "execution": BitmexTable("execution", MAX_TABLE_ROWS),
+            "position": BitmexTable("position"),
+            "margin": BitmexTable("margin"),
+        }
 
         self.logs = []
 
@@ -122,6 +244,19 @@ class BitmexClient:
         # Sort keys alphabetically
         return collections.OrderedDict(sorted(contracts.items()))
 
+    # Difference between the Bitmex server time (returned by the API root endpoint) and the local time in milliseconds,
+    # so that the candles are closed on the exchange timeframe boundaries
+    def get_clock_offset(self) -> int:
+
+        request_start = int(time.time() * 1000)
+        api_info = self._make_request("GET", "/api/v1", dict())
+        request_end = int(time.time() * 1000)
+
+        if api_info is None or 'timestamp' not in api_info:
+            return 0
+
+        return api_info['timestamp'] - (request_start + request_end) // 2
+
     def get_balances(self) -> typing.Dict[str, Balance]:
 
         data = dict()
@@ -129,23 +264,58 @@ class BitmexClient:
 
         margin_data = self._make_request("GET", "/api/v1/user/margin", data)
 
+        if margin_data is None:
+            return dict()
+
+        return self._margin_balances(margin_data)
+
+    # Balances of the margin rows (request or websocket table) whose columns are all set
+    def _margin_balances(self, rows: typing.Iterable[typing.Dict]) -> typing.Dict[str, Balance]:
+
         balances = dict()
 
-        if margin_data is not None:
-            for a in margin_data:
-                balances[a['currency']] = Balance(a, "bitmex")
+        for row in rows:
+            if all(row.get(column) is not None for column in MARGIN_COLUMNS):
+                balances[row['currency']] = Balance(row, "bitmex")
 
         return balances
 
-    def get_historical_candles(self, contract: Contract, timeframe: str) -> typing.List[Candle]:
+    # Bitmex bucketed trades are only available in 1m, 5m, 1h and 1d, the other timeframes are built from the longest
+    # bin size they are a multiple of.
+    def _history_interval(self, timeframe: str) -> typing.Optional[str]:
+
+        tf_equiv = timeframe_to_ms(timeframe)
+
+        history_interval = None
+
+        for bin_size in BITMEX_TF_MINUTES:
+            if tf_equiv % timeframe_to_ms(bin_size) == 0:
+                history_interval = bin_size
+
+        return history_interval
+
+    # Only the candles starting from start_time if it is given (e.g. the ones missed since a checkpoint),
+    # at most `limit` buckets
+    def get_historical_candles(self, contract: Contract, timeframe: str, start_time: typing.Optional[int] = None,
+                               limit: int = 500) -> typing.List[Candle]:
+
+        history_interval = self._history_interval(timeframe)
+
+        if history_interval is None:
+            return []
 
         data = dict()
         data['symbol'] = contract.symbol
         data['partial'] = True
-        data['binSize'] = timeframe
-        data['count'] = 500
+        data['binSize'] = history_interval
+        data['count'] = limit
         data['reverse'] = True
 
+        if start_time is not None:
+            # The timestamps of the Bitmex candles are their end time
+            end_time = start_time + BITMEX_TF_MINUTES[history_interval] * 60 * 1000
+            data['startTime'] = datetime.datetime.fromtimestamp(end_time / 1000, datetime.timezone.utc).isoformat()
+
         raw_candles = self._make_request("GET", "/api/v1/trade/bucketed", data)
 
         candles = []
@@ -156,10 +326,85 @@ class BitmexClient:
                 if c['open'] is None or c['close'] is None:
                     continue
 
-                candles.append(Candle(c, timeframe, "bitmex"))
+                candles.append(Candle(c, history_interval, "bitmex"))
+
+        if history_interval != timeframe:
+            candles = resample_candles(candles, timeframe_to_ms(timeframe))
 
         return candles
 
+    # Get the shared candle aggregator of a symbol and timeframe, created from the last checkpoint or the historical
+    # candles if no running strategy uses it yet. Returns None if no historical data could be retrieved.
+    def get_aggregator(self, contract: Contract, timeframe: str) -> typing.Optional[CandleAggregator]:
+
+        builder = self.bar_builders.get(contract.symbol)
+
+        if builder is not None and timeframe in builder.aggregators:
+            return builder.aggregators[timeframe]
+
+        aggregator = None
+
+        if self.checkpoints is not None:
+            aggregator = self.checkpoints.restore_aggregator("Bitmex", self, contract, timeframe)
+
+        if aggregator is None:
+            candles = self.get_historical_candles(contract, timeframe)
+
+            # Timeframes without any history available (e.g. sub-minute candles) are only built from the live trades
+            if len(candles) == 0 and self._history_interval(timeframe) is not None:
+                return None
+
+            aggregator = CandleAggregator("Bitmex", contract, timeframe)
+            aggregator.load_candles(candles)
+
+        if builder is None:
+            builder = BarBuilder("Bitmex", contract)
+            builder.executor = self.candle_close_executor
+            # New dictionary so that the websocket thread never loops through a dictionary being modified
+            self.bar_builders = {**self.bar_builders, contract.symbol: builder}
+
+        builder.add_aggregator(aggregator)
+        self.candle_scheduler.add_builder(builder)
+
+        return aggregator
+
+    # Drop an aggregator once the last strategy using it has been stopped
+    def release_aggregator(self, aggregator: CandleAggregator):
+
+        if len(aggregator.strategies) > 0:
+            return
+
+        builder = self.bar_builders.get(aggregator.contract.symbol)
+
+        if builder is None:
+            return
+
+        builder.remove_aggregator(aggregator)
+
+        if len(builder.aggregators) == 0:
+            self.candle_scheduler.remove_builder(builder)
+            self.bar_builders = {k: v for k, v in self.bar_builders.items() if k != aggregator.contract.symbol}
+
+    # Signed number of contracts held on a contract, used to check the trades restored from a checkpoint. None if it
+    # couldn't be requested.
+    def get_position(self, contract: Contract) -> typing.Optional[float]:
+
+        # Pushed by the websocket, the table only has the open positions
+        if self.ws_tables['position'].ready:
+            position = self.balance_cache.positions.get(contract.symbol)
+
+            return position['currentQty'] if position is not None else 0
+
+        data = dict()
+        data['filter'] = json.dumps({"symbol": contract.symbol})
+
+        positions = self._make_request("GET", "/api/v1/position", data)
+
+        if positions is None:
+            return None
+
+        return sum(p['currentQty'] for p in positions)
+
     def place_order(self, contract: Contract, order_type: str, quantity: int, side: str, price=None,
                     tif=None) -> OrderStatus:
 
@@ -179,6 +424,8 @@ class BitmexClient:
         order_status = self._make_request("POST", "/api/v1/order", data)
 
         if order_status is not None:
+            self.balance_cache.invalidate()
+
             order_status = OrderStatus(order_status, "bitmex")
 
         return order_status
@@ -191,15 +438,24 @@ class BitmexClient:
         order_status = self._make_request("DELETE", "/api/v1/order", data)
 
         if order_status is not None:
+            self.balance_cache.invalidate()
+
             order_status = OrderStatus(order_status[0], "bitmex")
 
         return order_status
 
     def get_order_status(self, contract: Contract, order_id: str) -> OrderStatus:
 
+        # Kept up to date by the websocket
+        if self.ws_tables['order'].ready:
+            order = self.ws_tables['order'].rows.get((order_id,))
+
+            if order is not None:
+                return OrderStatus(order, "bitmex")
+
         data = dict()
         data['symbol'] = contract.symbol
-        data['reverse'] = True
+        data['filter'] = json.dumps({"orderID": order_id})
 
         order_status = self._make_request("GET", "/api/v1/order", data)
 
@@ -208,6 +464,29 @@ class BitmexClient:
                 if order['orderID'] == order_id:
                     return OrderStatus(order, "bitmex")
 
+    # Status of several orders in one request per 500 orders (see OrderTracker)
+    # :return: order_id -> OrderStatus, None if the orders couldn't be requested
+    def get_orders_status(self, orders: typing.List[typing.Tuple[Contract, str]]) \
+            -> typing.Optional[typing.Dict[str, OrderStatus]]:
+
+        order_ids = [order_id for _, order_id in orders]
+        statuses = dict()
+
+        for i in range(0, len(order_ids), 500):
+            data = dict()
+            data['filter'] = json.dumps({"orderID": order_ids[i:i + 500]})
+            data['count'] = 500
+
+            response = self._make_request("GET", "/api/v1/order", data)
+
+            if response is None:
+                return None
+
+            for order in response:
+                statuses[order['orderID']] = OrderStatus(order, "bitmex")
+
+        return statuses
+
     def _start_ws(self):
 
         self.ws = websocket.WebSocketApp(self._wss_url, on_open=self._on_open, on_close=self._on_close,
@@ -221,15 +500,30 @@ class BitmexClient:
 
             except Exception as e:
                 logger.error("Bitmex error in run_forever() method: %s", e)
+
+            # The private tables are sent again from scratch after the reconnection, the orders are polled meanwhile
+            for table in self.ws_tables.values():
+                table.reset()
+
+            self.order_tracker.set_streaming(False)
+
             time.sleep(2)
 
     def _on_open(self, ws):
 
         logger.info("Bitmex connection opened")
 
+        # The local clock may have drifted while the connection was down
+        self.candle_scheduler.clock_offset = self.get_clock_offset()
+
         self.subscribe_channel("instrument")
         self.subscribe_channel("trade")
 
+        self._authenticate()
+
+        for topic in PRIVATE_TOPICS:
+            self.subscribe_channel(topic)
+
     def _on_close(self, ws):
 
         logger.warning("Bitmex Websocket connection closed")
@@ -238,11 +532,31 @@ class BitmexClient:
 
         logger.error("Bitmex Websocket connection error: %s", msg)
 
+    # Required before subscribing to the private topics, the signature is the one of a GET /realtime request
+    def _authenticate(self):
+
+        expires = int(time.time()) + 5
+
+        data = dict()
+        data['op'] = "authKeyExpires"
+        data['args'] = [self._public_key, expires, self._generate_signature("GET", "/realtime", str(expires), dict())]
+
+        try:
+            self.ws.send(json.dumps(data))
+        except Exception as e:
+            logger.error("Websocket error while authenticating: %s", e)
+
     def _on_message(self, ws, msg: str):
 
         data = json.loads(msg)
 
-        if "table" in data:
+        if "error" in data:
+            logger.error("Bitmex Websocket error: %s", data['error'])
+
+        if "table" in data and data['table'] in self.ws_tables:
+            self._on_private_table(data)
+
+        elif "table" in data:
             if data['table'] == "instrument":
 
                 for d in data['data']:
@@ -305,10 +619,39 @@ class BitmexClient:
 
                     ts = int(dateutil.parser.isoparse(d['timestamp']).timestamp() * 1000)
 
-                    for key, strat in self.strategies.items():
-                        if strat.contract.symbol == symbol:
-                            res = strat.parse_trades(float(d['price']), float(d['size']), ts)
-                            strat.check_trade(res)
+                    if self.trade_conflator is not None:
+                        self.trade_conflator.add_trade(symbol, float(d['price']), float(d['size']), ts)
+
+                    else:
+                        builder = self.bar_builders.get(symbol)
+
+                        if builder is not None:
+                            builder.parse_trade(float(d['price']), float(d['size']), ts)
+
+    def _on_private_table(self, data: typing.Dict):
+
+        table = self.ws_tables[data['table']]
+        rows = table.apply(data['action'], data['data'], data.get('keys'))
+
+        if data['table'] in ["order", "execution"]:
+            for row in rows:
+                if 'orderID' in row and 'ordStatus' in row:
+                    self.order_tracker.on_order_update(OrderStatus(row, "bitmex"))
+
+            # The fills are now pushed, the pending orders are only polled again if the connection drops
+            if data['action'] == "partial" and data['table'] == "order":
+                self.order_tracker.set_streaming(True)
+
+        elif data['table'] == "margin":
+            balances = self._margin_balances(table.rows.values())
+
+            # Nothing usable yet, the balances are still requested
+            if len(balances) > 0:
+                self.balance_cache.update(balances)
+
+        elif data['table'] == "position":
+            self.balance_cache.update_positions({row['symbol']: row for row in table.rows.values()
+                                                 if row.get('isOpen')})
 
     def subscribe_channel(self, topic: str):
 
@@ -328,7 +671,8 @@ class BitmexClient:
     # Compute the trade size
     def get_trade_size(self, contract: Contract, price: float, balance_pct: float):
 
-        balance = self.get_balances()
+        balance = self.balance_cache.get()
+
         if balance is not None:
             if 'XBt' in balance:
                 balance = balance['XBt'].wallet_balance
@@ -346,7 +690,8 @@ class BitmexClient:
         else:
             contracts_number = xbt_size / (contract.multiplier * price)
 
-        logger.info("Bitmex current XBT balance = %s, contracts number = %s", balance, contracts_number)
+        logger.info("Bitmex current XBT balance = %s (%.1f seconds old), contracts number = %s", balance,
+                    self.balance_cache.staleness(), contracts_number)
 
         return int(contracts_number)
 
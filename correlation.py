@@ -0,0 +1,239 @@
+import logging
+import math
+import threading
+from typing import *
+
+import numpy as np
+
+from models import Contract
+from candles import CandleAggregator
+from barrier import BarBarrier
+
+# Import the connector class names only for typing purpose
+if TYPE_CHECKING:
+    from connectors.binance import BinanceClient
+    from connectors.bitmex import BitmexClient
+
+logger = logging.getLogger()
+
+
+# Covariance matrix of the returns of N series over a rolling window of the last `window` bars.
+# Instead of recomputing it from the window (O(N² * window) per bar), the sums of the returns and of their cross
+# products are updated with the new returns and the ones leaving the window: two rank-one updates, O(N²) per bar. The
+# sums are recomputed from the window once per `window` bars so that the rounding errors don't accumulate.
+class RollingCovariance:
+    def __init__(self, size: int, window: int):
+
+        self.size = size
+        self.window = window
+
+        self._returns = np.zeros((window, size))
+        self._pos = 0
+        self.count = 0
+
+        self._sum = np.zeros(size)
+        self._cross = np.zeros((size, size))
+
+        self._updates = 0
+
+    # Start over with the last `window` rows of a (bars, N) array of returns
+    def reset(self, returns: np.ndarray):
+
+        returns = returns[-self.window:]
+        self.count = len(returns)
+
+        self._returns[:self.count] = returns
+        self._pos = self.count % self.window
+
+        self._recompute()
+
+    def _recompute(self):
+
+        window = self._returns[:self.count]
+
+        self._sum = window.sum(axis=0)
+        self._cross = window.T @ window
+        self._updates = 0
+
+    def update(self, returns: np.ndarray):
+
+        if self.count == self.window:
+            old = self._returns[self._pos]
+            self._sum -= old
+            self._cross -= np.outer(old, old)
+        else:
+            self.count += 1
+
+        self._returns[self._pos] = returns
+        self._pos = (self._pos + 1) % self.window
+
+        self._sum += returns
+        self._cross += np.outer(returns, returns)
+
+        self._updates += 1
+
+        if self._updates >= self.window:
+            self._recompute()
+
+    def covariance(self) -> np.ndarray:
+
+        if self.count < 2:
+            return np.full((self.size, self.size), math.nan)
+
+        return (self._cross - np.outer(self._sum, self._sum) / self.count) / (self.count - 1)
+
+    def correlation(self) -> np.ndarray:
+
+        covariance = self.covariance()
+        std = np.sqrt(np.diagonal(covariance))
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            correlation = covariance / np.outer(std, std)
+
+        # Constant series (e.g. no trade during the whole window) have no correlation
+        correlation[~np.isfinite(correlation)] = math.nan
+
+        return np.clip(correlation, -1, 1, out=correlation)
+
+
+# Rolling correlations between the closed candle log returns of the Watchlist symbols (Binance and Bitmex). The candles
+# of the symbols are synchronized with a BarBarrier, and the covariance matrix is updated once per bar.
+# The latest matrices are replaced together with their labels (never modified in place), so the interface and the
+# strategies can read them from any thread (see Strategy._correlation()).
+class WatchlistCorrelations:
+    def __init__(self, timeframe: str = "1m", window: int = 100, timeout: float = 5.0):
+
+        self.timeframe = timeframe
+        self.window = window
+        self.timeout = timeout
+
+        # (exchange, symbol) of the rows and columns of the matrices, covariance matrix, correlation matrix and
+        # timestamp of the last bar included
+        self.snapshot: Tuple[List[Tuple[str, str]], np.ndarray, np.ndarray, Optional[int]] = \
+            ([], np.empty((0, 0)), np.empty((0, 0)), None)
+
+        self._labels: List[Tuple[str, str]] = []
+        self._indexes: Dict[Tuple[str, str], int] = dict()
+        self._legs: List[Tuple[str, Union["BinanceClient", "BitmexClient"], CandleAggregator]] = []
+        self._barrier: Optional[BarBarrier] = None
+        self._rolling: Optional[RollingCovariance] = None
+        self._last_close = np.empty(0)
+
+        self._lock = threading.Lock()
+        # Only one change of the symbols at a time
+        self._symbols_lock = threading.Lock()
+
+    # Follow a new list of (exchange, client, contract) symbols. The historical candles of the new symbols are fetched,
+    # so this should not be called from the interface thread.
+    def set_symbols(self, symbols: List[Tuple[str, Union["BinanceClient", "BitmexClient"], Contract]]):
+
+        with self._symbols_lock:
+            legs = []
+
+            for exchange, client, contract in symbols:
+                aggregator = client.get_aggregator(contract, self.timeframe)
+
+                if aggregator is None:
+                    logger.warning("No historical data retrieved for %s, not included in the correlations",
+                                   contract.symbol)
+                    continue
+
+                if exchange == "Binance":
+                    client.subscribe_channel([contract], "aggTrade")
+
+                legs.append((exchange, client, aggregator))
+
+            barrier = BarBarrier([aggregator for _, _, aggregator in legs], self.timeout,
+                                 lambda timestamp: self._on_bar(barrier, timestamp))
+
+            rolling = RollingCovariance(len(legs), self.window)
+            rolling.reset(np.nan_to_num(np.diff(np.log(barrier.bars.close), axis=0)))
+
+            labels = [(exchange, aggregator.contract.symbol) for exchange, _, aggregator in legs]
+
+            # The bars of the aggregators are processed under the lock, not the history requests above
+            with self._lock:
+                old_barrier, old_legs = self._barrier, self._legs
+
+                self._legs = legs
+                self._barrier = barrier
+                self._rolling = rolling
+                self._last_close = barrier.bars.close[-1].copy() if len(barrier.bars) > 0 \
+                    else np.full(len(legs), math.nan)
+
+                self._labels = labels
+                self._indexes = {label: i for i, label in enumerate(labels)}
+                self._publish(barrier.bars.last_timestamp if len(barrier.bars) > 0 else None)
+
+            # The new barrier subscribes before the old one releases the aggregators, so the shared ones are kept
+            barrier.start()
+
+            if old_barrier is not None:
+                old_barrier.stop()
+
+            for _, client, aggregator in old_legs:
+                client.release_aggregator(aggregator)
+
+    def _on_bar(self, barrier: BarBarrier, timestamp: int):
+
+        with self._lock:
+            # Bar of a barrier replaced in the meantime
+            if barrier is not self._barrier:
+                return
+
+            close = barrier.bars.close[-1]
+
+            with np.errstate(divide="ignore", invalid="ignore"):
+                returns = np.log(close / self._last_close)
+
+            self._rolling.update(np.nan_to_num(returns, nan=0.0, posinf=0.0, neginf=0.0))
+            self._last_close = close.copy()
+
+            self._publish(timestamp)
+
+    # Must be called with the lock acquired
+    def _publish(self, timestamp: Optional[int]):
+
+        self.snapshot = (self._labels, self._rolling.covariance(), self._rolling.correlation(), timestamp)
+
+    # :return: The correlation of two symbols, NaN if one of them is not in the Watchlist or not enough bars are known
+    def correlation(self, exchange_a: str, symbol_a: str, exchange_b: str, symbol_b: str) -> float:
+
+        labels, _, correlations, _ = self.snapshot
+
+        i = self._index(labels, (exchange_a, symbol_a))
+        j = self._index(labels, (exchange_b, symbol_b))
+
+        if i is None or j is None:
+            return math.nan
+
+        return float(correlations[i, j])
+
+    def _index(self, labels: List[Tuple[str, str]], label: Tuple[str, str]) -> Optional[int]:
+
+        # The dictionary may already belong to a newer snapshot
+        i = self._indexes.get(label)
+
+        if i is None or i >= len(labels) or labels[i] != label:
+            return None
+
+        return i
+
+    # Pairs of symbols with the strongest correlations (positive or negative)
+    # :return: A list of ((exchange, symbol), (exchange, symbol), correlation)
+    def top_pairs(self, n: int) -> List[Tuple[Tuple[str, str], Tuple[str, str], float]]:
+
+        labels, _, correlations, _ = self.snapshot
+
+        if len(correlations) < 2:
+            return []
+
+        rows, columns = np.triu_indices(len(correlations), k=1)
+        values = correlations[rows, columns]
+        strength = np.nan_to_num(np.abs(values), nan=-1.0)
+
+        n = min(n, len(values))
+        best = np.argpartition(strength, -n)[-n:]
+        best = best[np.argsort(strength[best])[::-1]]
+
+        return [(labels[rows[i]], labels[columns[i]], float(values[i])) for i in best if not math.isnan(values[i])]
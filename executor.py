@@ -0,0 +1,111 @@
+import concurrent.futures
+import logging
+import threading
+from typing import *
+
+# Import the Strategy class name only for typing purpose
+if TYPE_CHECKING:
+    from strategies import Strategy
+
+logger = logging.getLogger()
+
+
+# At the end of a candle, all the strategies of all the symbols get their "new_candle" at the same time. Instead of
+# placing their orders one after the other on the websocket (or CandleScheduler) thread, each waiting for the sizing
+# and the order requests of the previous one, the BarBuilders submit the strategies to the executor of their client,
+# which gives the signals to the strategies in a pool of threads, in priority order so that the most important orders
+# are sent first. The slowest order then sets the delay instead of the sum of all of them.
+# The signal of a strategy is evaluated by a function and arguments returned by Strategy.signal_task(), right away as
+# the indicators are already up to date (see IndicatorRegistry). With use_processes=True, they are sent to other
+# processes instead (for the CPU heavy signals, that would hold the GIL) and must therefore be picklable (a module level
+# function and plain values).
+class CandleCloseExecutor:
+    def __init__(self, exchange: str, max_workers: Optional[int] = None, use_processes: bool = False):
+
+        self.exchange = exchange
+
+        self._signal_pool: Optional[concurrent.futures.ProcessPoolExecutor] = None
+
+        if use_processes:
+            self._signal_pool = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers)
+
+        # The threads mostly wait for the responses of the exchange, so they don't compete for the GIL
+        self._order_pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers,
+                                                                 thread_name_prefix=f"{exchange}Orders")
+
+        self._pending: List[Tuple["Strategy", Callable, Tuple]] = []
+        self._lock = threading.Lock()
+
+    # Strategies without a signal task (signals evaluated on every trade) are run right away
+    def submit(self, strategy: "Strategy", price: float):
+
+        task = strategy.signal_task()
+
+        if task is None:
+            strategy.on_trade("new_candle", price)
+            return
+
+        with self._lock:
+            self._pending.append((strategy, task[0], task[1]))
+
+    # Evaluate the signals submitted since the last call, then place the orders concurrently, in priority order.
+    # Returns once all the orders have been placed, so that a strategy never receives the signal of its next candle
+    # while it is still placing an order. Must not be called while holding the lock of a BarBuilder.
+    def flush(self):
+
+        with self._lock:
+            pending = self._pending
+            self._pending = []
+
+        if len(pending) == 0:
+            return
+
+        # Evaluated right away unless the signals are CPU heavy, a single one isn't worth the round trip to a process
+        if self._signal_pool is None or len(pending) == 1:
+            futures = [(strategy, self._evaluate_now(func, args)) for strategy, func, args in pending]
+        else:
+            futures = [(strategy, self._signal_pool.submit(func, *args)) for strategy, func, args in pending]
+
+        results = []
+
+        for strategy, future in futures:
+            try:
+                results.append((strategy, future.result()))
+            except Exception as e:
+                logger.error("%s error while evaluating the %s %s signal: %s", self.exchange,
+                             strategy.contract.symbol, strategy.strat_name, e)
+
+        # Stable sort: the strategies with the same priority keep the order of their candles
+        results.sort(key=lambda result: result[0].priority(), reverse=True)
+
+        # Only the signals opening a position place orders
+        results = [(strategy, signal_result) for strategy, signal_result in results if signal_result in [1, -1]]
+
+        if len(results) == 1:
+            self._on_signal(*results[0])
+            return
+
+        # The pool starts the tasks in the order they are submitted
+        orders = [self._order_pool.submit(self._on_signal, strategy, signal_result)
+                  for strategy, signal_result in results]
+
+        concurrent.futures.wait(orders)
+
+    def _on_signal(self, strategy: "Strategy", signal_result: int):
+
+        try:
+            strategy.on_signal(signal_result)
+        except Exception as e:
+            logger.error("%s error while placing the %s %s order: %s", self.exchange, strategy.contract.symbol,
+                         strategy.strat_name, e)
+
+    def _evaluate_now(self, func: Callable, args: Tuple) -> concurrent.futures.Future:
+
+        future = concurrent.futures.Future()
+
+        try:
+            future.set_result(func(*args))
+        except Exception as e:
+            future.set_exception(e)
+
+        return future
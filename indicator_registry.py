@@ -0,0 +1,297 @@
+import bisect
+import copy
+import math
+from typing import *
+
+import numpy as np
+
+import indicators
+from indicators import EmaState, SmaState, RsiState, AtrState, RollingMaxState, RollingMinState, BollingerState
+
+# Indicator keys: (indicator name, parameters...). The parameters of an indicator computed from another series include
+# the key of that series, e.g. ("ema", 9, ("macd_line", 12, 26)) is the MACD signal line.
+CLOSE = ("close",)
+HIGH = ("high",)
+LOW = ("low",)
+
+
+def ema_key(span: int, source: Tuple = CLOSE) -> Tuple:
+    return "ema", span, source
+
+
+def sma_key(length: int, source: Tuple = CLOSE) -> Tuple:
+    return "sma", length, source
+
+
+def rsi_key(length: int, source: Tuple = CLOSE) -> Tuple:
+    return "rsi", length, source
+
+
+# Donchian Channel upper and lower bands
+def highest_key(length: int, source: Tuple = HIGH) -> Tuple:
+    return "highest", length, source
+
+
+def lowest_key(length: int, source: Tuple = LOW) -> Tuple:
+    return "lowest", length, source
+
+
+# Bollinger Bands, the value of the node is the (middle, upper, lower) tuple
+def bollinger_key(length: int, num_std: float, source: Tuple = CLOSE) -> Tuple:
+    return "bollinger", length, num_std, source
+
+
+def atr_key(length: int) -> Tuple:
+    return "atr", length
+
+
+def macd_line_key(ema_fast: int, ema_slow: int) -> Tuple:
+    return "macd_line", ema_fast, ema_slow
+
+
+def macd_signal_key(ema_fast: int, ema_slow: int, ema_signal: int) -> Tuple:
+    return ema_key(ema_signal, macd_line_key(ema_fast, ema_slow))
+
+
+# Keys of the indicators a node is computed from
+def _input_keys(key: Tuple) -> List[Tuple]:
+
+    if key[0] in ["ema", "sma", "rsi", "highest", "lowest"]:
+        return [key[2]]
+
+    elif key[0] == "bollinger":
+        return [key[3]]
+
+    elif key[0] == "macd_line":
+        return [ema_key(key[1]), ema_key(key[2])]
+
+    return []
+
+
+# One indicator of one market and timeframe, updated once per closed candle with the values of its input nodes
+class IndicatorNode:
+    def __init__(self, key: Tuple, inputs: List["IndicatorNode"]):
+
+        self.key = key
+        self.inputs = inputs
+
+        # Number of strategies and dependent nodes using the node
+        self.refs = 0
+
+        self.value = math.nan
+
+        # Value before the last update, None if the node has never been updated (see undo())
+        self._prev_value: Optional[Tuple[Any]] = None
+
+        if key[0] == "ema":
+            self._state = EmaState(span=key[1])
+        elif key[0] == "sma":
+            self._state = SmaState(key[1])
+        elif key[0] == "rsi":
+            self._state = RsiState(key[1])
+        elif key[0] == "atr":
+            self._state = AtrState(key[1])
+        elif key[0] == "highest":
+            self._state = RollingMaxState(key[1])
+        elif key[0] == "lowest":
+            self._state = RollingMinState(key[1])
+        elif key[0] == "bollinger":
+            self._state = BollingerState(key[1], key[2])
+            self.value = (math.nan, math.nan, math.nan)
+        elif key[0] in ["close", "high", "low", "macd_line"]:
+            self._state = None
+        else:
+            raise ValueError(f"Unknown indicator {key[0]}")
+
+    def update(self, high: float, low: float, close: float):
+
+        self._prev_value = (self.value,)
+
+        name = self.key[0]
+
+        if name == "close":
+            self.value = close
+
+        elif name == "high":
+            self.value = high
+
+        elif name == "low":
+            self.value = low
+
+        elif name == "macd_line":
+            self.value = self.inputs[0].value - self.inputs[1].value
+
+        elif name == "atr":
+            self.value = self._state.update(high, low, close)
+
+        else:
+            self.value = self._state.update(self.inputs[0].value)
+
+    # Cancel the last update in O(1), see EmaState.undo()
+    # :return: False if there is no update to cancel
+    def undo(self) -> bool:
+
+        if self._prev_value is None:
+            return False
+
+        self.value = self._prev_value[0]
+        self._prev_value = None
+
+        if self._state is not None:
+            self._state.undo()
+
+        return True
+
+
+# Indicators of one CandleAggregator, shared by all the strategies of its market and timeframe. Each node is computed
+# once per closed candle, whatever the number of strategies using it, and the nodes depending on another indicator
+# (e.g. the MACD signal line on the MACD line) reuse its value. A node is removed when no strategy uses it anymore.
+class IndicatorRegistry:
+    def __init__(self):
+
+        # Replaced by a new dictionary (never modified in place) so that the websocket thread can loop through it while
+        # a strategy is added or removed. The inputs of a node are always inserted before it, so looping through the
+        # dictionary updates the nodes in the right order.
+        self.nodes: Dict[Tuple, IndicatorNode] = dict()
+
+        # States of the nodes saved in a checkpoint (see restore()) and timestamp of their last candle
+        self._restored: Dict[Tuple, Tuple[Any, Any]] = dict()
+        self._restored_ts: Optional[int] = None
+
+
+    # Get the node of an indicator, created with the closed candles of the history if no strategy uses it yet.
+    # Every acquire() must be matched by a release() when the strategy stops.
+    def acquire(self, key: Tuple, candles: Dict[str, List[float]]) -> IndicatorNode:
+
+        node = self.nodes.get(key)
+
+        if node is None:
+            inputs = [self.acquire(input_key, candles) for input_key in _input_keys(key)]
+
+            node = IndicatorNode(key, inputs)
+            self._backfill(node, candles)
+
+            self.nodes = {**self.nodes, key: node}
+
+        node.refs += 1
+
+        return node
+
+    def release(self, key: Tuple):
+
+        node = self.nodes.get(key)
+
+        if node is None:
+            return
+
+        node.refs -= 1
+
+        if node.refs > 0:
+            return
+
+        self.nodes = {k: n for k, n in self.nodes.items() if k != key}
+
+        for input_node in node.inputs:
+            self.release(input_node.key)
+
+    # The live input nodes are already up to date, so the history is replayed through a private copy of the inputs
+    # before the new node takes their place. Only the candles after the checkpoint are replayed if the states of the
+    # whole chain were restored.
+    def _backfill(self, node: IndicatorNode, candles: Dict[str, List[float]]):
+
+        chain: Dict[Tuple, IndicatorNode] = dict()
+
+        def copy_node(key: Tuple) -> IndicatorNode:
+            if key not in chain:
+                chain[key] = IndicatorNode(key, [copy_node(input_key) for input_key in _input_keys(key)])
+            return chain[key]
+
+        node_copy = copy_node(node.key)
+
+        start = 0
+
+        if self._restored_ts is not None and all(key in self._restored for key in chain):
+            for key, n in chain.items():
+                n._state, n.value = copy.deepcopy(self._restored[key])
+
+            start = bisect.bisect_right(candles['timestamp'], self._restored_ts)
+
+        for high, low, close in zip(candles['high'][start:], candles['low'][start:], candles['close'][start:]):
+            for n in chain.values():
+                n.update(high, low, close)
+
+        node._state = node_copy._state
+        node.value = node_copy.value
+        node._prev_value = node_copy._prev_value
+
+    # State and value of every node, to be saved in a checkpoint
+    def snapshot(self) -> Dict[Tuple, Tuple[Any, Any]]:
+        return {key: (node._state, node.value) for key, node in self.nodes.items()}
+
+    # States of a snapshot taken after the candle of `timestamp` closed, used by the next nodes created
+    def restore(self, states: Dict[Tuple, Tuple[Any, Any]], timestamp: int):
+        self._restored = states
+        self._restored_ts = timestamp
+
+    # Called by the aggregator when a candle closes, before the strategies
+    def on_candle_close(self, high: float, low: float, close: float):
+
+        for node in self.nodes.values():
+            node.update(high, low, close)
+
+    # Called by the aggregator when late trades have changed the last closed candle: its update of the nodes is
+    # cancelled and done again with the new values. The nodes created since it closed were also updated with it last
+    # (see _backfill()), except the ones restored from a checkpoint without any candle to replay, left as they are.
+    def amend_last_close(self, high: float, low: float, close: float):
+
+        nodes = [node for node in self.nodes.values() if node.undo()]
+
+        for node in nodes:
+            node.update(high, low, close)
+
+
+# Batch flavor of the nodes: the whole series of an indicator over the candles (NumPy arrays of the "high", "low" and
+# "close" fields), with the same values as the node would have after each of these candles closed. The series of the
+# inputs are stored in `cache` so that they are computed only once for several indicators.
+def compute_series(key: Tuple, candles: Dict[str, np.ndarray],
+                   cache: Optional[Dict[Tuple, Any]] = None) -> Union[np.ndarray, Tuple[np.ndarray, ...]]:
+
+    if cache is None:
+        cache = dict()
+
+    if key in cache:
+        return cache[key]
+
+    name = key[0]
+
+    if name in ["close", "high", "low"]:
+        series = np.asarray(candles[name], dtype=np.float64)
+
+    elif name == "macd_line":
+        series = compute_series(ema_key(key[1]), candles, cache) - compute_series(ema_key(key[2]), candles, cache)
+
+    elif name == "atr":
+        series = indicators.atr(compute_series(HIGH, candles, cache), compute_series(LOW, candles, cache),
+                                compute_series(CLOSE, candles, cache), key[1])
+
+    else:
+        source = compute_series(_input_keys(key)[0], candles, cache)
+
+        if name == "ema":
+            series = indicators.ema(source, key[1])
+        elif name == "sma":
+            series = indicators.sma(source, key[1])
+        elif name == "rsi":
+            series = indicators.rsi(source, key[1])
+        elif name == "highest":
+            series = indicators.rolling_max(source, key[1])
+        elif name == "lowest":
+            series = indicators.rolling_min(source, key[1])
+        elif name == "bollinger":
+            series = indicators.bollinger(source, key[1], key[2])
+        else:
+            raise ValueError(f"Unknown indicator {name}")
+
+    cache[key] = series
+
+    return series
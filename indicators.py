@@ -0,0 +1,823 @@
+import math
+import collections
+from typing import *
+
+import numpy as np
+import pandas as pd
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# Indicators shared by the strategies (and any backtest).
+# Each indicator comes in two flavors:
+#   - a batch function working on whole NumPy arrays (e.g. the CandleBuffer views), to backfill a history. The result
+#     is written to the `out` array(s) when they are given, so that the same scratch buffers can be reused between
+#     calls instead of allocating new arrays every time.
+#   - a streaming State class, updated in O(1) with the values of each new closed candle, for live trading.
+# Both flavors return the same values. Wilder's smoothing (RSI, ATR, ADX) is done with an EMA of center of mass
+# length - 1 and min_periods=length, as the RSI was originally computed with pandas in TechnicalStrategy.
+
+
+def _span_to_com(span: float) -> float:
+    return (span - 1) / 2.0
+
+
+def _get_out(out: Optional[np.ndarray], size: int) -> np.ndarray:
+
+    if out is None:
+        return np.empty(size, dtype=np.float64)
+
+    if len(out) != size:
+        raise ValueError(f"Output buffer has length {len(out)}, expected {size}")
+
+    return out
+
+
+# Numba is optional: when it is installed, the recursive indicators (EMA, Wilder's smoothing, ATR) are computed by the
+# compiled kernels (see _ewm_mean()), otherwise by the compiled pandas implementation of ewm().
+# Exponentially weighted mean, same recursion as pandas for Series.ewm(com=com, min_periods=min_periods).mean()
+# (adjust=True, ignore_na=False), see EmaState.update() for the streaming version. `out` can be the `values` array.
+def _ewm_mean_kernel(values: np.ndarray, alpha: float, min_periods: int, out: np.ndarray):
+
+    size = len(values)
+
+    if size == 0:
+        return
+
+    old_wt_factor = 1.0 - alpha
+    new_wt = 1.0
+    min_periods = max(min_periods, 1)
+
+    weighted = values[0]
+    nobs = 1 if weighted == weighted else 0
+    old_wt = 1.0
+
+    out[0] = weighted if nobs >= min_periods else np.nan
+
+    for i in range(1, size):
+        x = values[i]
+        is_observation = x == x
+        nobs += is_observation
+
+        if weighted == weighted:
+            old_wt *= old_wt_factor
+
+            if is_observation:
+                # Avoid numerical errors on constant series
+                if weighted != x:
+                    weighted = (old_wt * weighted + new_wt * x) / (old_wt + new_wt)
+
+                old_wt += new_wt
+
+        elif is_observation:
+            weighted = x
+
+        out[i] = weighted if nobs >= min_periods else np.nan
+
+
+# Average True Range in a single pass: true range and Wilder's smoothing of center of mass length - 1
+def _atr_kernel(high: np.ndarray, low: np.ndarray, close: np.ndarray, length: int, out: np.ndarray):
+
+    size = len(close)
+
+    if size == 0:
+        return
+
+    old_wt_factor = 1.0 - 1.0 / length
+
+    weighted = high[0] - low[0]
+    nobs = 1 if weighted == weighted else 0
+    old_wt = 1.0
+
+    out[0] = weighted if nobs >= length else np.nan
+
+    for i in range(1, size):
+        prev_close = close[i - 1]
+        x = max(high[i] - low[i], abs(high[i] - prev_close), abs(low[i] - prev_close))
+        is_observation = x == x
+        nobs += is_observation
+
+        if weighted == weighted:
+            old_wt *= old_wt_factor
+
+            if is_observation:
+                if weighted != x:
+                    weighted = (old_wt * weighted + x) / (old_wt + 1.0)
+
+                old_wt += 1.0
+
+        elif is_observation:
+            weighted = x
+
+        out[i] = weighted if nobs >= length else np.nan
+
+
+if numba is not None:
+    # Compiled on first use, and cached on disk for the next runs
+    _ewm_mean_kernel = numba.njit(cache=True, nogil=True)(_ewm_mean_kernel)
+    _atr_kernel = numba.njit(cache=True, nogil=True)(_atr_kernel)
+
+
+# Can be set to False to compare with pandas
+use_numba = numba is not None
+
+
+def _ewm_mean(values: np.ndarray, com: float, min_periods: int, out: np.ndarray) -> np.ndarray:
+
+    if use_numba:
+        _ewm_mean_kernel(np.ascontiguousarray(values, dtype=np.float64), 1.0 / (1.0 + com), min_periods, out)
+        return out
+
+    result = pd.Series(values, copy=False).ewm(com=com, min_periods=min_periods).mean()
+    np.copyto(out, result.to_numpy())
+
+    return out
+
+
+def ema(values: np.ndarray, span: float, min_periods: int = 0, out: Optional[np.ndarray] = None) -> np.ndarray:
+    return _ewm_mean(values, _span_to_com(span), min_periods, _get_out(out, len(values)))
+
+
+# Simple moving average, NaN for the first length - 1 values
+def sma(values: np.ndarray, length: int, out: Optional[np.ndarray] = None) -> np.ndarray:
+
+    out = _get_out(out, len(values))
+    out[:] = math.nan
+
+    if len(values) >= length:
+        windows = np.lib.stride_tricks.sliding_window_view(values, length)
+        np.mean(windows, axis=1, out=out[length - 1:])
+
+    return out
+
+
+def macd(closes: np.ndarray, ema_fast: int, ema_slow: int, ema_signal: int,
+         out: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> Tuple[np.ndarray, np.ndarray]:
+
+    macd_line, macd_signal = out if out is not None else (None, None)
+
+    macd_line = ema(closes, ema_fast, out=macd_line)
+    # The signal buffer is used as scratch space for the slow EMA before receiving the signal line
+    slow = ema(closes, ema_slow, out=macd_signal)
+    np.subtract(macd_line, slow, out=macd_line)
+
+    macd_signal = ema(macd_line, ema_signal, out=slow)
+
+    return macd_line, macd_signal
+
+
+# RSI of each close price, the first value is always NaN as there is no price change to compute
+def rsi(closes: np.ndarray, rsi_length: int, out: Optional[np.ndarray] = None) -> np.ndarray:
+
+    size = len(closes)
+    out = _get_out(out, size)
+    out[:] = math.nan
+
+    if size < 2:
+        return out
+
+    delta = np.diff(closes)
+    gains = np.maximum(delta, 0.0)
+    losses = np.maximum(-delta, 0.0)
+
+    avg_gain = _ewm_mean(gains, rsi_length - 1, rsi_length, gains)
+    avg_loss = _ewm_mean(losses, rsi_length - 1, rsi_length, losses)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = np.divide(avg_gain, avg_loss, out=avg_gain)
+        out[1:] = 100 - 100 / (1 + rs)
+
+    return out
+
+
+def _true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray, out: np.ndarray) -> np.ndarray:
+
+    np.subtract(high, low, out=out)
+
+    if len(close) > 1:
+        prev_close = close[:-1]
+        np.maximum(out[1:], np.abs(high[1:] - prev_close), out=out[1:])
+        np.maximum(out[1:], np.abs(low[1:] - prev_close), out=out[1:])
+
+    return out
+
+
+# Average True Range
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, length: int,
+        out: Optional[np.ndarray] = None) -> np.ndarray:
+
+    out = _get_out(out, len(close))
+
+    if use_numba:
+        _atr_kernel(np.asarray(high, dtype=np.float64), np.asarray(low, dtype=np.float64),
+                    np.asarray(close, dtype=np.float64), length, out)
+        return out
+
+    _true_range(high, low, close, out)
+
+    return _ewm_mean(out, length - 1, length, out)
+
+
+# Bollinger Bands: moving average +/- num_std standard deviations (population standard deviation by default)
+# :return: The middle, upper and lower bands
+def bollinger(closes: np.ndarray, length: int, num_std: float = 2.0, ddof: int = 0,
+              out: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None) \
+        -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+
+    middle, upper, lower = out if out is not None else (None, None, None)
+
+    middle = sma(closes, length, out=middle)
+    upper = _get_out(upper, len(closes))
+    lower = _get_out(lower, len(closes))
+
+    upper[:] = math.nan
+
+    if len(closes) >= length:
+        windows = np.lib.stride_tricks.sliding_window_view(closes, length)
+        np.std(windows, axis=1, ddof=ddof, out=upper[length - 1:])
+
+    np.multiply(upper, num_std, out=upper)
+    np.subtract(middle, upper, out=lower)
+    np.add(middle, upper, out=upper)
+
+    return middle, upper, lower
+
+
+# Stochastic Oscillator: %K compares the close to the range of the last k_length candles, %D is the SMA of %K
+def stochastic(high: np.ndarray, low: np.ndarray, close: np.ndarray, k_length: int, d_length: int = 3,
+               out: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> Tuple[np.ndarray, np.ndarray]:
+
+    k, d = out if out is not None else (None, None)
+
+    k = _get_out(k, len(close))
+    d = _get_out(d, len(close))
+
+    k[:] = math.nan
+    d[:] = math.nan
+
+    if len(close) >= k_length:
+        highest = np.max(np.lib.stride_tricks.sliding_window_view(high, k_length), axis=1)
+        lowest = np.min(np.lib.stride_tricks.sliding_window_view(low, k_length), axis=1)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            k[k_length - 1:] = 100 * (close[k_length - 1:] - lowest) / (highest - lowest)
+
+        # A flat range gives an undefined %K
+        k[k_length - 1:][highest == lowest] = math.nan
+
+        sma(k[k_length - 1:], d_length, out=d[k_length - 1:])
+
+    return k, d
+
+
+# Highest / lowest value of the last `length` values, NaN while there are less than `length` values
+def rolling_max(values: np.ndarray, length: int, out: Optional[np.ndarray] = None) -> np.ndarray:
+
+    out = _get_out(out, len(values))
+    out[:] = math.nan
+
+    if len(values) >= length:
+        np.max(np.lib.stride_tricks.sliding_window_view(values, length), axis=1, out=out[length - 1:])
+
+    return out
+
+
+def rolling_min(values: np.ndarray, length: int, out: Optional[np.ndarray] = None) -> np.ndarray:
+
+    out = _get_out(out, len(values))
+    out[:] = math.nan
+
+    if len(values) >= length:
+        np.min(np.lib.stride_tricks.sliding_window_view(values, length), axis=1, out=out[length - 1:])
+
+    return out
+
+
+# Donchian Channel: highest high and lowest low of the last `length` candles
+# :return: The middle, upper and lower bands
+def donchian(high: np.ndarray, low: np.ndarray, length: int,
+             out: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None) \
+        -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+
+    middle, upper, lower = out if out is not None else (None, None, None)
+
+    middle = _get_out(middle, len(high))
+    upper = rolling_max(high, length, out=upper)
+    lower = rolling_min(low, length, out=lower)
+
+    np.add(upper, lower, out=middle)
+    np.divide(middle, 2, out=middle)
+
+    return middle, upper, lower
+
+
+# Volume Weighted Average Price since the first candle, based on the typical price (high + low + close) / 3
+def vwap(high: np.ndarray, low: np.ndarray, close: np.ndarray, volume: np.ndarray,
+         out: Optional[np.ndarray] = None) -> np.ndarray:
+
+    out = _get_out(out, len(close))
+
+    np.add(high, low, out=out)
+    np.add(out, close, out=out)
+    np.divide(out, 3, out=out)
+    np.multiply(out, volume, out=out)
+    np.cumsum(out, out=out)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        np.divide(out, np.cumsum(volume), out=out)
+
+    return out
+
+
+# Average Directional Index
+# :return: The ADX, +DI and -DI
+def adx(high: np.ndarray, low: np.ndarray, close: np.ndarray, length: int,
+        out: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+
+    size = len(close)
+    adx_out, plus_di, minus_di = out if out is not None else (None, None, None)
+
+    adx_out = _get_out(adx_out, size)
+    plus_di = _get_out(plus_di, size)
+    minus_di = _get_out(minus_di, size)
+
+    adx_out[:] = math.nan
+    plus_di[:] = math.nan
+    minus_di[:] = math.nan
+
+    if size < 2:
+        return adx_out, plus_di, minus_di
+
+    up_move = np.diff(high)
+    down_move = -np.diff(low)
+
+    plus_dm = np.where((up_move > down_move) & (up_move > 0), up_move, 0.0)
+    minus_dm = np.where((down_move > up_move) & (down_move > 0), down_move, 0.0)
+
+    true_range = _true_range(high, low, close, np.empty(size))[1:]
+
+    smoothed_tr = _ewm_mean(true_range, length - 1, length, true_range)
+    smoothed_plus = _ewm_mean(plus_dm, length - 1, length, plus_dm)
+    smoothed_minus = _ewm_mean(minus_dm, length - 1, length, minus_dm)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        np.divide(100 * smoothed_plus, smoothed_tr, out=plus_di[1:])
+        np.divide(100 * smoothed_minus, smoothed_tr, out=minus_di[1:])
+
+        dx = 100 * np.abs(plus_di[1:] - minus_di[1:]) / (plus_di[1:] + minus_di[1:])
+
+    _ewm_mean(dx, length - 1, length, adx_out[1:])
+
+    return adx_out, plus_di, minus_di
+
+
+# Streaming exponential moving average, updated in O(1) each time a candle closes.
+# It follows step by step the recursion used by pandas for Series.ewm(...).mean() (with adjust=True and
+# ignore_na=False), so the values are the same as the ones computed over the full close prices Series.
+class EmaState:
+    def __init__(self, span: Optional[float] = None, com: Optional[float] = None, min_periods: int = 0):
+
+        if span is not None:
+            com = _span_to_com(span)
+
+        if com is None:
+            raise ValueError("EmaState requires a span or a center of mass")
+
+        alpha = 1.0 / (1.0 + com)
+
+        self._old_wt_factor = 1.0 - alpha
+        self._new_wt = 1.0
+        self._min_periods = max(int(min_periods), 1)
+
+        self._started = False
+        self._weighted = math.nan
+        self._old_wt = 1.0
+        self.nobs = 0
+
+        self.value = math.nan
+
+        # Values before the last update, see undo()
+        self._undo = None
+
+    # Add a new observation and return the updated EMA (NaN while there are less than min_periods observations)
+    def update(self, x: float) -> float:
+
+        self._undo = (self._started, self._weighted, self._old_wt, self.nobs, self.value)
+
+        is_observation = x == x
+
+        if not self._started:
+            # First value of the series
+            self._started = True
+            self._weighted = x
+
+        elif self._weighted == self._weighted:
+            self._old_wt *= self._old_wt_factor
+
+            if is_observation:
+                # Avoid numerical errors on constant series
+                if self._weighted != x:
+                    self._weighted = self._old_wt * self._weighted + self._new_wt * x
+                    self._weighted /= (self._old_wt + self._new_wt)
+
+                self._old_wt += self._new_wt
+
+        elif is_observation:
+            self._weighted = x
+
+        self.nobs += is_observation
+
+        self.value = self._weighted if self.nobs >= self._min_periods else math.nan
+
+        return self.value
+
+    # Cancel the last update, e.g. to update the state again with an amended value. The states of this module keep in
+    # _undo what the last update changed, so that undo() is O(1) like update().
+    def undo(self):
+        self._started, self._weighted, self._old_wt, self.nobs, self.value = self._undo
+
+
+# Simple moving average, NaN while the window is not full or contains a NaN value
+class SmaState:
+    def __init__(self, length: int):
+
+        self._length = length
+        self._window = collections.deque(maxlen=length)
+        self._sum = 0.0
+        self._nan_count = 0
+
+        self.value = math.nan
+
+        self._undo = None
+
+    def update(self, x: float) -> float:
+
+        full = len(self._window) == self._length
+        self._undo = (full, self._window[0] if full else None, self._sum, self._nan_count, self.value)
+
+        if full:
+            old = self._window[0]
+
+            if old == old:
+                self._sum -= old
+            else:
+                self._nan_count -= 1
+
+        self._window.append(x)
+
+        if x == x:
+            self._sum += x
+        else:
+            self._nan_count += 1
+
+        if len(self._window) == self._length and self._nan_count == 0:
+            self.value = self._sum / self._length
+        else:
+            self.value = math.nan
+
+        return self.value
+
+    def undo(self):
+
+        full, old, self._sum, self._nan_count, self.value = self._undo
+
+        self._window.pop()
+
+        if full:
+            self._window.appendleft(old)
+
+
+# Highest value of the last `length` values, in O(1) amortized per update: the deque only keeps the values that can
+# still become the highest one (each value is smaller than the previous one), with their position so that the first
+# value is dropped once it is out of the window
+class RollingMaxState:
+    def __init__(self, length: int):
+
+        self._length = length
+        self._deque = collections.deque()
+        self._count = 0
+
+        self.value = math.nan
+
+        self._undo = None
+
+    def _dominates(self, x: float, other: float) -> bool:
+        return x >= other
+
+    def update(self, x: float) -> float:
+
+        # The values dropped by this update, as many as it pushes over time
+        popped = []
+        expired = None
+        value = self.value
+
+        while len(self._deque) > 0 and self._dominates(x, self._deque[-1][1]):
+            popped.append(self._deque.pop())
+
+        self._deque.append((self._count, x))
+        self._count += 1
+
+        if self._deque[0][0] <= self._count - 1 - self._length:
+            expired = self._deque.popleft()
+
+        if self._count >= self._length:
+            self.value = self._deque[0][1]
+
+        self._undo = (popped, expired, value)
+
+        return self.value
+
+    def undo(self):
+
+        popped, expired, self.value = self._undo
+
+        self._deque.pop()
+        self._count -= 1
+
+        self._deque.extend(reversed(popped))
+
+        if expired is not None:
+            self._deque.appendleft(expired)
+
+
+# Lowest value of the last `length` values, see RollingMaxState
+class RollingMinState(RollingMaxState):
+    def _dominates(self, x: float, other: float) -> bool:
+        return x <= other
+
+
+# Donchian Channel, see RollingMaxState
+class DonchianState:
+    def __init__(self, length: int):
+
+        self._highest = RollingMaxState(length)
+        self._lowest = RollingMinState(length)
+
+        self.upper = math.nan
+        self.lower = math.nan
+        self.middle = math.nan
+
+    def update(self, high: float, low: float) -> Tuple[float, float, float]:
+
+        self.upper = self._highest.update(high)
+        self.lower = self._lowest.update(low)
+        self.middle = (self.upper + self.lower) / 2
+
+        return self.middle, self.upper, self.lower
+
+
+# MACD line (fast EMA - slow EMA) and its signal line (EMA of the MACD line), both updated in O(1)
+class MacdState:
+    def __init__(self, ema_fast: int, ema_slow: int, ema_signal: int):
+
+        self._ema_fast = EmaState(span=ema_fast)
+        self._ema_slow = EmaState(span=ema_slow)
+        self._ema_signal = EmaState(span=ema_signal)
+
+        self.macd_line = math.nan
+        self.macd_signal = math.nan
+
+    def update(self, close: float) -> Tuple[float, float]:
+
+        self.macd_line = self._ema_fast.update(close) - self._ema_slow.update(close)
+        self.macd_signal = self._ema_signal.update(self.macd_line)
+
+        return self.macd_line, self.macd_signal
+
+
+# Relative Strength Index with Wilder's smoothing: the average gain and the average loss are EMAs with a center of
+# mass of rsi_length - 1, updated in O(1) with the price change of each closed candle.
+class RsiState:
+    def __init__(self, rsi_length: int):
+
+        self._avg_gain = EmaState(com=rsi_length - 1, min_periods=rsi_length)
+        self._avg_loss = EmaState(com=rsi_length - 1, min_periods=rsi_length)
+
+        self._prev_close = None
+
+        self.value = math.nan
+
+        self._undo = None
+
+    def update(self, close: float) -> float:
+
+        self._undo = (self._prev_close, self.value)
+
+        if self._prev_close is None:
+            # The first close price has no price change to compare to
+            self._prev_close = close
+            return self.value
+
+        delta = close - self._prev_close
+        self._prev_close = close
+
+        avg_gain = self._avg_gain.update(delta if delta > 0 else 0.0)
+        avg_loss = self._avg_loss.update(-delta if delta < 0 else 0.0)
+
+        if avg_gain != avg_gain or avg_loss != avg_loss:
+            self.value = math.nan
+
+        elif avg_loss == 0:
+            # Relative Strength is infinite (or undefined if there was no price change at all)
+            self.value = 100.0 if avg_gain > 0 else math.nan
+
+        else:
+            rs = avg_gain / avg_loss
+            self.value = 100 - 100 / (1 + rs)
+
+        return self.value
+
+    def undo(self):
+
+        self._prev_close, self.value = self._undo
+
+        # The averages were only updated if there was a price change
+        if self._prev_close is not None:
+            self._avg_gain.undo()
+            self._avg_loss.undo()
+
+
+class AtrState:
+    def __init__(self, length: int):
+
+        self._true_range = EmaState(com=length - 1, min_periods=length)
+        self._prev_close = None
+
+        self.value = math.nan
+
+        self._undo = None
+
+    def update(self, high: float, low: float, close: float) -> float:
+
+        self._undo = (self._prev_close, self.value)
+
+        true_range = high - low
+
+        if self._prev_close is not None:
+            true_range = max(true_range, abs(high - self._prev_close), abs(low - self._prev_close))
+
+        self._prev_close = close
+
+        self.value = self._true_range.update(true_range)
+
+        return self.value
+
+    def undo(self):
+
+        self._prev_close, self.value = self._undo
+        self._true_range.undo()
+
+
+# Bollinger Bands, the rolling variance is updated in O(1) with Welford's algorithm adapted to a sliding window
+class BollingerState:
+    def __init__(self, length: int, num_std: float = 2.0, ddof: int = 0):
+
+        self._length = length
+        self._num_std = num_std
+        self._ddof = ddof
+
+        self._window = collections.deque(maxlen=length)
+        self._mean = 0.0
+        # Sum of the squared differences to the mean
+        self._m2 = 0.0
+
+        self.middle = math.nan
+        self.upper = math.nan
+        self.lower = math.nan
+        self.std = math.nan
+
+        self._undo = None
+
+    def update(self, x: float) -> Tuple[float, float, float]:
+
+        full = len(self._window) == self._length
+        self._undo = (full, self._window[0] if full else None, self._mean, self._m2, self.middle, self.upper,
+                      self.lower, self.std)
+
+        if len(self._window) < self._length:
+            # Window not full yet: standard Welford update
+            self._window.append(x)
+
+            delta = x - self._mean
+            self._mean += delta / len(self._window)
+            self._m2 += delta * (x - self._mean)
+
+        else:
+            # Replace the oldest value by the new one
+            old = self._window[0]
+            self._window.append(x)
+
+            old_mean = self._mean
+            self._mean += (x - old) / self._length
+            self._m2 += (x - old) * (x - self._mean + old - old_mean)
+
+        if len(self._window) == self._length:
+            self.std = math.sqrt(max(self._m2, 0.0) / (self._length - self._ddof))
+            self.middle = self._mean
+            self.upper = self._mean + self._num_std * self.std
+            self.lower = self._mean - self._num_std * self.std
+
+        return self.middle, self.upper, self.lower
+
+    def undo(self):
+
+        full, old, self._mean, self._m2, self.middle, self.upper, self.lower, self.std = self._undo
+
+        self._window.pop()
+
+        if full:
+            self._window.appendleft(old)
+
+
+class StochasticState:
+    def __init__(self, k_length: int, d_length: int = 3):
+
+        self._highest = RollingMaxState(k_length)
+        self._lowest = RollingMinState(k_length)
+        self._d = SmaState(d_length)
+
+        self.k = math.nan
+        self.d = math.nan
+
+    def update(self, high: float, low: float, close: float) -> Tuple[float, float]:
+
+        highest = self._highest.update(high)
+        lowest = self._lowest.update(low)
+
+        if highest == highest:
+            self.k = 100 * (close - lowest) / (highest - lowest) if highest != lowest else math.nan
+            self.d = self._d.update(self.k)
+
+        return self.k, self.d
+
+
+class VwapState:
+    def __init__(self):
+
+        self._price_volume = 0.0
+        self._volume = 0.0
+
+        self.value = math.nan
+
+    def update(self, high: float, low: float, close: float, volume: float) -> float:
+
+        self._price_volume += (high + low + close) / 3 * volume
+        self._volume += volume
+
+        self.value = self._price_volume / self._volume if self._volume != 0 else math.nan
+
+        return self.value
+
+
+class AdxState:
+    def __init__(self, length: int):
+
+        self._true_range = EmaState(com=length - 1, min_periods=length)
+        self._plus_dm = EmaState(com=length - 1, min_periods=length)
+        self._minus_dm = EmaState(com=length - 1, min_periods=length)
+        self._dx = EmaState(com=length - 1, min_periods=length)
+
+        self._prev_high = None
+        self._prev_low = None
+        self._prev_close = None
+
+        self.value = math.nan
+        self.plus_di = math.nan
+        self.minus_di = math.nan
+
+    def update(self, high: float, low: float, close: float) -> float:
+
+        if self._prev_close is None:
+            self._prev_high, self._prev_low, self._prev_close = high, low, close
+            return self.value
+
+        up_move = high - self._prev_high
+        down_move = self._prev_low - low
+
+        plus_dm = up_move if up_move > down_move and up_move > 0 else 0.0
+        minus_dm = down_move if down_move > up_move and down_move > 0 else 0.0
+
+        true_range = max(high - low, abs(high - self._prev_close), abs(low - self._prev_close))
+
+        self._prev_high, self._prev_low, self._prev_close = high, low, close
+
+        smoothed_tr = self._true_range.update(true_range)
+        smoothed_plus = self._plus_dm.update(plus_dm)
+        smoothed_minus = self._minus_dm.update(minus_dm)
+
+        if smoothed_tr == smoothed_tr and smoothed_tr != 0:
+            self.plus_di = 100 * smoothed_plus / smoothed_tr
+            self.minus_di = 100 * smoothed_minus / smoothed_tr
+        else:
+            self.plus_di = math.nan
+            self.minus_di = math.nan
+
+        di_sum = self.plus_di + self.minus_di
+
+        dx = 100 * abs(self.plus_di - self.minus_di) / di_sum if di_sum == di_sum and di_sum != 0 else math.nan
+
+        self.value = self._dx.update(dx)
+
+        return self.value
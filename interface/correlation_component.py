@@ -0,0 +1,67 @@
+import tkinter as tk
+
+from interface.styling import *
+
+from correlation import WatchlistCorrelations
+
+
+class Correlations(tk.Frame):
+    # Constructor
+    def __init__(self, correlations: WatchlistCorrelations, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.correlations = correlations
+
+        # Only the most correlated pairs are displayed, so the table has the same size whatever the number of symbols
+        self._rows = 8
+
+        self.body_widgets = dict()
+
+        self._headers = ["pair", "correlation"]
+
+        self._title_var = tk.StringVar()
+        self._title_label = tk.Label(self, textvariable=self._title_var, bg=BG_COLOR, fg=FG_COLOR, font=BOLD_FONT)
+        self._title_label.pack(side=tk.TOP)
+
+        self._table_frame = tk.Frame(self, bg=BG_COLOR)
+        self._table_frame.pack(side=tk.TOP)
+
+        self._col_width = {"pair": 34, "correlation": 12}
+
+        for idx, h in enumerate(self._headers):
+            header = tk.Label(self._table_frame, text=h.capitalize(), bg=BG_COLOR, fg=FG_COLOR, font=GLOBAL_FONT,
+                              width=self._col_width[h])
+            header.grid(row=0, column=idx)
+
+        for h in self._headers:
+            self.body_widgets[h + "_var"] = dict()
+
+            for b_index in range(self._rows):
+                self.body_widgets[h + "_var"][b_index] = tk.StringVar()
+
+                label = tk.Label(self._table_frame, textvariable=self.body_widgets[h + "_var"][b_index], bg=BG_COLOR,
+                                 fg=FG_COLOR_2, font=GLOBAL_FONT, width=self._col_width[h])
+                label.grid(row=b_index + 1, column=self._headers.index(h))
+
+        self.update_pairs()
+
+    # Called by the update_ui() method of the root component
+    def update_pairs(self):
+
+        labels = self.correlations.snapshot[0]
+
+        self._title_var.set(f"Correlations of {len(labels)} symbols ({self.correlations.timeframe} returns, "
+                            f"{self.correlations.window} bars)")
+
+        pairs = self.correlations.top_pairs(self._rows)
+
+        for b_index in range(self._rows):
+            if b_index < len(pairs):
+                label_a, label_b, correlation = pairs[b_index]
+
+                self.body_widgets['pair_var'][b_index].set(f"{label_a[1]} ({label_a[0]}) / {label_b[1]} ({label_b[0]})")
+                self.body_widgets['correlation_var'][b_index].set("{0:.2f}".format(correlation))
+
+            else:
+                self.body_widgets['pair_var'][b_index].set("")
+                self.body_widgets['correlation_var'][b_index].set("")
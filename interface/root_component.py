@@ -2,15 +2,21 @@ import tkinter as tk
 from tkinter.messagebox import askquestion
 import logging
 import json
+import threading
 
 from connectors.binance import BinanceClient
 from connectors.bitmex import BitmexClient
+from correlation import WatchlistCorrelations
+from checkpoint import Checkpoints
+from screener import Screener
 
 from interface.styling import *
 from interface.logging_component import Logging
 from interface.watchlist_component import Watchlist
 from interface.trades_component import TradesWatch
 from interface.strategy_component import StrategyEditor
+from interface.correlation_component import Correlations
+from interface.screener_component import ScreenerFrame
 
 # The same logger object as the one configured in main.py
 logger = logging.getLogger()
@@ -23,6 +29,19 @@ class Root(tk.Tk):
         self.binance = binance
         self.bitmex = bitmex
 
+        # Rolling correlations of the Watchlist symbols, also available to the strategies through their client
+        self.correlations = WatchlistCorrelations()
+        self.binance.correlations = self.correlations
+        self.bitmex.correlations = self.correlations
+
+        # (exchange, symbol) of the Watchlist symbols given to self.correlations
+        self._correlation_symbols = []
+
+        # Candles, indicators and strategies saved regularly, to restart from them
+        self.checkpoints = Checkpoints()
+        self.checkpoints.add_client("Binance", self.binance)
+        self.checkpoints.add_client("Bitmex", self.bitmex)
+
         self.title("Kame Trading Bot")
         self.protocol("WM_DELETE_WINDOW", self._ask_before_close)
 
@@ -52,12 +71,21 @@ class Root(tk.Tk):
         # Space a bit the component with vertical padding
         self.logging_frame.pack(side=tk.TOP, pady=15)
 
+        self._correlations_frame = Correlations(self.correlations, self._left_frame, bg=BG_COLOR)
+        self._correlations_frame.pack(side=tk.TOP, pady=15)
+
         self._strategy_frame = StrategyEditor(self, self.binance, self.bitmex, self._right_frame, bg=BG_COLOR)
         self._strategy_frame.pack(side=tk.TOP, pady=15)
 
         self._trades_frame = TradesWatch(self._right_frame, bg=BG_COLOR)
         self._trades_frame.pack(side=tk.TOP, pady=15)
 
+        # Scans all the contracts of an exchange for the Technical and Breakout conditions
+        screeners = {"Binance": Screener(self.binance, "Binance"), "Bitmex": Screener(self.bitmex, "Bitmex")}
+        self._screener_frame = ScreenerFrame(screeners, self._watchlist_frame.add_symbol, self._right_frame,
+                                             bg=BG_COLOR)
+        self._screener_frame.pack(side=tk.TOP, pady=15)
+
         # Start the infinite interface update loop
         self._update_ui()
 
@@ -67,6 +95,8 @@ class Root(tk.Tk):
         result = askquestion("Confirmation", "Do you want to exit the application?")
 
         if result == "yes":
+            self.checkpoints.save()
+
             # Avoid the infinite reconnect loop in _start_ws()
             self.binance.reconnect = False
             self.bitmex.reconnect = False
@@ -123,6 +153,8 @@ class Root(tk.Tk):
                 logger.error("Error while looping through strategies dictionary: %s", e)
 
         # Watchlist prices
+        watchlist_symbols = []
+
         try:
 
             for key, value in self._watchlist_frame.body_widgets['symbol'].items():
@@ -134,6 +166,8 @@ class Root(tk.Tk):
                     if symbol not in self.binance.contracts:
                         continue
 
+                    watchlist_symbols.append((exchange, symbol))
+
                     if symbol not in self.binance.ws_subscriptions['bookTicker'] and self.binance.ws_connected:
                         self.binance.subscribe_channel([self.binance.contracts[symbol]], "bookTicker")
 
@@ -149,6 +183,8 @@ class Root(tk.Tk):
                     if symbol not in self.bitmex.contracts:
                         continue
 
+                    watchlist_symbols.append((exchange, symbol))
+
                     if symbol not in self.bitmex.prices:
                         continue
 
@@ -168,6 +204,23 @@ class Root(tk.Tk):
 
         except RuntimeError as e:
             logger.error("Error while looping through watchlist dictionary: %s", e)
+            # Incomplete list of symbols, the correlations are updated on the next call
+            watchlist_symbols = self._correlation_symbols
+
+        # Correlations, the historical candles of the new symbols are fetched in a separate thread
+        if watchlist_symbols != self._correlation_symbols:
+            self._correlation_symbols = watchlist_symbols
+
+            symbols = [(exchange, self.binance if exchange == "Binance" else self.bitmex, symbol)
+                       for exchange, symbol in watchlist_symbols]
+            symbols = [(exchange, client, client.contracts[symbol]) for exchange, client, symbol in symbols]
+
+            t = threading.Thread(target=self.correlations.set_symbols, args=(symbols,), daemon=True)
+            t.start()
+
+        self._correlations_frame.update_pairs()
+
+        self._screener_frame.update_results()
 
         self.after(1500, self._update_ui)
 
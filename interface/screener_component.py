@@ -0,0 +1,116 @@
+import tkinter as tk
+import typing
+import threading
+import logging
+
+from interface.styling import *
+from interface.scrollable_frame import ScrollableFrame
+
+from screener import Screener
+
+logger = logging.getLogger()
+
+
+class ScreenerFrame(tk.Frame):
+    # Constructor. add_to_watchlist(symbol, exchange) is called when the button of a match is clicked.
+    def __init__(self, screeners: typing.Dict[str, Screener], add_to_watchlist: typing.Callable[[str, str], None],
+                 *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self._screeners = screeners
+        self._add_to_watchlist = add_to_watchlist
+
+        # Set by the scan thread, displayed by update_results() in the interface thread
+        self._results: typing.Optional[typing.List[typing.Tuple[str, str, str, int]]] = None
+        self._scanning = False
+
+        self._commands_frame = tk.Frame(self, bg=BG_COLOR)
+        self._commands_frame.pack(side=tk.TOP)
+
+        for idx, exchange in enumerate(screeners):
+            button = tk.Button(self._commands_frame, text=f"Scan {exchange}", bg=BG_COLOR_2, fg=FG_COLOR,
+                               font=GLOBAL_FONT, command=lambda e=exchange: self._start_scan(e))
+            button.grid(row=0, column=idx, padx=5)
+
+        self._status_var = tk.StringVar()
+        self._status_label = tk.Label(self._commands_frame, textvariable=self._status_var, bg=BG_COLOR, fg=FG_COLOR,
+                                      font=GLOBAL_FONT, width=30)
+        self._status_label.grid(row=0, column=len(screeners))
+
+        self.body_widgets = dict()
+
+        self._headers = ["symbol", "exchange", "strategy", "side", "watch"]
+        self._col_width = 12
+
+        self._headers_frame = tk.Frame(self, bg=BG_COLOR)
+
+        for idx, h in enumerate(self._headers):
+            header = tk.Label(self._headers_frame, text=h.capitalize() if h != "watch" else "", bg=BG_COLOR,
+                              fg=FG_COLOR, font=GLOBAL_FONT, width=self._col_width)
+            header.grid(row=0, column=idx)
+
+        header = tk.Label(self._headers_frame, text="", bg=BG_COLOR, fg=FG_COLOR, font=GLOBAL_FONT, width=2)
+        header.grid(row=0, column=len(self._headers))
+
+        self._headers_frame.pack(side=tk.TOP, anchor="nw")
+
+        self._body_frame = ScrollableFrame(self, bg=BG_COLOR, height=150)
+        self._body_frame.pack(side=tk.TOP, anchor="nw", fill=tk.X)
+
+        for h in self._headers:
+            self.body_widgets[h] = dict()
+
+    def _start_scan(self, exchange: str):
+
+        if self._scanning:
+            return
+
+        self._scanning = True
+        self._status_var.set(f"Scanning {exchange}...")
+
+        t = threading.Thread(target=self._scan, args=(exchange,), daemon=True)
+        t.start()
+
+    def _scan(self, exchange: str):
+
+        try:
+            matches = self._screeners[exchange].scan()
+        except Exception as e:
+            logger.error("Error while scanning the %s contracts: %s", exchange, e)
+            matches = []
+
+        self._results = [(symbol, exchange, strat_name, side) for symbol, strat_name, side in matches]
+
+        self._scanning = False
+
+    # Called by the update_ui() method of the root component
+    def update_results(self):
+
+        if self._results is None:
+            return
+
+        results = self._results
+        self._results = None
+
+        for h in self._headers:
+            for widget in self.body_widgets[h].values():
+                widget.grid_forget()
+
+            self.body_widgets[h] = dict()
+
+        for b_index, (symbol, exchange, strat_name, side) in enumerate(results):
+            values = {"symbol": symbol, "exchange": exchange, "strategy": strat_name,
+                      "side": "Long" if side == 1 else "Short"}
+
+            for idx, h in enumerate(self._headers[:-1]):
+                self.body_widgets[h][b_index] = tk.Label(self._body_frame.sub_frame, text=values[h], bg=BG_COLOR,
+                                                         fg=FG_COLOR_2, font=GLOBAL_FONT, width=self._col_width)
+                self.body_widgets[h][b_index].grid(row=b_index, column=idx)
+
+            self.body_widgets['watch'][b_index] = tk.Button(self._body_frame.sub_frame, text="Watch", bg=BG_COLOR_2,
+                                                            fg=FG_COLOR, font=GLOBAL_FONT, width=8,
+                                                            command=lambda s=symbol, e=exchange:
+                                                            self._add_to_watchlist(s, e))
+            self.body_widgets['watch'][b_index].grid(row=b_index, column=len(self._headers) - 1)
+
+        self._status_var.set(f"{len(results)} matches")
@@ -9,7 +9,7 @@ from interface.scrollable_frame import ScrollableFrame
 from connectors.binance import BinanceClient
 from connectors.bitmex import BitmexClient
 
-from strategies import TechnicalStrategy, BreakoutStrategy
+from strategies import TechnicalStrategy, BreakoutStrategy, BollingerStrategy, RuleStrategy
 from utils import *
 
 from database import WorkspaceData
@@ -34,7 +34,8 @@ class StrategyEditor(tk.Frame):
         self._exchanges = {"Binance": binance, "Bitmex": bitmex}
 
         self._all_contracts = []
-        self._all_timeframes = ["1m", "5m", "15m", "30m", "1h", "4h"]
+        # Timeframes that aren't provided by the exchanges are built from shorter candles (see BarBuilder)
+        self._all_timeframes = ["1s", "5s", "15s", "1m", "3m", "5m", "15m", "30m", "1h", "2h", "4h", "1d"]
 
         for exchange, client in self._exchanges.items():
             for symbol, contract in client.contracts.items():
@@ -63,11 +64,11 @@ class StrategyEditor(tk.Frame):
         # The width may need to be adjusted depending on your screen size and resolution.
         self._base_params = [
             {"code_name": "strategy_type", "widget": tk.OptionMenu, "data_type": str,
-             "values": ["Technical", "Breakout"], "width": 10, "header": "Strategy"},
+             "values": ["Technical", "Breakout", "Bollinger", "Rules"], "width": 10, "header": "Strategy"},
             {"code_name": "contract", "widget": tk.OptionMenu, "data_type": str,
              "values": self._all_contracts, "width": 15, "header": "Contract"},
             {"code_name": "timeframe", "widget": tk.OptionMenu, "data_type": str,
-             "values": self._all_timeframes, "width": 10, "header": "Timeframe"},
+             "values": self._all_timeframes, "default": "1m", "width": 10, "header": "Timeframe"},
             {"code_name": "balance_pct", "widget": tk.Entry, "data_type": float, "width": 10, "header": "Balance %"},
             {"code_name": "take_profit", "widget": tk.Entry, "data_type": float, "width": 7, "header": "TP %"},
             {"code_name": "stop_loss", "widget": tk.Entry, "data_type": float, "width": 7, "header": "SL %"},
@@ -87,7 +88,21 @@ class StrategyEditor(tk.Frame):
                 {"code_name": "ema_signal", "name": "MACD Signal Length", "widget": tk.Entry, "data_type": int}
             ],
             "Breakout": [
-                {"code_name": "min_volume", "name": "Minimum Volume", "widget": tk.Entry, "data_type": float}
+                {"code_name": "min_volume", "name": "Minimum Volume", "widget": tk.Entry, "data_type": float},
+                {"code_name": "lookback", "name": "Lookback Candles", "widget": tk.Entry, "data_type": int,
+                 "optional": True, "min": 1}
+            ],
+            "Bollinger": [
+                {"code_name": "bb_length", "name": "Bollinger Periods", "widget": tk.Entry, "data_type": int,
+                 "min": 2},
+                {"code_name": "bb_std", "name": "Standard Deviations", "widget": tk.Entry, "data_type": float}
+            ],
+            # Rules written with the rules language, e.g. "rsi(14) < 30 and macd_line > macd_signal" (see rules.py)
+            "Rules": [
+                {"code_name": "long_rule", "name": "Long Rule", "widget": tk.Entry, "data_type": str, "width": 50,
+                 "optional": True},
+                {"code_name": "short_rule", "name": "Short Rule", "widget": tk.Entry, "data_type": str, "width": 50,
+                 "optional": True}
             ]
         }
 
@@ -126,7 +141,7 @@ class StrategyEditor(tk.Frame):
 
             if base_param['widget'] == tk.OptionMenu:
                 self.body_widgets[code_name + "_var"][b_index] = tk.StringVar()
-                self.body_widgets[code_name + "_var"][b_index].set(base_param['values'][0])
+                self.body_widgets[code_name + "_var"][b_index].set(base_param.get('default', base_param['values'][0]))
                 self.body_widgets[code_name][b_index] = tk.OptionMenu(self._body_frame.sub_frame,
                                                                       self.body_widgets[code_name + "_var"][b_index],
                                                                       *base_param['values'])
@@ -210,6 +225,9 @@ class StrategyEditor(tk.Frame):
                 elif param['data_type'] == float:
                     self._extra_input[code_name].config(validate='key', validatecommand=(self._valid_float, "%P"))
 
+                if 'width' in param:
+                    self._extra_input[code_name].config(width=param['width'])
+
                 if self.additional_parameters[b_index][code_name] is not None:
                     self._extra_input[code_name].insert(tk.END, str(self.additional_parameters[b_index][code_name]))
             else:
@@ -252,11 +270,18 @@ class StrategyEditor(tk.Frame):
         strat_selected = self.body_widgets['strategy_type_var'][b_index].get()
 
         for param in self.extra_params[strat_selected]:
-            if self.additional_parameters[b_index][param['code_name']] is None:
+            value = self.additional_parameters[b_index][param['code_name']]
+
+            if value is None and not param.get('optional', False):
                 self.root.logging_frame.add_log(f"Missing {param['code_name']} parameter")
 
                 return
 
+            if value is not None and 'min' in param and value < param['min']:
+                self.root.logging_frame.add_log(f"The {param['code_name']} parameter must be at least {param['min']}")
+
+                return
+
         symbol = self.body_widgets['contract_var'][b_index].get().split("_")[0]
         timeframe = self.body_widgets['timeframe_var'][b_index].get()
         exchange = self.body_widgets['contract_var'][b_index].get().split("_")[1]
@@ -277,24 +302,58 @@ class StrategyEditor(tk.Frame):
                 new_strategy = BreakoutStrategy(self._exchanges[exchange], contract, exchange, timeframe, balance_pct,
                                                 take_profit, stop_loss, self.additional_parameters[b_index])
 
+            elif strat_selected == "Bollinger":
+                new_strategy = BollingerStrategy(self._exchanges[exchange], contract, exchange, timeframe, balance_pct,
+                                                 take_profit, stop_loss, self.additional_parameters[b_index])
+
+            elif strat_selected == "Rules":
+                try:
+                    new_strategy = RuleStrategy(self._exchanges[exchange], contract, exchange, timeframe, balance_pct,
+                                                take_profit, stop_loss, self.additional_parameters[b_index])
+                except ValueError as e:
+                    self.root.logging_frame.add_log(str(e))
+
+                    return
+
             else:
                 return
 
-            # Collect historical data. It is just one API call so that's ok, but notice not to call methods that would
-            # lock the UI for too long.
-            new_strategy.candles = self._exchanges[exchange].get_historical_candles(contract, timeframe)
+            # Collect historical data, unless another strategy already runs on the same contract and timeframe, or start
+            # from the last checkpoint and the candles missed since.
+            # It is just one API call so that's ok, but notice not to call methods that would lock the UI for too long.
+            aggregator = self._exchanges[exchange].get_aggregator(contract, timeframe)
 
-            if len(new_strategy.candles) == 0:
+            if aggregator is None:
                 self.root.logging_frame.add_log(f"No historical data retrieved for {contract.symbol}")
 
                 return
 
+            new_strategy.subscribe(aggregator)
+
+            # Registered before its trades are restored, as they can be filled or closed during the restore
+            self._exchanges[exchange].strategies[b_index] = new_strategy
+
+            # Open trades and pending orders of the same strategy before the last restart. The checkpoint id is only
+            # set once they are restored, so that the saves in the meantime don't replace them with an empty state.
+            checkpoint_id = f"{strat_selected}_{symbol}_{timeframe}_" \
+                            f"{json.dumps(self.additional_parameters[b_index], sort_keys=True)}"
+            checkpoints = self._exchanges[exchange].checkpoints
+
+            if checkpoints is not None:
+                state = checkpoints.load_strategy(exchange, checkpoint_id)
+
+                if state is not None:
+                    new_strategy.restore_state(state)
+
+            new_strategy.checkpoint_id = checkpoint_id
+
+            if checkpoints is not None:
+                checkpoints.save_strategies(self._exchanges[exchange])
+
             if exchange == "Binance":
                 self._exchanges[exchange].subscribe_channel([contract], "aggTrade")
                 self._exchanges[exchange].subscribe_channel([contract], "bookTicker")
 
-            self._exchanges[exchange].strategies[b_index] = new_strategy
-
             for param in self._base_params:
                 code_name = param['code_name']
 
@@ -306,7 +365,15 @@ class StrategyEditor(tk.Frame):
                 self.root.logging_frame.add_log(f"{strat_selected} strategy on {symbol} / {timeframe} started")
 
         else:
-            del self._exchanges[exchange].strategies[b_index]
+            strategy = self._exchanges[exchange].strategies.pop(b_index)
+
+            strategy.unsubscribe()
+            self._exchanges[exchange].release_aggregator(strategy.aggregator)
+
+            # Its trades are not managed anymore, they must not be restored if the strategy is started again
+            if self._exchanges[exchange].checkpoints is not None:
+                self._exchanges[exchange].checkpoints.save_strategies(self._exchanges[exchange],
+                                                                      removed=strategy.checkpoint_id)
 
             for param in self._base_params:
                 code_name = param['code_name']
@@ -78,7 +78,7 @@ class Watchlist(tk.Frame):
         saved_symbols = self.db.get("watchlist")
 
         for s in saved_symbols:
-            self._add_symbol(s['symbol'], s['exchange'])
+            self.add_symbol(s['symbol'], s['exchange'])
 
     def _remove_symbol(self, b_index: int):
 
@@ -91,7 +91,7 @@ class Watchlist(tk.Frame):
         symbol = event.widget.get()
 
         if symbol in self.binance_symbols:
-            self._add_symbol(symbol, "Binance")
+            self.add_symbol(symbol, "Binance")
             event.widget.delete(0, tk.END)
 
     def _add_bitmex_symbol(self, event):
@@ -99,10 +99,10 @@ class Watchlist(tk.Frame):
         symbol = event.widget.get()
 
         if symbol in self.bitmex_symbols:
-            self._add_symbol(symbol, "Bitmex")
+            self.add_symbol(symbol, "Bitmex")
             event.widget.delete(0, tk.END)
 
-    def _add_symbol(self, symbol: str, exchange: str):
+    def add_symbol(self, symbol: str, exchange: str):
 
         b_index = self._body_index
 
@@ -34,12 +34,18 @@ with open("keys.json") as f:
 binance_keys = keys["binance"]
 bitmex_keys = keys["bitmex"]
 
+# The trades received in bursts are merged over at most this many milliseconds before updating the candles and
+# checking the strategies (see TradeConflator), None to process every trade on the websocket thread
+TRADE_CONFLATION_MS = 50
+
 # Execute the following code only when executing main.py (not when importing it)
 if __name__ == "__main__":
 
-    binance = BinanceClient(binance_keys['api_key'], binance_keys['secret_key'], True, True)
+    binance = BinanceClient(binance_keys['api_key'], binance_keys['secret_key'], True, True,
+                            trade_conflation_ms=TRADE_CONFLATION_MS)
 
-    bitmex = BitmexClient(bitmex_keys['api_key'], bitmex_keys['secret_key'], True)
+    bitmex = BitmexClient(bitmex_keys['api_key'], bitmex_keys['secret_key'], True,
+                          trade_conflation_ms=TRADE_CONFLATION_MS)
 
     root = Root(binance, bitmex)
     root.mainloop()
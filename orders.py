@@ -0,0 +1,167 @@
+import collections
+import logging
+import math
+import threading
+import time
+from typing import *
+
+from models import Contract, OrderStatus
+
+# Import the connector class names only for typing purpose
+if TYPE_CHECKING:
+    from connectors.binance import BinanceClient
+    from connectors.bitmex import BitmexClient
+
+logger = logging.getLogger()
+
+# Seconds between two status requests: the shortest right after an order has been placed (market orders are usually
+# filled within this delay), doubled every time nothing changes, up to the longest
+MIN_POLL_INTERVAL = 0.5
+MAX_POLL_INTERVAL = 8.0
+
+# The order won't change anymore (Binance: canceled / expired / rejected, Bitmex: canceled / rejected)
+FINAL_STATUSES = {"filled", "canceled", "expired", "expired_in_match", "rejected"}
+
+# Final statuses kept for the orders not tracked yet, the oldest are dropped (e.g. orders placed by hand)
+MAX_EARLY_UPDATES = 100
+
+
+# Follows the unfilled orders of all the strategies of one client with a single thread: the pending orders are kept in
+# one table and their statuses are requested together (see get_orders_status() of the connectors), instead of one
+# thread and one request per order every 2 seconds. The polling interval backs off while the orders don't change.
+# When the client receives the order updates from a private websocket stream (see on_order_update()), the orders are
+# only requested once after each (re)connection, to catch the updates missed while the stream was down.
+# The callback given with an order is called once with its final status.
+class OrderTracker:
+    def __init__(self, exchange: str, client: Union["BinanceClient", "BitmexClient"]):
+
+        self.exchange = exchange
+        self.client = client
+
+        # order_id -> (contract, callback)
+        self._orders: Dict[Any, Tuple[Contract, Callable[[OrderStatus], None]]] = dict()
+        self._interval = MIN_POLL_INTERVAL
+        self._next_poll = time.monotonic()
+
+        # Set by the client while its private stream is connected
+        self.streaming = False
+        self._resync = False
+        # Incremented by every (re)connection of the stream, to know if one happened during a request
+        self._connections = 0
+
+        # Final statuses received from the stream before the order is tracked (the update can arrive before the
+        # response of the request placing the order)
+        self._early_updates: collections.OrderedDict = collections.OrderedDict()
+
+        self._condition = threading.Condition()
+
+        t = threading.Thread(target=self._run, daemon=True)
+        t.start()
+
+    def track(self, contract: Contract, order_id, callback: Callable[[OrderStatus], None]):
+
+        with self._condition:
+            order_status = self._early_updates.pop(order_id, None)
+
+            if order_status is None:
+                self._orders[order_id] = (contract, callback)
+                self._interval = MIN_POLL_INTERVAL
+                self._next_poll = min(self._next_poll, time.monotonic() + MIN_POLL_INTERVAL)
+                self._condition.notify()
+
+        if order_status is not None:
+            self._notify([(order_status, callback)])
+
+    def set_streaming(self, streaming: bool):
+
+        with self._condition:
+            self.streaming = streaming
+            self._resync = streaming
+            self._connections += 1
+            self._interval = MIN_POLL_INTERVAL
+            self._next_poll = time.monotonic()
+            self._condition.notify()
+
+    # Called by the client for every order update received from its private stream
+    def on_order_update(self, order_status: OrderStatus):
+
+        if order_status.status not in FINAL_STATUSES:
+            return
+
+        with self._condition:
+            order = self._orders.pop(order_status.order_id, None)
+
+            if order is None:
+                self._early_updates[order_status.order_id] = order_status
+
+                if len(self._early_updates) > MAX_EARLY_UPDATES:
+                    self._early_updates.popitem(last=False)
+
+                return
+
+        self._notify([(order_status, order[1])])
+
+    def _run(self):
+
+        while True:
+            with self._condition:
+                if len(self._orders) == 0 or (self.streaming and not self._resync):
+                    self._next_poll = math.inf
+                    self._condition.wait()
+                    continue
+
+                delay = self._next_poll - time.monotonic()
+
+                # Woken up by a new order, which may have to be requested sooner
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+
+                connections = self._connections
+
+                orders = [(contract, order_id) for order_id, (contract, _) in self._orders.items()]
+
+            try:
+                statuses = self.client.get_orders_status(orders)
+            except Exception as e:
+                logger.error("%s error while requesting the status of %s orders: %s", self.exchange, len(orders), e)
+                statuses = None
+
+            finished = []
+
+            with self._condition:
+                if statuses is not None:
+                    # The updates missed while the stream was down are known, unless it reconnected in the meantime.
+                    # After a failed request, the orders are requested again until one succeeds.
+                    if self._connections == connections:
+                        self._resync = False
+
+                    for order_id, order_status in statuses.items():
+                        if order_status.status in FINAL_STATUSES and order_id in self._orders:
+                            finished.append((order_status, self._orders.pop(order_id)[1]))
+
+                # Back off while nothing changes (or the requests fail), poll faster again once an order is done
+                if len(finished) > 0:
+                    self._interval = MIN_POLL_INTERVAL
+                else:
+                    self._interval = min(self._interval * 2, MAX_POLL_INTERVAL)
+
+                self._next_poll = time.monotonic() + self._interval
+
+            self._notify(finished)
+
+    # Outside of the lock, the callbacks may place new orders
+    def _notify(self, finished: List[Tuple[OrderStatus, Callable[[OrderStatus], None]]]):
+
+        for order_status, callback in finished:
+            logger.info("%s order %s status: %s", self.exchange, order_status.order_id, order_status.status)
+
+            # Our own fill, the balances have changed
+            if order_status.executed_qty:
+                self.client.balance_cache.invalidate()
+
+            try:
+                callback(order_status)
+            except Exception as e:
+                logger.error("%s error while processing the status of the order %s: %s", self.exchange,
+                             order_status.order_id, e)
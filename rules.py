@@ -0,0 +1,216 @@
+import ast
+import operator
+from typing import *
+
+import numpy as np
+
+from indicator_registry import CLOSE, HIGH, LOW, ema_key, sma_key, rsi_key, atr_key, highest_key, lowest_key, \
+    macd_line_key, macd_signal_key, bollinger_key, compute_series
+
+# Trading rules written as Python expressions, e.g. "rsi(14) < 30 and macd_line > macd_signal", compiled into a graph
+# of NumPy operations on indicator series. The same graph is evaluated:
+#   - live, with the values of the shared indicator nodes (see IndicatorRegistry) after each closed candle
+#   - over a whole history at once, with the batch series of the same indicators (see compute_series())
+# so a rule gives the same signals in research as in live trading.
+#
+# Syntax: comparisons (<, <=, >, >=, ==, !=) combined with and / or / not, the + - * / operators, numbers and the series
+# below. The indicators with default parameters can be written without parentheses, e.g. macd_line.
+
+# Series name: (function building the indicator key from the parameters, index in the value of a node with several
+# values such as the Bollinger Bands)
+SERIES = {
+    "close": (lambda: CLOSE, None),
+    "high": (lambda: HIGH, None),
+    "low": (lambda: LOW, None),
+    "rsi": (lambda length=14: rsi_key(length), None),
+    "ema": (lambda span: ema_key(span), None),
+    "sma": (lambda length: sma_key(length), None),
+    "atr": (lambda length=14: atr_key(length), None),
+    "highest": (lambda length: highest_key(length), None),
+    "lowest": (lambda length: lowest_key(length), None),
+    "macd_line": (lambda fast=12, slow=26: macd_line_key(fast, slow), None),
+    "macd_signal": (lambda fast=12, slow=26, signal=9: macd_signal_key(fast, slow, signal), None),
+    "bb_middle": (lambda length=20, num_std=2.0: bollinger_key(length, num_std), 0),
+    "bb_upper": (lambda length=20, num_std=2.0: bollinger_key(length, num_std), 1),
+    "bb_lower": (lambda length=20, num_std=2.0: bollinger_key(length, num_std), 2),
+}
+
+_COMPARISONS = {ast.Lt: operator.lt, ast.LtE: operator.le, ast.Gt: operator.gt, ast.GtE: operator.ge,
+                ast.Eq: operator.eq, ast.NotEq: operator.ne}
+_ARITHMETIC = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: np.true_divide}
+
+
+# Nodes of the expression graph. The values are floats (live) or arrays (history): the operator functions and the
+# NumPy logical functions work on both. A NaN indicator value (not enough candles yet) makes any comparison False.
+class _Series:
+    def __init__(self, key: Tuple, component: Optional[int]):
+        self.key = key
+        self.component = component
+
+    def evaluate(self, values: Dict[Tuple, Any]):
+
+        value = values[self.key]
+
+        return value if self.component is None else value[self.component]
+
+
+class _Constant:
+    def __init__(self, value: float):
+        self.value = value
+
+    def evaluate(self, values: Dict[Tuple, Any]):
+        return self.value
+
+
+class _Operation:
+    def __init__(self, func: Callable, operands: List):
+        self.func = func
+        self.operands = operands
+
+    def evaluate(self, values: Dict[Tuple, Any]):
+        return self.func(*[operand.evaluate(values) for operand in self.operands])
+
+
+class Rule:
+    def __init__(self, text: str):
+
+        self.text = text
+        # Indicator keys used by the rule
+        self.keys: List[Tuple] = []
+
+        try:
+            tree = ast.parse(text.strip(), mode="eval")
+        except SyntaxError as e:
+            raise ValueError(f"Invalid rule {text!r}: {e.msg}")
+
+        self._graph = self._compile(tree.body)
+
+    def _compile(self, node: ast.AST):
+
+        if isinstance(node, ast.BoolOp):
+            func = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+            graph = self._compile(node.values[0])
+
+            for value in node.values[1:]:
+                graph = _Operation(func, [graph, self._compile(value)])
+
+            return graph
+
+        elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            return _Operation(np.logical_not, [self._compile(node.operand)])
+
+        elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            return _Operation(operator.neg, [self._compile(node.operand)])
+
+        elif isinstance(node, ast.BinOp) and type(node.op) in _ARITHMETIC:
+            return _Operation(_ARITHMETIC[type(node.op)], [self._compile(node.left), self._compile(node.right)])
+
+        elif isinstance(node, ast.Compare):
+            # a < b < c is a < b and b < c
+            operands = [self._compile(node.left)] + [self._compile(c) for c in node.comparators]
+            graph = None
+
+            for i, op in enumerate(node.ops):
+                if type(op) not in _COMPARISONS:
+                    raise ValueError(f"Invalid rule {self.text!r}: unsupported comparison")
+
+                comparison = _Operation(_COMPARISONS[type(op)], [operands[i], operands[i + 1]])
+                graph = comparison if graph is None else _Operation(np.logical_and, [graph, comparison])
+
+            return graph
+
+        elif isinstance(node, ast.Constant) and type(node.value) in [int, float]:
+            return _Constant(float(node.value))
+
+        elif isinstance(node, ast.Name):
+            return self._series(node.id, [])
+
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and len(node.keywords) == 0:
+            params = []
+
+            for arg in node.args:
+                if not (isinstance(arg, ast.Constant) and type(arg.value) in [int, float]):
+                    raise ValueError(f"Invalid rule {self.text!r}: the parameters of {node.func.id}() must be numbers")
+
+                params.append(arg.value)
+
+            return self._series(node.func.id, params)
+
+        raise ValueError(f"Invalid rule {self.text!r}: unsupported expression "
+                         f"{ast.get_source_segment(self.text.strip(), node)}")
+
+    def _series(self, name: str, params: List[float]) -> _Series:
+
+        if name not in SERIES:
+            raise ValueError(f"Invalid rule {self.text!r}: unknown series {name}")
+
+        make_key, component = SERIES[name]
+
+        # All the parameters are lengths, except the standard deviations multiplier of the Bollinger Bands
+        for i, param in enumerate(params):
+            if name.startswith("bb_") and i == 1:
+                if param <= 0:
+                    raise ValueError(f"Invalid rule {self.text!r}: the multiplier of {name}() must be positive")
+
+            elif type(param) != int or param < 1:
+                raise ValueError(f"Invalid rule {self.text!r}: the lengths of {name}() must be integers of at least 1")
+
+        try:
+            key = make_key(*params)
+        except TypeError:
+            raise ValueError(f"Invalid rule {self.text!r}: wrong number of parameters for {name}")
+
+        if key not in self.keys:
+            self.keys.append(key)
+
+        return _Series(key, component)
+
+    # Live evaluation, with the value of each indicator key after the last closed candle
+    def evaluate(self, values: Dict[Tuple, Any]) -> bool:
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return bool(self._graph.evaluate(values))
+
+    # Vectorized evaluation over a history of candles ("high", "low" and "close" arrays)
+    # :return: A boolean array, True for the candles after which the rule is met
+    def evaluate_history(self, candles: Dict[str, np.ndarray], cache: Optional[Dict[Tuple, Any]] = None) -> np.ndarray:
+
+        if cache is None:
+            cache = dict()
+
+        values = {key: compute_series(key, candles, cache) for key in self.keys}
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            result = self._graph.evaluate(values)
+
+        return np.broadcast_to(np.asarray(result, dtype=bool), (len(candles['close']),))
+
+
+# Signal of a long rule and a short rule (module level so that it can be evaluated in another process)
+# :return: 1 for a Long signal, -1 for a Short signal, 0 for no signal
+def rule_signal(long_rule: Optional[Rule], short_rule: Optional[Rule], values: Dict[Tuple, Any]) -> int:
+
+    if long_rule is not None and long_rule.evaluate(values):
+        return 1
+
+    elif short_rule is not None and short_rule.evaluate(values):
+        return -1
+
+    else:
+        return 0
+
+
+# Same as rule_signal() for every candle of a history at once, e.g. for a backtest
+# :return: An array of 1 (Long signal), -1 (Short signal) and 0 (no signal)
+def rule_signals(long_rule: Optional[Rule], short_rule: Optional[Rule], candles: Dict[str, np.ndarray]) -> np.ndarray:
+
+    cache = dict()
+    signals = np.zeros(len(candles['close']), dtype=np.int8)
+
+    if short_rule is not None:
+        signals[short_rule.evaluate_history(candles, cache)] = -1
+
+    if long_rule is not None:
+        signals[long_rule.evaluate_history(candles, cache)] = 1
+
+    return signals
@@ -0,0 +1,111 @@
+import logging
+import threading
+import time
+from typing import *
+
+# Import the BarBuilder class name only for typing purpose
+if TYPE_CHECKING:
+    from candles import BarBuilder
+
+logger = logging.getLogger()
+
+# All the timeframes are multiples of one second, so are the candle boundaries
+TICK_MS = 1000
+WHEEL_SIZE = 60
+
+
+# Closes the candles of the BarBuilders of one exchange at the timeframe boundaries, instead of waiting for the first
+# trade of the next candle, so that the strategies get the new candle right away even on quiet markets.
+# Hashed timing wheel: one slot per second of exchange time, each BarBuilder is in the slot of its next boundary. The
+# thread wakes up on every exchange second and only looks at the BarBuilders of the current slot, whatever the number of
+# symbols. Boundaries more than WHEEL_SIZE seconds away just stay in their slot for more turns of the wheel.
+class CandleScheduler:
+    def __init__(self, exchange: str):
+
+        self.exchange = exchange
+
+        # Exchange time - local time, in milliseconds
+        self.clock_offset = 0
+
+        self._wheel: List[List[Tuple[int, "BarBuilder"]]] = [[] for _ in range(WHEEL_SIZE)]
+        # Next boundary of every BarBuilder, the wheel entries with another boundary are outdated
+        self._next_boundaries: Dict["BarBuilder", int] = dict()
+        self._lock = threading.Lock()
+
+        t = threading.Thread(target=self._run, daemon=True)
+        t.start()
+
+    def exchange_time(self) -> int:
+        return int(time.time() * 1000) + self.clock_offset
+
+    # Also called when an aggregator is added to the builder, as its base timeframe may now be shorter
+    def add_builder(self, builder: "BarBuilder"):
+
+        next_boundary = builder.next_boundary(self.exchange_time())
+
+        if next_boundary is None:
+            return
+
+        with self._lock:
+            current_boundary = self._next_boundaries.get(builder)
+
+            if current_boundary is None or next_boundary < current_boundary:
+                self._schedule(next_boundary, builder)
+
+    # The entries of the builder still in the wheel are dropped when their slot comes
+    def remove_builder(self, builder: "BarBuilder"):
+
+        with self._lock:
+            self._next_boundaries.pop(builder, None)
+
+    # Must be called with the lock acquired
+    def _schedule(self, boundary: int, builder: "BarBuilder"):
+
+        self._next_boundaries[builder] = boundary
+        self._wheel[(boundary // TICK_MS) % WHEEL_SIZE].append((boundary, builder))
+
+    def _run(self):
+
+        tick = self.exchange_time() // TICK_MS * TICK_MS
+
+        while True:
+            tick += TICK_MS
+
+            # Negative if the thread is late, the missed ticks are then processed one after the other without waiting
+            delay = (tick - self.exchange_time()) / 1000
+
+            if delay > 0:
+                time.sleep(delay)
+
+            with self._lock:
+                slot = self._wheel[(tick // TICK_MS) % WHEEL_SIZE]
+                due = [entry for entry in slot if entry[0] <= tick]
+                slot[:] = [entry for entry in slot if entry[0] > tick]
+
+            # The signals of all the candles closed at this boundary are evaluated together, see CandleCloseExecutor
+            executors = []
+
+            for boundary, builder in due:
+
+                if self._next_boundaries.get(builder) != boundary:
+                    continue
+
+                try:
+                    next_boundary = builder.close_on_time(boundary)
+                except Exception as e:
+                    logger.error("%s error while closing the %s candles: %s", self.exchange,
+                                 builder.contract.symbol, e)
+                    next_boundary = builder.next_boundary(boundary)
+
+                with self._lock:
+                    if next_boundary is not None and self._next_boundaries.get(builder) == boundary:
+                        self._schedule(next_boundary, builder)
+
+                if builder.executor is not None and builder.executor not in executors:
+                    executors.append(builder.executor)
+
+            for executor in executors:
+                try:
+                    executor.flush()
+                except Exception as e:
+                    logger.error("%s error while evaluating the signals: %s", self.exchange, e)
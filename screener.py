@@ -0,0 +1,213 @@
+import concurrent.futures
+import logging
+import math
+import threading
+import time
+from typing import *
+
+import numpy as np
+import pandas as pd
+
+from models import Candle, Contract
+
+# Import the connector class names only for typing purpose
+if TYPE_CHECKING:
+    from connectors.binance import BinanceClient
+    from connectors.bitmex import BitmexClient
+
+logger = logging.getLogger()
+
+# Share of the exchange request limits used by the screener, the rest is left to the trading: Binance counts a weight
+# per request (2400 per minute on Futures, 6000 on Spot), Bitmex a number of requests (120 per minute)
+BINANCE_WEIGHT_PER_MINUTE = 1200
+BITMEX_REQUESTS_PER_MINUTE = 60
+
+
+# Token bucket shared by the threads fetching the candles: up to `capacity` requests weight at once, refilled at
+# `per_minute` weight per minute
+class RateLimiter:
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+
+        self.rate = per_minute / 60
+        self.capacity = capacity if capacity is not None else per_minute / 10
+
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    # Wait until a request of this weight can be sent
+    def acquire(self, weight: float = 1):
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+                self._last_refill = now
+
+                if self._tokens >= weight:
+                    self._tokens -= weight
+                    return
+
+                wait = (weight - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+
+# Weight of a Binance klines request
+def _binance_klines_weight(futures: bool, limit: int) -> int:
+
+    if not futures:
+        return 2
+
+    if limit < 100:
+        return 1
+    elif limit < 500:
+        return 2
+    elif limit <= 1000:
+        return 5
+    else:
+        return 10
+
+
+# Candles of several symbols as 2D (symbols, bars) arrays of each field, aligned on their last candle. The symbols with
+# less than `bars` candles are padded with NaN at the start.
+def stack_candles(candles: List[List[Candle]], bars: int) -> Dict[str, np.ndarray]:
+
+    fields = {field: np.full((len(candles), bars), math.nan) for field in ["high", "low", "close", "volume"]}
+
+    for row, symbol_candles in enumerate(candles):
+        symbol_candles = symbol_candles[-bars:]
+        start = bars - len(symbol_candles)
+
+        if len(symbol_candles) == 0:
+            continue
+
+        values = np.array([(c.high, c.low, c.close, c.volume) for c in symbol_candles], dtype=np.float64)
+
+        fields["high"][row, start:] = values[:, 0]
+        fields["low"][row, start:] = values[:, 1]
+        fields["close"][row, start:] = values[:, 2]
+        fields["volume"][row, start:] = values[:, 3]
+
+    return fields
+
+
+# Exponentially weighted mean of every row at once, same values as indicators.ema() on each row (pandas computes all
+# the columns of a DataFrame in one pass)
+def _ewm_mean_rows(values: np.ndarray, com: float, min_periods: int) -> np.ndarray:
+    return pd.DataFrame(values.T, copy=False).ewm(com=com, min_periods=min_periods).mean().to_numpy().T
+
+
+def _rsi_rows(closes: np.ndarray, rsi_length: int) -> np.ndarray:
+
+    delta = np.diff(closes, axis=1)
+
+    avg_gain = _ewm_mean_rows(np.maximum(delta, 0.0), rsi_length - 1, rsi_length)
+    avg_loss = _ewm_mean_rows(np.maximum(-delta, 0.0), rsi_length - 1, rsi_length)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return 100 - 100 / (1 + avg_gain / avg_loss)
+
+
+# Conditions of TechnicalStrategy on the last candle of every row of closed candles (see technical_signal())
+# :return: 1 for a Long signal, -1 for a Short signal, 0 for no signal, for every symbol
+def technical_signals(closes: np.ndarray, ema_fast: int = 12, ema_slow: int = 26, ema_signal: int = 9,
+                      rsi_length: int = 14) -> np.ndarray:
+
+    # Leading NaN (padding) are ignored by ewm(), the EMAs start with the first candle of each symbol
+    macd_line = _ewm_mean_rows(closes, (ema_fast - 1) / 2, 0) - _ewm_mean_rows(closes, (ema_slow - 1) / 2, 0)
+    macd_signal = _ewm_mean_rows(macd_line, (ema_signal - 1) / 2, 0)
+
+    rsi = np.round(_rsi_rows(closes, rsi_length)[:, -1], 2)
+    macd_line = macd_line[:, -1]
+    macd_signal = macd_signal[:, -1]
+
+    signals = np.zeros(len(closes), dtype=np.int8)
+    signals[(rsi < 30) & (macd_line > macd_signal)] = 1
+    signals[(rsi > 70) & (macd_line < macd_signal)] = -1
+
+    return signals
+
+
+# Conditions of BreakoutStrategy on the last candle (in progress) of every row: its close above the highest high or
+# below the lowest low of the `lookback` previous candles, with a volume above min_volume
+# :return: 1 for a Long signal, -1 for a Short signal, 0 for no signal, for every symbol
+def breakout_signals(high: np.ndarray, low: np.ndarray, close: np.ndarray, volume: np.ndarray, lookback: int = 1,
+                     min_volume: float = 0) -> np.ndarray:
+
+    highest = np.max(high[:, -lookback - 1:-1], axis=1)
+    lowest = np.min(low[:, -lookback - 1:-1], axis=1)
+
+    price = close[:, -1]
+    volume_reached = volume[:, -1] >= min_volume
+
+    signals = np.zeros(len(close), dtype=np.int8)
+    signals[(price > highest) & volume_reached] = 1
+    signals[(price < lowest) & volume_reached] = -1
+
+    return signals
+
+
+# Scans all the contracts of a client: the recent candles of every contract are fetched concurrently within the rate
+# limits of the exchange, stacked into (symbols, bars) arrays, and the conditions of the strategies are evaluated for
+# all the symbols at once.
+class Screener:
+    def __init__(self, client: Union["BinanceClient", "BitmexClient"], exchange: str, timeframe: str = "1h",
+                 bars: int = 99, max_workers: int = 10):
+
+        self.client = client
+        self.exchange = exchange
+        self.timeframe = timeframe
+        self.bars = bars
+        self.max_workers = max_workers
+
+        if exchange == "Binance":
+            self._limiter = RateLimiter(BINANCE_WEIGHT_PER_MINUTE)
+            self._weight = _binance_klines_weight(client.futures, bars)
+        else:
+            self._limiter = RateLimiter(BITMEX_REQUESTS_PER_MINUTE)
+            self._weight = 1
+
+    def _fetch_one(self, contract: Contract) -> List[Candle]:
+
+        self._limiter.acquire(self._weight)
+
+        return self.client.get_historical_candles(contract, self.timeframe, limit=self.bars)
+
+    # :return: The symbols which have candles, and their candles as (symbols, bars) arrays
+    def fetch(self, contracts: List[Contract]) -> Tuple[List[str], Dict[str, np.ndarray]]:
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            results = list(pool.map(self._fetch_one, contracts))
+
+        symbols = [contract.symbol for contract, candles in zip(contracts, results) if len(candles) > 0]
+        candles = [candles for candles in results if len(candles) > 0]
+
+        return symbols, stack_candles(candles, self.bars)
+
+    # :return: A list of (symbol, strategy name, 1 for Long / -1 for Short)
+    def scan(self, contracts: Optional[List[Contract]] = None) -> List[Tuple[str, str, int]]:
+
+        if contracts is None:
+            contracts = list(self.client.contracts.values())
+
+        start = time.perf_counter()
+
+        symbols, fields = self.fetch(contracts)
+
+        signals = {
+            # The last candle is still in progress
+            "Technical": technical_signals(fields["close"][:, :-1]),
+            "Breakout": breakout_signals(fields["high"], fields["low"], fields["close"], fields["volume"], lookback=20),
+        }
+
+        matches = []
+
+        for strat_name, strat_signals in signals.items():
+            for row in np.flatnonzero(strat_signals):
+                matches.append((symbols[row], strat_name, int(strat_signals[row])))
+
+        logger.info("%s screener: %s symbols scanned in %.1f seconds, %s matches", self.exchange, len(symbols),
+                    time.perf_counter() - start, len(matches))
+
+        return matches
@@ -1,12 +1,14 @@
 import logging
+import math
 import time
 from typing import *
 
-from threading import Timer
-
-import pandas as pd
-
 from models import *
+from candles import CandleBuffer, CandleAggregator
+from indicator_registry import IndicatorNode, macd_line_key, macd_signal_key, rsi_key, highest_key, lowest_key, \
+    bollinger_key
+from rules import Rule, rule_signal
+from barrier import AlignedBars, BarBarrier
 
 # Import the connector class names only for typing purpose
 if TYPE_CHECKING:
@@ -15,9 +17,6 @@ if TYPE_CHECKING:
 
 logger = logging.getLogger()
 
-# TF_EQUIV is used in parse_trades() to compare the last candle timestamp to the new trade timestamp
-TF_EQUIV = {"1m": 60, "5m": 300, "15m": 900, "30m": 1800, "1h": 3600, "4h": 14400}
-
 
 class Strategy:
     # Constructor
@@ -29,7 +28,6 @@ class Strategy:
         self.contract = contract
         self.exchange = exchange
         self.tf = timeframe
-        self.tf_equiv = TF_EQUIV[timeframe] * 1000
         self.balance_pct = balance_pct
         self.take_profit = take_profit
         self.stop_loss = stop_loss
@@ -38,102 +36,165 @@ class Strategy:
 
         self.ongoing_position = False
 
-        self.candles: List[Candle] = []
+        self.aggregator: Optional[CandleAggregator] = None
+        self.candles: Optional[CandleBuffer] = None
+        # Keys of the shared indicators used by the strategy, released when it stops
+        self._indicator_keys: List[Tuple] = []
         self.trades: List[Trade] = []
         self.logs = []
 
+        # Identifies the strategy in the checkpoints (see checkpoint.py), None to not save its state
+        self.checkpoint_id: Optional[str] = None
+
     def _add_log(self, msg: str):
         logger.info("%s", msg)
         self.logs.append({"log": msg, "displayed": False})
 
-    # Parse new trades coming in from the websocket and update the Candle list based on the timestamp
-    def parse_trades(self, price: float, size: float, timestamp: int) -> str:
+    # Runtime state saved in the checkpoints: the open trades, including the ones whose entry order is not filled yet
+    def get_state(self) -> Dict[str, Any]:
+
+        trades = [{k: v for k, v in vars(trade).items() if k != "contract"}
+                  for trade in self.trades if trade.status == "open"]
 
-        timestamp_diff = int(time.time() * 1000) - timestamp
+        return {"ongoing_position": self.ongoing_position, "trades": trades}
 
-        if timestamp_diff >= 2000:
-            logger.warning("%s %s: %s milliseconds of difference between the current time and the trade time",
-                           self.exchange, self.contract.symbol, timestamp_diff)
+    # Called after subscribe() with the state of a checkpoint, to keep managing the trades opened before a restart.
+    # The trades are checked on the exchange first: one closed after the checkpoint (e.g. a crash right after its exit
+    # order) must not be managed again, its exit order would open a reverse position.
+    def restore_state(self, state: Dict[str, Any]):
 
-        last_candle = self.candles[-1]
+        position = None
 
-        # Same Candle
-        if timestamp < last_candle.timestamp + self.tf_equiv:
+        for trade_info in state['trades']:
+            trade = Trade({**trade_info, "contract": self.contract})
 
-            last_candle.close = price
-            last_candle.volume += size
+            # The OrderTracker requests the status of the entry order
+            if trade.entry_price is None:
+                self.trades.append(trade)
+                self.client.order_tracker.track(self.contract, trade.entry_id, self._on_entry_order)
 
-            if price > last_candle.high:
-                last_candle.high = price
+                continue
 
-            elif price < last_candle.low:
-                last_candle.low = price
+            if position is None:
+                position = self.client.get_position(self.contract)
 
-            # Check Take profit / Stop loss
-            for trade in self.trades:
-                if trade.status == "open" and trade.entry_price is not None:
-                    self._check_tp_sl(trade)
+            if position is None:
+                self._add_log(f"Position on {self.contract.symbol} unknown, trade {trade.entry_id} not restored")
 
-            return "same_candle"
+            elif (position if trade.side == "long" else -position) < trade.quantity / 2:
+                self._add_log(f"Trade {trade.entry_id} on {self.contract.symbol} closed since the last checkpoint")
 
-        # Missing Candle(s)
-        elif timestamp >= last_candle.timestamp + 2 * self.tf_equiv:
+            else:
+                self.trades.append(trade)
+                self._watch_tp_sl(trade)
 
-            missing_candles = int((timestamp - last_candle.timestamp) / self.tf_equiv) - 1
+        self.ongoing_position = len(self.trades) > 0
 
-            logger.info("%s missing %s candles for %s %s (%s %s)", self.exchange, missing_candles,
-                        self.contract.symbol, self.tf, timestamp, last_candle.timestamp)
+        if len(self.trades) > 0:
+            self._add_log(f"{len(self.trades)} open trades restored on {self.contract.symbol} {self.tf}")
 
-            for missing in range(missing_candles):
-                new_ts = last_candle.timestamp + self.tf_equiv
-                candle_info = {'ts': new_ts, 'open': last_candle.close, 'high': last_candle.close,
-                               'low': last_candle.close, 'close': last_candle.close, 'volume': 0}
-                new_candle = Candle(candle_info, self.tf, "parse_trade")
+    # Save the state as soon as a trade is opened or closed, instead of waiting for the next periodic checkpoint
+    def _save_checkpoint(self):
 
-                self.candles.append(new_candle)
+        if self.checkpoint_id is not None and self.client.checkpoints is not None:
+            self.client.checkpoints.save_strategies(self.client)
 
-                last_candle = new_candle
+    # Start receiving the candles of the shared aggregator of the strategy market and timeframe.
+    # The last candle is the one still in progress, all the previous ones are closed and are used to initialize the
+    # indicators.
+    def subscribe(self, aggregator: CandleAggregator):
 
-            new_ts = last_candle.timestamp + self.tf_equiv
-            candle_info = {'ts': new_ts, 'open': price, 'high': price, 'low': price, 'close': price, 'volume': size}
-            new_candle = Candle(candle_info, self.tf, "parse_trade")
+        self.aggregator = aggregator
+        self.candles = aggregator.candles
 
-            self.candles.append(new_candle)
+        for candle in aggregator.closed_candles():
+            self.on_candle_close(candle)
 
-            return "new_candle"
+        aggregator.subscribe(self)
 
-        # New Candle
-        elif timestamp >= last_candle.timestamp + self.tf_equiv:
-            new_ts = last_candle.timestamp + self.tf_equiv
-            candle_info = {'ts': new_ts, 'open': price, 'high': price, 'low': price, 'close': price, 'volume': size}
-            new_candle = Candle(candle_info, self.tf, "parse_trade")
+    def unsubscribe(self):
+        self.aggregator.builder.triggers.remove_strategy(self)
+        self.aggregator.unsubscribe(self)
 
-            self.candles.append(new_candle)
+        for key in self._indicator_keys:
+            self.aggregator.release_indicator(key)
 
-            logger.info("%s New candle for %s %s", self.exchange, self.contract.symbol, self.tf)
+        self._indicator_keys = []
 
-            return "new_candle"
+    # Get an indicator shared with the other strategies of the same market and timeframe, its value is updated by the
+    # aggregator before on_candle_close() is called
+    def _use_indicator(self, key: Tuple) -> IndicatorNode:
 
-    # Called regularly after an order has been placed, until it is filled.
-    def _check_order_status(self, order_id):
+        self._indicator_keys.append(key)
 
-        order_status = self.client.get_order_status(self.contract, order_id)
+        return self.aggregator.acquire_indicator(key)
 
-        if order_status is not None:
+    # Called by the aggregator once for every candle that closes (including the missing candles created when no trade
+    # happened during a whole candle), to be overridden by the strategies that keep their indicators up to date
+    # incrementally.
+    def on_candle_close(self, candle: Candle):
+        return
 
-            logger.info("%s order status: %s", self.exchange, order_status.status)
+    # Called for every trade, after the aggregator has updated the candles. The Take profit / Stop loss of the open
+    # trades are checked before by the TriggerIndex of the symbol.
+    def on_trade(self, tick_type: str, price: float):
+        self.check_trade(tick_type, price)
 
-            if order_status.status == "filled":
-                for trade in self.trades:
-                    if trade.entry_id == order_id:
-                        trade.entry_price = order_status.avg_price
-                        trade.quantity = order_status.executed_qty
+    def check_trade(self, tick_type: str, price: float):
+        return
+
+    # Strategies whose signal is evaluated once per candle return the function (module level, so that it can be sent to
+    # another process) and the arguments that compute it, see CandleCloseExecutor. The result is given to on_signal().
+    # :return: None if the signal is evaluated in check_trade()
+    def signal_task(self) -> Optional[Tuple[Callable, Tuple]]:
+        return None
+
+    def on_signal(self, signal_result: int):
+
+        if signal_result in [1, -1] and not self.ongoing_position:
+            self._open_position(signal_result)
+
+    # Rolling correlation of the strategy contract with another Watchlist symbol (see WatchlistCorrelations), e.g. to
+    # take into account the positions that already hedge or duplicate a new trade
+    # :return: NaN if one of the symbols is not in the Watchlist
+    def _correlation(self, exchange: str, symbol: str) -> float:
+
+        if self.client.correlations is None:
+            return math.nan
+
+        return self.client.correlations.correlation(self.exchange, self.contract.symbol, exchange, symbol)
+
+    # Orders resulting from signals evaluated at the same time are placed by decreasing priority: the strategies
+    # trading the biggest part of the balance first
+    def priority(self) -> float:
+        return self.balance_pct
+
+    # Called by the OrderTracker of the client once the entry order of a trade is not pending anymore
+    def _on_entry_order(self, order_status: OrderStatus):
+
+        for trade in self.trades:
+            if trade.entry_id == order_status.order_id:
+
+                # A partially filled order (canceled or expired before the end) opened a smaller position
+                if order_status.status == "filled" or order_status.executed_qty:
+                    if order_status.status != "filled":
+                        self._add_log(f"Entry order on {self.contract.symbol} {self.tf} {order_status.status} after "
+                                      f"a partial fill of {order_status.executed_qty}")
+
+                    trade.entry_price = order_status.avg_price
+                    trade.quantity = order_status.executed_qty
+
+                    self._watch_tp_sl(trade)
 
-                        break
-                return
+                else:
+                    self._add_log(f"Entry order on {self.contract.symbol} {self.tf} {order_status.status}")
 
-        t = Timer(2.0, lambda: self._check_order_status(order_id))
-        t.start()
+                    trade.status = "canceled"
+                    self.ongoing_position = False
+
+                self._save_checkpoint()
+
+                break
 
     # Open Long or Short position based on the signal result
     def _open_position(self, signal_result: int):
@@ -142,7 +203,7 @@ class Strategy:
         if self.client.platform == "binance_spot" and signal_result == -1:
             return
 
-        trade_size = self.client.get_trade_size(self.contract, self.candles[-1].close, self.balance_pct)
+        trade_size = self.client.get_trade_size(self.contract, self.aggregator.last_price, self.balance_pct)
 
         if trade_size is None:
             return
@@ -164,10 +225,6 @@ class Strategy:
             if order_status.status == "filled":
                 avg_fill_price = order_status.avg_price
 
-            else:
-                t = Timer(2.0, lambda: self._check_order_status(order_status.order_id))
-                t.start()
-
             new_trade = Trade({"time": int(time.time() * 1000), "entry_price": avg_fill_price,
                                "contract": self.contract, "strategy": self.strat_name, "side": position_side,
                                "status": "open", "pnl": 0, "quantity": order_status.executed_qty,
@@ -175,59 +232,69 @@ class Strategy:
 
             self.trades.append(new_trade)
 
-    # Based on the average entry price, calculate whether the defined Stop Loss or Take Profit has been reached
-    def _check_tp_sl(self, trade: Trade):
+            if avg_fill_price is not None:
+                self._watch_tp_sl(new_trade)
+            else:
+                self.client.order_tracker.track(self.contract, order_status.order_id, self._on_entry_order)
+
+            self._save_checkpoint()
 
-        tp_triggered = False
-        sl_triggered = False
+    # Once the entry price is known, register the Take profit / Stop loss prices of the trade in the TriggerIndex of
+    # the symbol, which calls exit_trade() when one of them is reached
+    def _watch_tp_sl(self, trade: Trade):
 
-        price = self.candles[-1].close
+        # Stopped strategy, or no Take profit / Stop loss defined
+        if self not in self.aggregator.strategies or (self.take_profit is None and self.stop_loss is None):
+            return
 
-        if trade.side == "long":
+        self.aggregator.builder.triggers.add_trade(self, trade)
 
-            if self.stop_loss is not None:
+    # Close a trade whose Stop Loss or Take Profit has been reached
+    # :return: True if the exit order has been placed
+    def exit_trade(self, trade: Trade, price: float, trigger_type: str) -> bool:
 
-                if price <= trade.entry_price * (1 - self.stop_loss / 100):
-                    sl_triggered = True
+        sl_triggered = trigger_type == "stop_loss"
 
-            if self.take_profit is not None:
+        self._add_log(f"{'Stop loss' if sl_triggered else 'Take profit'} for {self.contract.symbol}  {self.tf} "
+                      f"| Current Price = {price} (Entry price was {trade.entry_price})")
 
-                if price >= trade.entry_price * (1 + self.take_profit / 100):
-                    tp_triggered = True
+        order_side = "SELL" if trade.side == "long" else "BUY"
 
-        elif trade.side == "short":
+        if not self.client.futures:
+            # Make sure to not sell more than what's in the available balance on Binance Spot
+            current_balances = self.client.balance_cache.get()
 
-            if self.stop_loss is not None:
+            if current_balances is not None:
+                if order_side == "SELL" and self.contract.base_asset in current_balances:
+                    trade.quantity = min(current_balances[self.contract.base_asset].free, trade.quantity)
 
-                if price >= trade.entry_price * (1 + self.stop_loss / 100):
-                    sl_triggered = True
+        order_status = self.client.place_order(self.contract, "MARKET", trade.quantity, order_side)
 
-            if self.take_profit is not None:
+        if order_status is not None:
+            self._add_log(f"Exit order on {self.contract.symbol} {self.tf} placed successfully")
 
-                if price <= trade.entry_price * (1 - self.take_profit / 100):
-                    tp_triggered = True
+            trade.status = "closed"
+            self.ongoing_position = False
 
-        if tp_triggered or sl_triggered:
-            self._add_log(f"{'Stop loss' if sl_triggered else 'Take profit'} for {self.contract.symbol}  {self.tf} "
-                          f"| Current Price = {price} (Entry price was {trade.entry_price})")
+            self._save_checkpoint()
 
-            order_side = "SELL" if trade.side == "long" else "BUY"
+            return True
 
-            if not self.client.futures:
-                # Make sure to not sell more than what's in the available balance on Binance Spot
-                current_balances = self.client.get_balances()
+        return False
 
-                if current_balances is not None:
-                    if order_side == "SELL" and self.contract.base_asset in current_balances:
-                        trade.quantity = min(current_balances[self.contract.base_asset].free, trade.quantity)
 
-            order_status = self.client.place_order(self.contract, "MARKET", trade.quantity, order_side)
+# Signal of the Technical strategy, from the RSI and MACD values of the last closed candle
+# :return: 1 for a Long signal, -1 for a Short signal, 0 for no signal
+def technical_signal(rsi: float, macd_line: float, macd_signal: float) -> int:
 
-            if order_status is not None:
-                self._add_log(f"Exit order on {self.contract.symbol} {self.tf} placed successfully")
+    if rsi < 30 and macd_line > macd_signal:
+        return 1
 
-                trade.status = "closed"
-                self.ongoing_position = False
+    elif rsi > 70 and macd_line < macd_signal:
+        return -1
+
+    else:
+        return 0
 
 
 class TechnicalStrategy(Strategy):
@@ -242,56 +309,34 @@ class TechnicalStrategy(Strategy):
 
         self._rsi_length = other_params['rsi_length']
 
-    # Compute the Relative Strength Index
-    # :return: The RSI value of the previous candlestick
-    def _rsi(self) -> float:
-
-        close_list = []
-
-        for candle in self.candles:
-            close_list.append(candle.close)
+        self._macd_line: Optional[IndicatorNode] = None
+        self._macd_signal: Optional[IndicatorNode] = None
+        self._rsi_node: Optional[IndicatorNode] = None
 
-        closes = pd.Series(close_list)
+    # The indicators are shared with the other strategies using the same parameters on the same market and timeframe
+    def subscribe(self, aggregator: CandleAggregator):
 
-        # Calculate the difference between the value of one row and the value of the row before
-        delta = closes.diff().dropna()
+        self.aggregator = aggregator
 
-        up, down = delta.copy(), delta.copy()
-        up[up < 0] = 0
-        # Keep only the negative changes, others are set to 0
-        down[down > 0] = 0
+        self._macd_line = self._use_indicator(macd_line_key(self._ema_fast, self._ema_slow))
+        self._macd_signal = self._use_indicator(macd_signal_key(self._ema_fast, self._ema_slow, self._ema_signal))
+        self._rsi_node = self._use_indicator(rsi_key(self._rsi_length))
 
-        avg_gain = up.ewm(com=(self._rsi_length - 1), min_periods=self._rsi_length).mean()
-        avg_loss = down.abs().ewm(com=(self._rsi_length - 1), min_periods=self._rsi_length).mean()
+        super().subscribe(aggregator)
 
-        # Relative Strength
-        rs = avg_gain / avg_loss
-        rsi = 100 - 100 / (1 + rs)
-        rsi = rsi.round(2)
+    # Compute the Relative Strength Index.
+    # The average gain and loss are updated by the aggregator every time a candle closes.
+    # :return: The RSI value of the previous candlestick
+    def _rsi(self) -> float:
 
-        return rsi.iloc[-2]
+        return round(self._rsi_node.value, 2)
 
-    # Compute the MACD and its Signal line
+    # Compute the MACD and its Signal line.
+    # The EMAs are updated by the aggregator every time a candle closes, so this is a simple lookup.
     # :return: The MACD and the MACD Signal value of the previous candlestick
     def _macd(self) -> Tuple[float, float]:
 
-        close_list = []
-
-        for candle in self.candles:
-            # Use only the close price of each candlestick for the calculations
-            close_list.append(candle.close)
-
-        # Convert the close prices list to a pandas Series
-        closes = pd.Series(close_list)
-
-        # Exponential Moving Average method
-        ema_fast = closes.ewm(span=self._ema_fast).mean()
-        ema_slow = closes.ewm(span=self._ema_slow).mean()
-
-        macd_line = ema_fast - ema_slow
-        macd_signal = macd_line.ewm(span=self._ema_signal).mean()
-
-        return macd_line.iloc[-2], macd_signal.iloc[-2]
+        return self._macd_line.value, self._macd_signal.value
 
     # Compute technical indicators and compare their value to some predefined levels to know whether to go Long, Short,
     # or do nothing.
@@ -299,20 +344,18 @@ class TechnicalStrategy(Strategy):
     def _check_signal(self):
 
         macd_line, macd_signal = self._macd()
-        rsi = self._rsi()
 
-        if rsi < 30 and macd_line > macd_signal:
-            return 1
+        return technical_signal(self._rsi(), macd_line, macd_signal)
 
-        elif rsi > 70 and macd_line < macd_signal:
-            return -1
+    def signal_task(self) -> Optional[Tuple[Callable, Tuple]]:
 
-        else:
-            return 0
+        macd_line, macd_signal = self._macd()
+
+        return technical_signal, (self._rsi(), macd_line, macd_signal)
 
     # To be triggered from the websocket _on_message() methods. Triggered only once per candlestick to avoid
     # constantly calculating the indicators. A trade can occur only if the is no open position at the moment.
-    def check_trade(self, tick_type: str):
+    def check_trade(self, tick_type: str, price: float):
 
         if tick_type == "new_candle" and not self.ongoing_position:
             signal_result = self._check_signal()
@@ -328,26 +371,301 @@ class BreakoutStrategy(Strategy):
         super().__init__(client, contract, exchange, timeframe, balance_pct, take_profit, stop_loss, "Breakout")
 
         self._min_volume = other_params['min_volume']
+        # Number of closed candles of the Donchian Channel, only the previous candle if not set (strategies saved before
+        # the parameter existed)
+        self._lookback = other_params.get('lookback')
+
+        if self._lookback is None:
+            self._lookback = 1
+
+        self._highest: Optional[IndicatorNode] = None
+        self._lowest: Optional[IndicatorNode] = None
+
+        # Breakout levels of the current candle, set when it opens so that check_trade() only compares floats
+        self._high_trigger = math.inf
+        self._low_trigger = -math.inf
+        self._volume_reached = False
+
+    # The highest high and lowest low are shared with the other strategies using the same lookback, and updated with
+    # monotonic deques (see RollingMaxState) every time a candle closes
+    def subscribe(self, aggregator: CandleAggregator):
+
+        self.aggregator = aggregator
+
+        self._highest = self._use_indicator(highest_key(self._lookback))
+        self._lowest = self._use_indicator(lowest_key(self._lookback))
+
+        super().subscribe(aggregator)
+        self._set_triggers()
+
+    # The highest high and lowest low of the last `lookback` closed candles are the breakout levels of the new candle.
+    # The volume of a candle can only increase, so once it is above the minimum volume it doesn't need to be checked
+    # again until the next candle.
+    def _set_triggers(self):
+
+        if self._highest.value != self._highest.value:
+            # Not enough candles yet
+            self._high_trigger = math.inf
+            self._low_trigger = -math.inf
+        else:
+            self._high_trigger = self._highest.value
+            self._low_trigger = self._lowest.value
+
+        self._volume_reached = False
 
     # Use candlesticks OHLC data to define Long or Short patterns
     # :return: 1 for a Long signal, -1 for a Short signal, 0 for no signal
-    def _check_signal(self) -> int:
+    def _check_signal(self, price: float) -> int:
+
+        if price > self._high_trigger:
+            signal_result = 1
+
+        elif price < self._low_trigger:
+            signal_result = -1
+
+        else:
+            return 0
+
+        if not self._volume_reached:
+            self._volume_reached = self.aggregator.live_volume() > self._min_volume
+
+            if not self._volume_reached:
+                return 0
+
+        return signal_result
+
+    # To be triggered from the websocket _on_message() methods
+    def check_trade(self, tick_type: str, price: float):
+
+        if tick_type == "new_candle":
+            self._set_triggers()
+
+        if not self.ongoing_position:
+            signal_result = self._check_signal(price)
+
+            if signal_result != 0:
+                self._open_position(signal_result)
+
+
+class BollingerStrategy(Strategy):
+    # Constructor
+    def __init__(self, client, contract: Contract, exchange: str, timeframe: str, balance_pct: float,
+                 take_profit: float, stop_loss: float, other_params: Dict):
+        super().__init__(client, contract, exchange, timeframe, balance_pct, take_profit, stop_loss, "Bollinger")
+
+        self._bb_length = other_params['bb_length']
+        self._bb_std = other_params['bb_std']
+
+        self._bands: Optional[IndicatorNode] = None
+
+        # Bands of the closed candles, copied when a new candle opens so that check_trade() only compares floats
+        self._upper_band = math.inf
+        self._lower_band = -math.inf
+
+    # The rolling mean and standard deviation are updated in O(1) when a candle closes (see BollingerState), and
+    # shared with the other strategies using the same parameters
+    def subscribe(self, aggregator: CandleAggregator):
+
+        self.aggregator = aggregator
+
+        self._bands = self._use_indicator(bollinger_key(self._bb_length, self._bb_std))
+
+        super().subscribe(aggregator)
+        self._set_bands()
+
+    def _set_bands(self):
+
+        middle, upper, lower = self._bands.value
+
+        if middle != middle:
+            # Not enough candles yet
+            self._upper_band = math.inf
+            self._lower_band = -math.inf
+        else:
+            self._upper_band = upper
+            self._lower_band = lower
+
+    # Mean reversion: a price below the lower band is expected to go back up, and a price above the upper band to go
+    # back down
+    # :return: 1 for a Long signal, -1 for a Short signal, 0 for no signal
+    def _check_signal(self, price: float) -> int:
 
-        if self.candles[-1].close > self.candles[-2].high and self.candles[-1].volume > self._min_volume:
+        if price < self._lower_band:
             return 1
 
-        elif self.candles[-1].close < self.candles[-2].low and self.candles[-1].volume > self._min_volume:
+        elif price > self._upper_band:
             return -1
 
         else:
             return 0
 
-    # To be triggered from the websocket _on_message() methods
-    def check_trade(self, tick_type: str):
+    # To be triggered from the websocket _on_message() methods, on every trade
+    def check_trade(self, tick_type: str, price: float):
+
+        if tick_type == "new_candle":
+            self._set_bands()
 
         if not self.ongoing_position:
-            signal_result = self._check_signal()
+            signal_result = self._check_signal(price)
+
+            if signal_result != 0:
+                self._open_position(signal_result)
+
+
+# Strategy defined by a long rule and a short rule written with the rules language (see rules.py), e.g.
+# "rsi(14) < 30 and macd_line > macd_signal", evaluated once per candle like the Technical strategy. The same rules can
+# be evaluated over the history with rules.rule_signals().
+class RuleStrategy(Strategy):
+    # Constructor
+    def __init__(self, client, contract: Contract, exchange: str, timeframe: str, balance_pct: float,
+                 take_profit: float, stop_loss: float, other_params: Dict):
+        super().__init__(client, contract, exchange, timeframe, balance_pct, take_profit, stop_loss, "Rules")
+
+        # Raises a ValueError if a rule is invalid, an empty rule never gives a signal
+        self._long_rule = Rule(other_params['long_rule']) if other_params.get('long_rule') else None
+        self._short_rule = Rule(other_params['short_rule']) if other_params.get('short_rule') else None
+
+        self._nodes: Dict[Tuple, IndicatorNode] = dict()
+
+    def subscribe(self, aggregator: CandleAggregator):
+
+        self.aggregator = aggregator
+
+        for rule in [self._long_rule, self._short_rule]:
+            if rule is None:
+                continue
+
+            for key in rule.keys:
+                if key not in self._nodes:
+                    self._nodes[key] = self._use_indicator(key)
+
+        super().subscribe(aggregator)
+
+    def _indicator_values(self) -> Dict[Tuple, Any]:
+        return {key: node.value for key, node in self._nodes.items()}
+
+    def signal_task(self) -> Optional[Tuple[Callable, Tuple]]:
+        return rule_signal, (self._long_rule, self._short_rule, self._indicator_values())
+
+    def check_trade(self, tick_type: str, price: float):
+
+        if tick_type == "new_candle" and not self.ongoing_position:
+            signal_result = rule_signal(self._long_rule, self._short_rule, self._indicator_values())
 
             if signal_result in [1, -1]:
                 self._open_position(signal_result)
 
+
+# Base class of the strategies trading several contracts at once (spreads, pairs, baskets), possibly on different
+# exchanges. The closed candles of the legs are synchronized by a BarBarrier: on_bar() is called once per bar with the
+# candles of all the legs in self.bars, a (bars, legs) array per field.
+class MultiLegStrategy:
+    # Constructor. The legs are (client, contract) tuples, the contracts all use the same timeframe.
+    def __init__(self, legs: List[Tuple[Union["BinanceClient", "BitmexClient"], Contract]], timeframe: str,
+                 balance_pct: float, strat_name: str, timeout: float = 5.0):
+
+        self.legs = legs
+        self.tf = timeframe
+        self.balance_pct = balance_pct
+        self.strat_name = strat_name
+
+        # Seconds to wait for the slowest legs once the first one has closed its candle
+        self.timeout = timeout
+
+        self.ongoing_position = False
+
+        self.aggregators: List[CandleAggregator] = []
+        self.barrier: Optional[BarBarrier] = None
+        self.bars: Optional[AlignedBars] = None
+        self.trades: List[Trade] = []
+        self.logs = []
+
+    def _add_log(self, msg: str):
+        logger.info("%s", msg)
+        self.logs.append({"log": msg, "displayed": False})
+
+    # Start receiving the bars, the aggregators are the ones of the legs in the same order (see get_aggregator())
+    def subscribe(self, aggregators: List[CandleAggregator]):
+
+        self.aggregators = aggregators
+
+        self.barrier = BarBarrier(aggregators, self.timeout, self.on_bar)
+        self.bars = self.barrier.bars
+
+        self.barrier.start()
+
+    def unsubscribe(self):
+        self.barrier.stop()
+
+    # Called once per bar when all the legs have closed their candle (or after the timeout, see self.bars.fresh),
+    # to be overridden. The last row of self.bars is the bar that just closed.
+    def on_bar(self, timestamp: int):
+        return
+
+    # Open a position on one leg, at the market price
+    # :return: The new trade, None if the order couldn't be placed
+    def _open_leg(self, leg: int, signal_result: int) -> Optional[Trade]:
+
+        client, contract = self.legs[leg]
+
+        # Short is not allowed on Spot platforms
+        if client.platform == "binance_spot" and signal_result == -1:
+            return None
+
+        trade_size = client.get_trade_size(contract, self.aggregators[leg].last_price, self.balance_pct)
+
+        if trade_size is None:
+            return None
+
+        order_side = "buy" if signal_result == 1 else "sell"
+        position_side = "long" if signal_result == 1 else "short"
+
+        order_status = client.place_order(contract, "MARKET", trade_size, order_side)
+
+        if order_status is None:
+            return None
+
+        self._add_log(f"{order_side.capitalize()} order placed on {contract.symbol} {self.tf} "
+                      f"| Status: {order_status.status}")
+
+        trade = Trade({"time": int(time.time() * 1000),
+                       "entry_price": order_status.avg_price if order_status.status == "filled" else None,
+                       "contract": contract, "strategy": self.strat_name, "side": position_side, "status": "open",
+                       "pnl": 0, "quantity": order_status.executed_qty, "entry_id": order_status.order_id})
+
+        self.trades.append(trade)
+
+        if trade.entry_price is None:
+            client.order_tracker.track(contract, order_status.order_id,
+                                       lambda status: self._on_leg_order(leg, trade, status))
+
+        return trade
+
+    # Called by the OrderTracker of the leg client once the entry order of a trade is not pending anymore
+    def _on_leg_order(self, leg: int, trade: Trade, order_status: OrderStatus):
+
+        # A partially filled order (canceled or expired before the end) opened a smaller position
+        if order_status.status == "filled" or order_status.executed_qty:
+            trade.entry_price = order_status.avg_price
+            trade.quantity = order_status.executed_qty
+        else:
+            self._add_log(f"Entry order on {self.legs[leg][1].symbol} {self.tf} {order_status.status}")
+            trade.status = "canceled"
+
+    # Close the position of one leg
+    # :return: True if the exit order has been placed
+    def _close_leg(self, leg: int, trade: Trade) -> bool:
+
+        client, contract = self.legs[leg]
+
+        order_side = "SELL" if trade.side == "long" else "BUY"
+
+        order_status = client.place_order(contract, "MARKET", trade.quantity, order_side)
+
+        if order_status is None:
+            return False
+
+        self._add_log(f"Exit order on {contract.symbol} {self.tf} placed successfully")
+        trade.status = "closed"
+
+        return True
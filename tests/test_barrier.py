@@ -0,0 +1,54 @@
+import threading
+import time
+
+from barrier import BarBarrier
+from candles import CandleAggregator
+from models import Candle, Contract
+
+
+def _aggregator(symbol):
+
+    contract = Contract({'symbol': symbol, 'baseAsset': symbol[:3], 'quoteAsset': "USDT", 'pricePrecision': 2,
+                         'quantityPrecision': 3}, "binance_futures")
+
+    aggregator = CandleAggregator("Binance", contract, "1m")
+    aggregator.load_candles([Candle({'ts': i * 60000, 'open': 100, 'high': 101, 'low': 99, 'close': 100,
+                                     'volume': 1}, "1m", "parse_trade") for i in range(3)])
+
+    return aggregator
+
+
+def _candle(timestamp, close):
+    return Candle({'ts': timestamp, 'open': close, 'high': close, 'low': close, 'close': close, 'volume': 1}, "1m",
+                  "parse_trade")
+
+
+def test_bars_released_by_the_legs_and_by_the_timeout():
+
+    released = []
+    barrier = BarBarrier([_aggregator("BTCUSDT"), _aggregator("ETHUSDT")], 0.1, released.append)
+    barrier.start()
+
+    threads = threading.active_count()
+
+    # All the legs closed, the bar is released right away and the deadline is cancelled
+    for bar in range(3, 23):
+        barrier.on_leg_close(0, _candle(bar * 60000, 100 + bar))
+        barrier.on_leg_close(1, _candle(bar * 60000, 200 + bar))
+
+    assert released == [bar * 60000 for bar in range(3, 23)]
+    assert threading.active_count() == threads
+
+    time.sleep(0.2)
+    assert barrier.timeouts_count == 0
+
+    # The second leg is missing, the bar is released by the timeout with its previous close
+    barrier.on_leg_close(0, _candle(23 * 60000, 150))
+    time.sleep(0.3)
+
+    assert released[-1] == 23 * 60000
+    assert barrier.timeouts_count == 1
+    assert list(barrier.bars.close[-1]) == [150, 222]
+    assert list(barrier.bars.fresh[-1]) == [True, False]
+
+    barrier.stop()
@@ -0,0 +1,154 @@
+import json
+import time
+
+import pytest
+
+import connectors.binance
+from connectors.binance import BinanceClient
+
+
+CONTRACT = {'symbol': "BTCUSDT", 'baseAsset': "BTC", 'quoteAsset': "USDT", 'pricePrecision': 2,
+            'quantityPrecision': 3}
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.status_code = 200
+        self._data = data
+
+    def json(self):
+        return self._data
+
+
+# Stubbed REST API of Binance Futures, records the requests
+class FakeRest:
+    def __init__(self):
+        self.requests = []
+
+    def _respond(self, method, url, params=None, headers=None):
+
+        endpoint = url.split("binancefuture.com")[-1]
+        self.requests.append((method, endpoint))
+
+        if endpoint == "/fapi/v1/exchangeInfo":
+            return FakeResponse({'symbols': [CONTRACT]})
+        elif endpoint == "/fapi/v2/account":
+            return FakeResponse({'assets': [{'asset': "USDT", 'initialMargin': "0", 'maintMargin': "0",
+                                             'marginBalance': "100", 'walletBalance': "100",
+                                             'unrealizedProfit': "0"}]})
+        elif endpoint == "/fapi/v1/time":
+            return FakeResponse({'serverTime': int(time.time() * 1000)})
+        elif endpoint == "/fapi/v1/listenKey":
+            return FakeResponse({'listenKey': "testListenKey"})
+
+        return FakeResponse([])
+
+    def get(self, url, params=None, headers=None):
+        return self._respond("GET", url, params, headers)
+
+    def post(self, url, params=None, headers=None):
+        return self._respond("POST", url, params, headers)
+
+    def put(self, url, params=None, headers=None):
+        return self._respond("PUT", url, params, headers)
+
+    def delete(self, url, params=None, headers=None):
+        return self._respond("DELETE", url, params, headers)
+
+
+# Websocket connection that opens right away and stays open until closed
+class FakeWebSocketApp:
+    instances = []
+
+    def __init__(self, url, on_open=None, on_close=None, on_error=None, on_message=None):
+        self.url = url
+        self.on_open = on_open
+        self.on_message = on_message
+        self.closed = False
+
+        FakeWebSocketApp.instances.append(self)
+
+    def run_forever(self):
+
+        self.on_open(self)
+
+        while not self.closed:
+            time.sleep(0.01)
+
+    def send(self, msg):
+        return
+
+    def close(self):
+        self.closed = True
+
+
+def _wait_for(condition, timeout=3.0) -> bool:
+
+    deadline = time.monotonic() + timeout
+
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+
+    return False
+
+
+@pytest.fixture
+def client(monkeypatch):
+
+    rest = FakeRest()
+    FakeWebSocketApp.instances = []
+
+    monkeypatch.setattr(connectors.binance.requests, "get", rest.get)
+    monkeypatch.setattr(connectors.binance.requests, "post", rest.post)
+    monkeypatch.setattr(connectors.binance.requests, "put", rest.put)
+    monkeypatch.setattr(connectors.binance.requests, "delete", rest.delete)
+    monkeypatch.setattr(connectors.binance.websocket, "WebSocketApp", FakeWebSocketApp)
+
+    client = BinanceClient("public", "secret", testnet=True, futures=True)
+    client.rest = rest
+
+    yield client
+
+    client.reconnect = False
+
+    for ws in FakeWebSocketApp.instances:
+        ws.close()
+
+
+def _user_ws():
+    return [ws for ws in FakeWebSocketApp.instances if ws.url.endswith("/testListenKey")]
+
+
+def test_listen_key_created_and_user_stream_connected(client):
+
+    assert _wait_for(lambda: len(_user_ws()) > 0)
+    assert ("POST", "/fapi/v1/listenKey") in client.rest.requests
+    assert _wait_for(lambda: client.order_tracker.streaming)
+
+
+def test_order_update_fills_the_tracked_order(client):
+
+    assert _wait_for(lambda: len(_user_ws()) > 0)
+
+    statuses = []
+    client.order_tracker.track(client.contracts['BTCUSDT'], 42, statuses.append)
+
+    update = {'e': "ORDER_TRADE_UPDATE", 'o': {'s': "BTCUSDT", 'i': 42, 'X': "FILLED", 'ap': "30000.5", 'z': "0.01"}}
+    _user_ws()[0].on_message(_user_ws()[0], json.dumps(update))
+
+    assert len(statuses) == 1
+    assert statuses[0].status == "filled"
+    assert statuses[0].avg_price == 30000.5
+    assert statuses[0].executed_qty == 0.01
+
+
+def test_account_update_replaces_the_balances(client):
+
+    assert _wait_for(lambda: len(_user_ws()) > 0)
+
+    update = {'e': "ACCOUNT_UPDATE", 'a': {'B': [{'a': "USDT", 'wb': "250", 'cw': "250"}], 'P': []}}
+    _user_ws()[0].on_message(_user_ws()[0], json.dumps(update))
+
+    assert client.balance_cache.balances['USDT'].wallet_balance == 250
@@ -0,0 +1,84 @@
+import numpy as np
+
+from candles import BarBuilder, CandleAggregator
+from indicator_registry import compute_series, ema_key, rsi_key
+from models import Candle, Contract
+
+
+CONTRACT = Contract({'symbol': "BTCUSDT", 'baseAsset': "BTC", 'quoteAsset': "USDT", 'pricePrecision': 2,
+                     'quantityPrecision': 3}, "binance_futures")
+
+
+# 1m candles of the history from 0 to 9 minutes, the last one in progress
+def _builder():
+
+    candles = [Candle({'ts': i * 60000, 'open': 10 + i % 3, 'high': 11 + i % 3, 'low': 9 + i % 3,
+                       'close': 10 + (i * 7) % 5, 'volume': 1}, "1m", "parse_trade") for i in range(10)]
+
+    aggregator = CandleAggregator("Binance", CONTRACT, "1m")
+    aggregator.load_candles(candles)
+
+    builder = BarBuilder("Binance", CONTRACT)
+    builder.add_aggregator(aggregator)
+
+    return builder, aggregator
+
+
+def _closed(aggregator):
+    return {field: values[:-1] for field, values in aggregator.candles.last().items()}
+
+
+def test_late_trade_updates_the_close_and_the_indicators():
+
+    builder, aggregator = _builder()
+    nodes = {key: aggregator.acquire_indicator(key) for key in [ema_key(3), rsi_key(3)]}
+
+    builder.parse_trade(10, 1, 590000)
+    builder.parse_trade(11, 1, 599000)
+    builder.close_on_time(600000)
+
+    # Trade of the previous candle received after it was closed on time
+    builder.parse_trade(12, 1, 599900)
+
+    assert aggregator.candles.close[-2] == 12
+    assert aggregator.candles.high[-2] == 12
+    assert aggregator.candles.volume[-2] == 4
+
+    # The candle opened on time hasn't received any trade yet
+    assert aggregator.candles.open[-1] == aggregator.candles.close[-1] == 12
+
+    for key, node in nodes.items():
+        assert np.isclose(node.value, compute_series(key, _closed(aggregator))[-1])
+
+
+def test_older_late_trade_keeps_the_close():
+
+    builder, aggregator = _builder()
+
+    builder.parse_trade(10, 1, 590000)
+    builder.parse_trade(11, 1, 599000)
+    builder.close_on_time(600000)
+    builder.parse_trade(8, 1, 595000)
+
+    assert aggregator.candles.close[-2] == 11
+    assert aggregator.candles.low[-2] == 8
+    assert aggregator.candles.close[-1] == 11
+
+
+def test_late_trade_of_a_candle_opened_on_time():
+
+    builder, aggregator = _builder()
+    node = aggregator.acquire_indicator(ema_key(3))
+
+    builder.parse_trade(11, 1, 599000)
+    builder.close_on_time(600000)
+    builder.close_on_time(660000)
+
+    # Only trade of the candle that started at 600000, it opens the candle
+    builder.parse_trade(13, 2, 610000)
+
+    candle = aggregator.candles[-2]
+
+    assert (candle.open, candle.high, candle.low, candle.close, candle.volume) == (13, 13, 13, 13, 2)
+    assert aggregator.candles.close[-1] == 13
+    assert np.isclose(node.value, compute_series(ema_key(3), _closed(aggregator))[-1])
@@ -0,0 +1,153 @@
+import time
+
+import pytest
+
+from candles import BarBuilder, CandleAggregator
+from checkpoint import Checkpoints
+from models import Candle, Contract, OrderStatus, Trade
+from strategies import BreakoutStrategy
+
+
+CONTRACT = Contract({'symbol': "BTCUSDT", 'baseAsset': "BTC", 'quoteAsset': "USDT", 'pricePrecision': 2,
+                     'quantityPrecision': 3}, "binance_futures")
+
+
+class FakeTracker:
+    def __init__(self):
+        self.tracked = []
+
+    def track(self, contract, order_id, callback):
+        self.tracked.append(order_id)
+
+
+# Client of a Futures account holding `position` BTCUSDT
+class FakeClient:
+    platform = "binance_futures"
+    futures = True
+
+    def __init__(self, position):
+        self.position = position
+        self.strategies = dict()
+        self.bar_builders = dict()
+        self.checkpoints = None
+        self.order_tracker = FakeTracker()
+
+    def get_position(self, contract):
+        return self.position
+
+    def place_order(self, contract, order_type, quantity, side, price=None, tif=None):
+        return OrderStatus({'orderId': 2, 'status': "FILLED", 'avgPrice': "100", 'executedQty': str(quantity)},
+                           self.platform)
+
+
+def _strategy(client) -> BreakoutStrategy:
+
+    now = int(time.time() * 1000)
+    candles = [Candle({'ts': now - now % 60000 - (10 - i) * 60000, 'open': 100, 'high': 101, 'low': 99, 'close': 100,
+                       'volume': 1}, "1m", "parse_trade") for i in range(11)]
+
+    aggregator = CandleAggregator("Binance", CONTRACT, "1m")
+    aggregator.load_candles(candles)
+    BarBuilder("Binance", CONTRACT).add_aggregator(aggregator)
+
+    strategy = BreakoutStrategy(client, CONTRACT, "Binance", "1m", 10, 2, 2, {'min_volume': 0, 'lookback': 1})
+    strategy.subscribe(aggregator)
+    strategy.checkpoint_id = "breakout"
+
+    return strategy
+
+
+def _state(side, entry_price=100.0):
+    return {"ongoing_position": True,
+            "trades": [{"time": 1, "entry_price": entry_price, "strategy": "Breakout", "side": side, "status": "open",
+                        "pnl": 0, "quantity": 0.5, "entry_id": 1}]}
+
+
+@pytest.mark.parametrize("position, side, restored", [(0.5, "long", True), (0.0, "long", False),
+                                                      (-0.5, "long", False), (-0.5, "short", True),
+                                                      (None, "long", False)])
+def test_restored_trades_checked_against_the_position(position, side, restored):
+
+    strategy = _strategy(FakeClient(position))
+    strategy.restore_state(_state(side))
+
+    assert (len(strategy.trades) == 1) == restored
+    assert strategy.ongoing_position == restored
+    assert (len(strategy.aggregator.builder.triggers) > 0) == restored
+
+
+def test_pending_entry_order_is_tracked():
+
+    client = FakeClient(0.0)
+    strategy = _strategy(client)
+    strategy.restore_state(_state("long", entry_price=None))
+
+    assert client.order_tracker.tracked == [1]
+    assert len(strategy.trades) == 1
+
+
+@pytest.mark.parametrize("status, executed_qty, opened", [("FILLED", "0.5", True), ("CANCELED", "0.2", True),
+                                                          ("EXPIRED", "0.2", True), ("CANCELED", "0", False)])
+def test_entry_order_final_status(status, executed_qty, opened):
+
+    strategy = _strategy(FakeClient(0.0))
+    strategy.restore_state(_state("long", entry_price=None))
+
+    strategy._on_entry_order(OrderStatus({'orderId': 1, 'status': status, 'avgPrice': "101",
+                                          'executedQty': executed_qty}, "binance_futures"))
+
+    trade = strategy.trades[0]
+
+    assert (trade.status == "open") == opened
+    assert strategy.ongoing_position == opened
+    assert (len(strategy.aggregator.builder.triggers) > 0) == opened
+
+    if opened:
+        assert (trade.entry_price, trade.quantity) == (101, float(executed_qty))
+
+
+def test_closed_trade_saved_right_away(tmp_path):
+
+    client = FakeClient(0.5)
+    checkpoints = Checkpoints(str(tmp_path), interval=1e9)
+    checkpoints.add_client("Binance", client)
+
+    strategy = _strategy(client)
+    strategy.restore_state(_state("long"))
+    client.strategies[0] = strategy
+
+    strategy.exit_trade(strategy.trades[0], 102, "take_profit")
+
+    assert checkpoints.load_strategy("Binance", "breakout")['trades'] == []
+
+
+def test_saved_states_of_stopped_strategies_are_kept(tmp_path):
+
+    client = FakeClient(0.5)
+    checkpoints = Checkpoints(str(tmp_path), interval=1e9)
+    checkpoints.add_client("Binance", client)
+
+    strategy = _strategy(client)
+    strategy.restore_state(_state("long"))
+    client.strategies[0] = strategy
+    checkpoints.save()
+
+    # After a restart, the strategy hasn't been switched on again yet
+    client = FakeClient(0.5)
+    checkpoints = Checkpoints(str(tmp_path), interval=1e9)
+    checkpoints.add_client("Binance", client)
+
+    other = _strategy(client)
+    other.checkpoint_id = "other"
+    client.strategies[1] = other
+    checkpoints.save()
+
+    assert len(checkpoints.load_strategy("Binance", "breakout")['trades']) == 1
+    assert checkpoints.load_strategy("Binance", "other") is not None
+
+    # Switched off
+    client.strategies.pop(1)
+    checkpoints.save_strategies(client, removed="other")
+
+    assert checkpoints.load_strategy("Binance", "other") is None
+    assert len(Checkpoints(str(tmp_path), interval=1e9).load_strategy("Binance", "breakout")['trades']) == 1
@@ -0,0 +1,58 @@
+import time
+
+from executor import CandleCloseExecutor
+
+
+def _signal(result):
+    return result
+
+
+# Strategy whose order takes `delay` seconds to be placed
+class FakeStrategy:
+    def __init__(self, name, balance_pct, result, started, delay=0.2):
+        self.strat_name = name
+        self.balance_pct = balance_pct
+        self.result = result
+        self.started = started
+        self.delay = delay
+        self.signals = []
+
+    def priority(self):
+        return self.balance_pct
+
+    def signal_task(self):
+        return _signal, (self.result,)
+
+    def on_signal(self, signal_result):
+        self.started.append(self.strat_name)
+        time.sleep(self.delay)
+        self.signals.append(signal_result)
+
+
+def test_orders_placed_concurrently_in_priority_order():
+
+    started = []
+    strategies = [FakeStrategy("low", 1, 1, started), FakeStrategy("none", 5, 0, started),
+                  FakeStrategy("high", 10, -1, started), FakeStrategy("mid", 5, 1, started)]
+
+    executor = CandleCloseExecutor("Binance", max_workers=1)
+
+    for strategy in strategies:
+        executor.submit(strategy, 100)
+
+    executor.flush()
+
+    assert started == ["high", "mid", "low"]
+    assert [s.signals for s in strategies] == [[1], [], [-1], [1]]
+
+    executor = CandleCloseExecutor("Binance", max_workers=3)
+
+    for strategy in strategies:
+        executor.submit(strategy, 100)
+
+    start = time.monotonic()
+    executor.flush()
+
+    # The three orders wait for the exchange at the same time, and are all placed when flush() returns
+    assert time.monotonic() - start < 0.5
+    assert [len(s.signals) for s in strategies] == [2, 0, 2, 2]
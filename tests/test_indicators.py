@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from indicator_registry import IndicatorRegistry, compute_series, macd_line_key, macd_signal_key
+from indicators import EmaState, SmaState, RsiState, AtrState, RollingMaxState, RollingMinState, BollingerState
+
+
+def _closes(seed, size=500):
+    rng = np.random.default_rng(seed)
+    return 100 + np.cumsum(rng.normal(0, 1, size))
+
+
+# Same computation as the TechnicalStrategy before the streaming states, over the whole close prices Series
+def _pandas_rsi(closes, rsi_length):
+
+    delta = pd.Series(closes).diff().dropna()
+
+    up, down = delta.copy(), delta.copy()
+    up[up < 0] = 0
+    down[down > 0] = 0
+
+    avg_gain = up.ewm(com=(rsi_length - 1), min_periods=rsi_length).mean()
+    avg_loss = down.abs().ewm(com=(rsi_length - 1), min_periods=rsi_length).mean()
+
+    rs = avg_gain / avg_loss
+
+    return (100 - 100 / (1 + rs)).to_numpy()
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("span", [2, 12, 26])
+def test_streaming_ema_matches_pandas(seed, span):
+
+    closes = _closes(seed)
+
+    state = EmaState(span=span)
+    streamed = [state.update(close) for close in closes]
+
+    assert np.allclose(streamed, pd.Series(closes).ewm(span=span).mean().to_numpy())
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("rsi_length", [2, 14])
+def test_streaming_rsi_matches_pandas(seed, rsi_length):
+
+    closes = _closes(seed)
+
+    state = RsiState(rsi_length)
+    streamed = [state.update(close) for close in closes]
+
+    # No RSI for the first close, which has no price change
+    assert np.isnan(streamed[0])
+    assert np.allclose(streamed[1:], _pandas_rsi(closes, rsi_length), equal_nan=True)
+
+
+def _value(state):
+    return state.middle if isinstance(state, BollingerState) else state.value
+
+
+# Every update is first done with a wrong value, cancelled and done again, as when late trades amend a closed candle
+@pytest.mark.parametrize("make_state", [lambda: EmaState(span=12), lambda: SmaState(5), lambda: RsiState(14),
+                                        lambda: AtrState(14), lambda: RollingMaxState(5), lambda: RollingMinState(5),
+                                        lambda: BollingerState(5, 2)])
+def test_undo_cancels_the_last_update(make_state):
+
+    closes = _closes(0, 100)
+    wrong = _closes(1, 100)
+
+    state, reference = make_state(), make_state()
+
+    for close, wrong_close in zip(closes, wrong):
+        args = (close + 1, close - 1, close) if isinstance(state, AtrState) else (close,)
+        wrong_args = (wrong_close + 1, wrong_close - 1, wrong_close) if isinstance(state, AtrState) else (wrong_close,)
+
+        state.update(*wrong_args)
+        state.undo()
+        state.update(*args)
+        reference.update(*args)
+
+        assert np.isclose(_value(state), _value(reference), equal_nan=True)
+
+
+# Same computation as the TechnicalStrategy before the shared indicators, over the whole close prices Series
+def _pandas_macd(closes, ema_fast, ema_slow, ema_signal):
+
+    closes = pd.Series(closes)
+
+    macd_line = closes.ewm(span=ema_fast).mean() - closes.ewm(span=ema_slow).mean()
+    macd_signal = macd_line.ewm(span=ema_signal).mean()
+
+    return macd_line.to_numpy(), macd_signal.to_numpy()
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("ema_fast, ema_slow, ema_signal", [(12, 26, 9), (5, 35, 5)])
+def test_macd_nodes_match_pandas(seed, ema_fast, ema_slow, ema_signal):
+
+    closes = _closes(seed)
+    candles = {'timestamp': list(range(len(closes))), 'high': list(closes + 1), 'low': list(closes - 1),
+               'close': list(closes)}
+
+    expected_line, expected_signal = _pandas_macd(closes, ema_fast, ema_slow, ema_signal)
+
+    # Nodes created with the first half of the history, then updated with each closed candle
+    half = len(closes) // 2
+    registry = IndicatorRegistry()
+    line = registry.acquire(macd_line_key(ema_fast, ema_slow), {k: v[:half] for k, v in candles.items()})
+    signal = registry.acquire(macd_signal_key(ema_fast, ema_slow, ema_signal),
+                              {k: v[:half] for k, v in candles.items()})
+
+    assert np.isclose(line.value, expected_line[half - 1])
+    assert np.isclose(signal.value, expected_signal[half - 1])
+
+    for i in range(half, len(closes)):
+        registry.on_candle_close(candles['high'][i], candles['low'][i], candles['close'][i])
+
+        assert np.isclose(line.value, expected_line[i])
+        assert np.isclose(signal.value, expected_signal[i])
+
+    arrays = {k: np.asarray(v, dtype=np.float64) for k, v in candles.items()}
+
+    assert np.allclose(compute_series(macd_line_key(ema_fast, ema_slow), arrays), expected_line)
+    assert np.allclose(compute_series(macd_signal_key(ema_fast, ema_slow, ema_signal), arrays), expected_signal)
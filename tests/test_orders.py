@@ -0,0 +1,46 @@
+import threading
+
+import orders
+from models import OrderStatus
+from orders import OrderTracker
+
+
+class FakeBalanceCache:
+    def invalidate(self):
+        return
+
+
+# Client whose first status requests fail
+class FakeClient:
+    def __init__(self, failures):
+        self.failures = failures
+        self.requests = 0
+        self.balance_cache = FakeBalanceCache()
+
+    def get_orders_status(self, order_list):
+
+        self.requests += 1
+
+        if self.requests <= self.failures:
+            return None
+
+        return {order_id: OrderStatus({'orderId': order_id, 'status': "FILLED", 'avgPrice': "100",
+                                       'executedQty': "1"}, "binance_futures") for _, order_id in order_list}
+
+
+def test_resync_retried_after_a_failed_request(monkeypatch):
+
+    monkeypatch.setattr(orders, "MIN_POLL_INTERVAL", 0.01)
+    monkeypatch.setattr(orders, "MAX_POLL_INTERVAL", 0.05)
+
+    client = FakeClient(failures=2)
+    tracker = OrderTracker("Binance", client)
+
+    filled = threading.Event()
+
+    # Filled while the stream was down, only the resync request after the reconnection can report it
+    tracker.track(None, 1, lambda order_status: filled.set())
+    tracker.set_streaming(True)
+
+    assert filled.wait(2)
+    assert client.requests >= 3
@@ -0,0 +1,20 @@
+import pytest
+
+from rules import Rule
+
+
+@pytest.mark.parametrize("text", ["sma(0) > close", "highest(0) < high", "rsi(0) < 30", "sma(2.5) > close",
+                                  "ema(-3) > close", "macd_line(12, 0) > 0", "bb_upper(0) < close",
+                                  "bb_lower(20, 0) > close"])
+def test_invalid_parameters_rejected_at_compile_time(text):
+
+    with pytest.raises(ValueError, match=text.split("(")[0]):
+        Rule(text)
+
+
+def test_valid_parameters():
+
+    rule = Rule("rsi(14) < 30 and bb_lower(20, 1.5) > close and sma(1) > 0")
+
+    # rsi, bollinger, close and sma
+    assert len(rule.keys) == 4
@@ -0,0 +1,129 @@
+import heapq
+import itertools
+import threading
+from typing import *
+
+from models import Trade
+
+# Import the Strategy class name only for typing purpose
+if TYPE_CHECKING:
+    from strategies import Strategy
+
+
+# Take profit and Stop loss levels of the open trades of one symbol, for all the strategies trading it.
+# The absolute prices are computed once when the entry order is filled, and stored in two heaps:
+#   - the levels triggered when the price goes up (Long take profit, Short stop loss), lowest level first
+#   - the levels triggered when the price goes down (Long stop loss, Short take profit), highest level first
+# so every price update only looks at the top of the heaps and pops the levels it crossed. The levels of a trade
+# closed by its other level are left in the heaps and skipped when they are popped (or when the heaps are rebuilt).
+class TriggerIndex:
+    def __init__(self):
+
+        # Entries: (price key, sequence number, trigger type, strategy, trade). The sequence number makes sure that the
+        # heap never has to compare strategies or trades for equal prices.
+        self._upper_levels: List[Tuple[float, int, str, "Strategy", Trade]] = []
+        self._lower_levels: List[Tuple[float, int, str, "Strategy", Trade]] = []
+        self._sequence = itertools.count()
+        self._stale_levels = 0
+
+        # Trades are added from the OrderTracker thread while the websocket thread checks the prices
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._upper_levels) + len(self._lower_levels) - self._stale_levels
+
+    # Compute the Take profit / Stop loss prices of a filled trade from the percentages of its strategy
+    def add_trade(self, strategy: "Strategy", trade: Trade):
+
+        levels = []
+
+        if trade.side == "long":
+            if strategy.take_profit is not None:
+                levels.append(("take_profit", trade.entry_price * (1 + strategy.take_profit / 100)))
+            if strategy.stop_loss is not None:
+                levels.append(("stop_loss", trade.entry_price * (1 - strategy.stop_loss / 100)))
+
+        elif trade.side == "short":
+            if strategy.take_profit is not None:
+                levels.append(("take_profit", trade.entry_price * (1 - strategy.take_profit / 100)))
+            if strategy.stop_loss is not None:
+                levels.append(("stop_loss", trade.entry_price * (1 + strategy.stop_loss / 100)))
+
+        with self._lock:
+            for trigger_type, level in levels:
+                self._push(trigger_type, level, strategy, trade)
+
+    def _push(self, trigger_type: str, level: float, strategy: "Strategy", trade: Trade):
+
+        going_up = (trade.side == "long") == (trigger_type == "take_profit")
+
+        if going_up:
+            heapq.heappush(self._upper_levels, (level, next(self._sequence), trigger_type, strategy, trade))
+        else:
+            heapq.heappush(self._lower_levels, (-level, next(self._sequence), trigger_type, strategy, trade))
+
+    # Stop watching the trades of a strategy, e.g. when it is switched off
+    def remove_strategy(self, strategy: "Strategy"):
+
+        with self._lock:
+            self._rebuild(lambda entry: entry[3] is not strategy)
+
+    # Drop the levels of the closed trades
+    def _rebuild(self, keep: Callable = lambda entry: True):
+
+        self._upper_levels = [e for e in self._upper_levels if e[4].status == "open" and keep(e)]
+        self._lower_levels = [e for e in self._lower_levels if e[4].status == "open" and keep(e)]
+        heapq.heapify(self._upper_levels)
+        heapq.heapify(self._lower_levels)
+
+        self._stale_levels = 0
+
+    # Called for every trade of the symbol, exits the trades whose Take profit or Stop loss has been reached.
+    # For a burst of trades merged together, the levels are compared with the highest and lowest prices of the burst
+    # and the exits are logged with its last price.
+    def check(self, price: float, high: Optional[float] = None, low: Optional[float] = None):
+
+        high = price if high is None else high
+        low = price if low is None else low
+
+        # Most of the time nothing is crossed, avoid taking the lock
+        if not ((self._upper_levels and self._upper_levels[0][0] <= high) or
+                (self._lower_levels and -self._lower_levels[0][0] >= low)):
+            return
+
+        triggered = []
+
+        with self._lock:
+            while self._upper_levels and self._upper_levels[0][0] <= high:
+                triggered.append(heapq.heappop(self._upper_levels))
+
+            while self._lower_levels and -self._lower_levels[0][0] >= low:
+                triggered.append(heapq.heappop(self._lower_levels))
+
+        failed = []
+        stale_popped = 0
+        stale_added = 0
+
+        for key, _, trigger_type, strategy, trade in triggered:
+
+            # Already closed by its other level
+            if trade.status != "open":
+                stale_popped += 1
+                continue
+
+            if strategy.exit_trade(trade, price, trigger_type):
+                # The other level of the trade (if any) is now stale
+                if strategy.take_profit is not None and strategy.stop_loss is not None:
+                    stale_added += 1
+            else:
+                failed.append((trigger_type, abs(key), strategy, trade))
+
+        with self._lock:
+            # The exit order could not be placed, try again on the next price update that crosses the level
+            for trigger_type, level, strategy, trade in failed:
+                self._push(trigger_type, level, strategy, trade)
+
+            self._stale_levels = max(self._stale_levels + stale_added - stale_popped, 0)
+
+            if self._stale_levels > 100 and self._stale_levels * 2 > len(self._upper_levels) + len(self._lower_levels):
+                self._rebuild()